@@ -0,0 +1,63 @@
+import time
+import click
+from app.app import app
+from app.migrations import MigrationRunner
+from espn.benchmark import create_random_players, grade_scalar, grade_vector
+from espn.classes.batch_grade_class import BatchRegrader
+from espn.classes.job_queue_class import JobWorker
+
+
+@app.cli.command('migrate')
+def migrate():
+    '''Applies any schema migrations that haven't been run'''
+    runner = MigrationRunner()
+    applied = runner.run()
+    if applied:
+        for name in applied:
+            click.echo(f'Applied {name}')
+    else:
+        click.echo('Database is up to date')
+
+
+@app.cli.command('worker')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty')
+def worker(burst):
+    '''Runs league import jobs from the queue'''
+    num_jobs = JobWorker().run(burst=burst)
+    click.echo(f'Ran {num_jobs} jobs')
+
+
+@app.cli.command('grade-benchmark')
+@click.option('--players', default=20000, help='Number of random players to grade')
+def grade_benchmark(players):
+    '''Times grading players one at a time against grading them all at once'''
+    random_players = create_random_players(players)
+    start = time.perf_counter()
+    scalar_grades = grade_scalar(random_players)
+    scalar_time = time.perf_counter() - start
+    start = time.perf_counter()
+    vector_grades = grade_vector(random_players)
+    vector_time = time.perf_counter() - start
+
+    if scalar_grades != vector_grades:
+        raise click.ClickException('Grades do not match')
+    click.echo(f'Graded {len(random_players)} players')
+    click.echo(f'One at a time: {scalar_time * 1000:.1f}ms')
+    click.echo(f'Vectorized: {vector_time * 1000:.1f}ms ({scalar_time / vector_time:.1f}x faster)')
+
+
+@app.cli.command('regrade-leagues')
+@click.option('--workers', type=int, default=None, help='Processes to grade with, one per core by default')
+@click.option('--batch-size', type=int, default=None, help='Leagues to load and write at a time')
+@click.option('--league-id', 'league_ids', type=int, multiple=True,
+              help='Stored id of a league to regrade, can be given more than once. Every league by default')
+def regrade_leagues(workers, batch_size, league_ids):
+    '''Regrades every stored league (or the ones given) from its players' stored points'''
+    regrader = BatchRegrader(workers=workers)
+    if batch_size:
+        regrader.batch_size = batch_size
+    start = time.perf_counter()
+    num_leagues = regrader.run(list(league_ids) or None)
+    elapsed = time.perf_counter() - start
+    click.echo(f'Regraded {num_leagues} leagues in {elapsed:.1f}s '
+               f'({num_leagues / elapsed:.1f} leagues/s) with {regrader.workers} workers')
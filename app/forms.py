@@ -43,9 +43,9 @@ class AddLeagueForm(FlaskForm):
     '''
     Form for adding a league
     Fields:
-            league_id, year, is_ppr
+            league_id, year
     Validation:
-                All inputs required except is_ppr, league_id must be a valid integer, year must be a valid year
+                All inputs required, league_id must be a valid integer, year must be a valid year
     '''
     league_id = IntegerField('League ID', validators=[
                              InputRequired(message='You must enter a League ID!')])
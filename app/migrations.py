@@ -0,0 +1,265 @@
+from app.database import db
+from espn.settings import STAT_NAMES
+
+
+class Migration:
+    '''
+    A named list of SQL statements that change the schema.
+    Databases made with db.create_all() already have the
+    models' schema, so every statement needs to be safe
+    to run against it (IF NOT EXISTS)
+    '''
+
+    def __init__(self, name, statements):
+        '''Sets the name and the statements to run'''
+        self.name = name
+        self.statements = statements
+
+
+def get_stat_array_copy(table, stats_table, key):
+    '''
+    Returns a statement that copies the rows of the old stats_table
+    (one row per stat) into the stats array column of table,
+    if stats_table still exists
+    '''
+    stat_names = ', '.join(f"'{name}'" for name in STAT_NAMES)
+    return f'''
+        DO $$ BEGIN
+            IF to_regclass('{stats_table}') IS NOT NULL THEN
+                UPDATE {table} SET stats = ARRAY(
+                    SELECT (SELECT s.stat_value FROM {stats_table} s
+                            WHERE s.{key} = {table}.id AND s.stat_name = n.name LIMIT 1)
+                    FROM unnest(ARRAY[{stat_names}]) WITH ORDINALITY AS n(name, i)
+                    ORDER BY n.i);
+            END IF;
+        END $$'''
+
+
+def get_trade_player_remap(column):
+    '''
+    Returns a statement that points the trades' column at the
+    same player in the shared copy of the player's league
+    '''
+    return f'''
+                UPDATE trades SET {column} = new_player.id
+                FROM players old_player
+                JOIN league_map m ON m.old_id = old_player.league_id AND m.old_id <> m.new_id
+                JOIN players new_player ON new_player.league_id = m.new_id
+                    AND new_player.player_id = old_player.player_id
+                WHERE trades.{column} = old_player.id;'''
+
+
+def get_shared_leagues_copy():
+    '''
+    Returns a statement that merges every user's copy of a league
+    into one shared league (the oldest copy), keeping each user's
+    claimed team and saved trades as a user_leagues row, if
+    leagues still has its user_id column
+    '''
+    trade_remaps = ''.join(get_trade_player_remap(column) for column in (
+        'player_to_trade_id', 'first_player_id', 'second_player_id', 'third_player_id'))
+    return f'''
+        DO $$ BEGIN
+            IF EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_name = 'leagues' AND column_name = 'user_id') THEN
+                CREATE TEMP TABLE league_map ON COMMIT DROP AS
+                SELECT id AS old_id, min(id) OVER (PARTITION BY league_id, year) AS new_id
+                FROM leagues;
+                {trade_remaps}
+                INSERT INTO user_leagues (user_id, league_id, user_team)
+                SELECT l.user_id, m.new_id, new_team.id
+                FROM leagues l
+                JOIN league_map m ON m.old_id = l.id
+                LEFT JOIN teams old_team ON old_team.id = l.user_team
+                LEFT JOIN teams new_team ON new_team.league_id = m.new_id
+                    AND new_team.team_id = old_team.team_id
+                WHERE l.user_id IS NOT NULL
+                ON CONFLICT (user_id, league_id) DO NOTHING;
+                DELETE FROM leagues USING league_map m
+                WHERE leagues.id = m.old_id AND m.old_id <> m.new_id;
+            END IF;
+        END $$'''
+
+
+def get_pro_players_copy():
+    '''
+    Returns a statement that moves each player's name, pro team,
+    and outlooks into one pro_players row for each ESPN player
+    and season, if players still has its name columns
+    '''
+    return '''
+        DO $$ BEGIN
+            IF EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_name = 'players' AND column_name = 'first_name') THEN
+                INSERT INTO pro_players (player_id, year, first_name, last_name, pro_team, position)
+                SELECT DISTINCT ON (p.player_id, l.year)
+                    p.player_id, l.year, p.first_name, p.last_name, p.pro_team, p.position
+                FROM players p JOIN leagues l ON l.id = p.league_id
+                ORDER BY p.player_id, l.year, p.id DESC
+                ON CONFLICT (player_id, year) DO NOTHING;
+                UPDATE players SET pro_player_id = pp.id
+                FROM leagues l, pro_players pp
+                WHERE l.id = players.league_id AND pp.player_id = players.player_id AND pp.year = l.year;
+                UPDATE players_outlooks SET pro_player_id = p.pro_player_id
+                FROM players p WHERE p.id = players_outlooks.player_id;
+                -- Every league had its own copy of the outlooks, the newest one is kept
+                DELETE FROM players_outlooks o USING players_outlooks newer
+                WHERE o.pro_player_id = newer.pro_player_id AND o.week = newer.week AND o.id < newer.id;
+                DELETE FROM players_outlooks WHERE pro_player_id IS NULL;
+            END IF;
+        END $$'''
+
+
+MIGRATIONS = [
+    Migration('0001_hot_query_indexes', [
+        'CREATE INDEX IF NOT EXISTS ix_teams_league_id ON teams (league_id)',
+        'CREATE INDEX IF NOT EXISTS ix_players_player_id_league_id ON players (player_id, league_id)',
+        'CREATE INDEX IF NOT EXISTS ix_players_team_id_position ON players (team_id, position)',
+        'CREATE INDEX IF NOT EXISTS ix_players_league_id_position_grade ON players (league_id, position, grade)',
+        'CREATE INDEX IF NOT EXISTS ix_trades_user_id ON trades (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_users_lower_username ON users (lower(username))',
+        'CREATE INDEX IF NOT EXISTS ix_users_lower_email ON users (lower(email))',
+    ]),
+    Migration('0002_stat_arrays', [
+        'ALTER TABLE players ADD COLUMN IF NOT EXISTS stats DOUBLE PRECISION[]',
+        'ALTER TABLE teams ADD COLUMN IF NOT EXISTS stats DOUBLE PRECISION[]',
+        # Databases made after stats moved into the arrays don't have the old tables
+        get_stat_array_copy('players', 'players_stats', 'player_id'),
+        get_stat_array_copy('teams', 'teams_stats', 'team_id'),
+        'DROP TABLE IF EXISTS players_stats',
+        'DROP TABLE IF EXISTS teams_stats',
+    ]),
+    Migration('0003_shared_leagues', [
+        'CREATE TABLE IF NOT EXISTS user_leagues ('
+        'id SERIAL PRIMARY KEY, '
+        'user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE, '
+        'league_id INTEGER NOT NULL REFERENCES leagues (id) ON DELETE CASCADE, '
+        'user_team INTEGER REFERENCES teams (id) ON DELETE SET NULL)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_user_leagues_user_id_league_id ON user_leagues (user_id, league_id)',
+        'CREATE INDEX IF NOT EXISTS ix_user_leagues_league_id ON user_leagues (league_id)',
+        'ALTER TABLE leagues ADD COLUMN IF NOT EXISTS ref_count INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE leagues ADD COLUMN IF NOT EXISTS imported_at TIMESTAMP',
+        get_shared_leagues_copy(),
+        'UPDATE leagues SET ref_count = (SELECT count(*) FROM user_leagues u WHERE u.league_id = leagues.id)',
+        # Dropping the columns drops their indexes too
+        'ALTER TABLE leagues DROP COLUMN IF EXISTS user_id',
+        'ALTER TABLE leagues DROP COLUMN IF EXISTS user_team',
+        'ALTER TABLE teams DROP COLUMN IF EXISTS user_id',
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_leagues_league_id_year ON leagues (league_id, year)',
+        'CREATE INDEX IF NOT EXISTS ix_teams_team_id_league_id ON teams (team_id, league_id)',
+    ]),
+    Migration('0004_pro_players', [
+        'CREATE TABLE IF NOT EXISTS pro_players ('
+        'id SERIAL PRIMARY KEY, '
+        'player_id INTEGER NOT NULL, '
+        'year INTEGER NOT NULL, '
+        'first_name TEXT NOT NULL, '
+        'last_name TEXT NOT NULL, '
+        'pro_team TEXT NOT NULL, '
+        'position TEXT NOT NULL)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_pro_players_player_id_year ON pro_players (player_id, year)',
+        'ALTER TABLE players ADD COLUMN IF NOT EXISTS pro_player_id INTEGER REFERENCES pro_players (id)',
+        'ALTER TABLE players_outlooks ADD COLUMN IF NOT EXISTS pro_player_id INTEGER '
+        'REFERENCES pro_players (id) ON DELETE CASCADE',
+        get_pro_players_copy(),
+        # Dropping the columns drops their indexes too
+        'ALTER TABLE players_outlooks DROP COLUMN IF EXISTS player_id, DROP COLUMN IF EXISTS league_id',
+        'ALTER TABLE players DROP COLUMN IF EXISTS first_name, DROP COLUMN IF EXISTS last_name, '
+        'DROP COLUMN IF EXISTS pro_team',
+        'ALTER TABLE players ALTER COLUMN pro_player_id SET NOT NULL',
+        'ALTER TABLE players_outlooks ALTER COLUMN pro_player_id SET NOT NULL',
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_players_outlooks_pro_player_id_week '
+        'ON players_outlooks (pro_player_id, week)',
+    ]),
+    Migration('0005_jobs', [
+        'CREATE TABLE IF NOT EXISTS jobs ('
+        'id SERIAL PRIMARY KEY, '
+        'user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE, '
+        'kind TEXT NOT NULL, '
+        'league_id INTEGER NOT NULL, '
+        'year INTEGER NOT NULL, '
+        'status TEXT NOT NULL, '
+        'stage TEXT, '
+        'progress INTEGER NOT NULL, '
+        'league_model_id INTEGER, '
+        'error TEXT, '
+        'created_at TIMESTAMP NOT NULL, '
+        'updated_at TIMESTAMP NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS ix_jobs_status_id ON jobs (status, id)',
+        'CREATE INDEX IF NOT EXISTS ix_jobs_user_id ON jobs (user_id)',
+    ]),
+    Migration('0006_grade_tables', [
+        "ALTER TABLE leagues ADD COLUMN IF NOT EXISTS grade_mode TEXT NOT NULL DEFAULT 'range'",
+        'CREATE TABLE IF NOT EXISTS grade_tables ('
+        'id SERIAL PRIMARY KEY, '
+        'league_id INTEGER NOT NULL REFERENCES leagues (id) ON DELETE CASCADE, '
+        'position TEXT NOT NULL, '
+        'scores DOUBLE PRECISION[] NOT NULL)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_grade_tables_league_id_position '
+        'ON grade_tables (league_id, position)',
+    ]),
+    # Players imported before this have no raw stats until their league is refreshed
+    Migration('0007_raw_stats', [
+        'ALTER TABLE players ADD COLUMN IF NOT EXISTS raw_stats DOUBLE PRECISION[]',
+    ]),
+    # Leagues imported before this are regraded with the default scoring until they're refreshed
+    Migration('0008_league_stat_values', [
+        'ALTER TABLE leagues ADD COLUMN IF NOT EXISTS stat_values JSON',
+    ]),
+]
+
+
+class MigrationRunner:
+    '''
+    Applies migrations that haven't been run yet, in
+    order. Applied migrations are recorded in the
+    schema_migrations table
+    '''
+
+    def __init__(self, migrations=MIGRATIONS):
+        '''Sets the migrations attribute to the list of migrations'''
+        self.migrations = migrations
+
+    def create_migrations_table(self):
+        '''Creates the schema_migrations table if it doesn't exist'''
+        db.session.execute('CREATE TABLE IF NOT EXISTS schema_migrations ('
+                           'name TEXT PRIMARY KEY, '
+                           'applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)')
+        db.session.commit()
+
+    def get_applied(self):
+        '''Returns a set of the names of the applied migrations'''
+        rows = db.session.execute('SELECT name FROM schema_migrations')
+        return {name for (name,) in rows}
+
+    def get_pending(self):
+        '''Returns a list of the migrations that haven't been applied'''
+        applied = self.get_applied()
+        return [migration for migration in self.migrations if migration.name not in applied]
+
+    def apply(self, migration):
+        '''
+        Runs the migration's statements and records it,
+        all in one transaction
+        '''
+        try:
+            for statement in migration.statements:
+                db.session.execute(statement)
+            db.session.execute('INSERT INTO schema_migrations (name) VALUES (:name)',
+                               {'name': migration.name})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def run(self):
+        '''
+        Applies every pending migration, and returns
+        a list of the names of the ones applied
+        '''
+        self.create_migrations_table()
+        applied = []
+        for migration in self.get_pending():
+            self.apply(migration)
+            applied.append(migration.name)
+        return applied
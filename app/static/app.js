@@ -52,49 +52,13 @@ function addDeleteLeagueAlert() {
   });
 }
 
-async function createGrades(leagueId) {
-  request_data = { league_id: leagueId };
-  response = await axios.post('/get-player-grades', request_data);
-  if (response.data.message === 'Grades Created!') {
-    return true;
-  }
-  else {
-    return false
-  }
-}
-
-async function createTeams(leagueId) {
-  request_data = { league_id: leagueId };
-  response = await axios.post('/create-teams', request_data);
-  if (response.data.message === 'Teams Created!') {
-    return true;
-  }
-  else {
-    return false
-  }
-}
-
-async function createLeague(leagueId, year) {
-  request_data = { league_id: leagueId, year: year };
-  response = await axios.post('/create-league', request_data);
-  if (response.data.message === 'League Created!') {
-    return response.data.league_model_id;
-  }
-  else {
-    return undefined
-  }
-}
-
-async function createPlayers(leagueId) {
-  request_data = { league_id: leagueId };
-  response = await axios.post('/create-players', request_data);
-  if (response.data.message === 'Players Created!') {
-    return true;
-  }
-  else {
-    return false
-  }
-}
+// What the import is doing once each stage is done
+const NEXT_IMPORT_STEP = {
+  league: 'Fetching Teams',
+  teams: 'Fetching Players',
+  players: 'Grading Players',
+  grades: 'Finishing Up'
+};
 
 async function addPlayersToDb(leagueId) {
   request_data = { league_id: leagueId };
@@ -112,29 +76,35 @@ function appendLoadingDiv(col, text) {
   col.append(div);
 }
 
-async function checkForSuccess(leagueId, leagueModelId, col) {
-  if (leagueModelId) {
-    col.empty();
-    appendLoadingDiv(col, 'Fetching Teams <i class="fas fa-spinner fa-spin"></i>');
-    teamsCreated = await createTeams(leagueId);
-    if (teamsCreated) {
+function importLeague(leagueId, year, col, refresh = false) {
+  /*
+  Imports the league with one request to /import-league,
+  showing each step as the server gets to it. If refresh
+  is true the league is fetched fresh. Resolves to the
+  league's id, or undefined if the import failed
+  */
+  return new Promise((resolve) => {
+    const source = new EventSource(`/import-league?league_id=${leagueId}&year=${year}&refresh=${refresh}`);
+    source.addEventListener('stage', (event) => {
+      const stage = JSON.parse(event.data).stage;
       col.empty();
-      appendLoadingDiv(col, 'Fetching Players <i class="fas fa-spinner fa-spin"></i>');
-      playersCreated = await createPlayers(leagueId);
-      if (playersCreated) {
+      appendLoadingDiv(col, `${NEXT_IMPORT_STEP[stage]} <i class="fas fa-spinner fa-spin"></i>`);
+    });
+    source.addEventListener('done', (event) => {
+      source.close();
+      col.empty();
+      resolve(JSON.parse(event.data).league_model_id);
+    });
+    // failed is sent by the server, error is sent by the browser if the connection drops
+    for (const eventName of ['failed', 'error']) {
+      source.addEventListener(eventName, () => {
+        source.close();
         col.empty();
-        appendLoadingDiv(col, 'Grading Players <i class="fas fa-spinner fa-spin"></i>');
-        gradesCreated = await createGrades(leagueId);
-        if (gradesCreated) {
-          col.empty();
-          return true;
-        }
-      }
+        appendLoadingDiv(col, 'SOMETHING WENT WRONG!');
+        resolve(undefined);
+      });
     }
-  }
-  col.empty();
-  appendLoadingDiv(col, 'SOMETHING WENT WRONG!');
-  return false;
+  });
 }
 
 async function addNewLeagueLoadingScreen() {
@@ -149,17 +119,24 @@ async function addNewLeagueLoadingScreen() {
     event.preventDefault();
     const leagueId = $addLeagueForm.find('input[name="league_id"]').val()
     const year = $addLeagueForm.find('input[name="year"]').val()
+    // The refresh page uses the same form, but the league is fetched fresh
+    const refresh = $addLeagueForm.data('refresh') === true;
     const $loadingRow = $('<div class="row">');
     const $loadingCol = $('<div class="col-12 text-center">');
     $loadingRow.append($loadingCol);
     $content.append($loadingRow);
     appendLoadingDiv($loadingCol, 'Fetching League <i class="fas fa-spinner fa-spin"></i>');
-    const leagueModelId = await createLeague(leagueId, year);
-    let success = await checkForSuccess(leagueId, leagueModelId, $loadingCol);
+    const leagueModelId = await importLeague(leagueId, year, $loadingCol, refresh);
 
-    if (success) {
+    if (leagueModelId && refresh) {
+      location = `/leagues/${leagueModelId}`;
+    }
+    else if (leagueModelId) {
       location = `/leagues/${leagueModelId}/select-team`;
     }
+    else if (refresh) {
+      location.reload();
+    }
     else {
       location = `/add-league`;
     }
@@ -304,6 +281,54 @@ async function addSaveTradeListener() {
   });
 }
 
+async function showWhatIfGrades(profile) {
+  /*
+  Shows the team's grades under the scoring
+  profile, or the league's grades if there isn't one
+  */
+  const $rows = $('.js-player-row');
+  const $teamGrade = $('#team-grade');
+  if (!profile) {
+    $rows.each((i, row) => {
+      const $points = $(row).find('.js-player-points');
+      const $grade = $(row).find('.js-player-grade');
+      $points.text($points.data('points'));
+      $grade.text($grade.data('grade'));
+    });
+    $teamGrade.text($teamGrade.data('grade'));
+    return;
+  }
+  const leagueId = $('#js-league-id').data('league-id');
+  const teamId = $('#js-team-id').data('team-id');
+  try {
+    const response = await axios.post(`/leagues/${leagueId}/what-if`, { profile });
+    const { players, teams } = response.data;
+    $rows.each((i, row) => {
+      const player = players[$(row).data('player-id')];
+      if (player) {
+        $(row).find('.js-player-points').text(player.points);
+        $(row).find('.js-player-grade').text(player.grade);
+      }
+    });
+    $teamGrade.text(teams[teamId]);
+  } catch (error) {
+    alert(error.response ? error.response.data.message : 'Could not regrade the league');
+  }
+}
+
+function addWhatIfListener() {
+  /*
+  Regrades the team whenever a different
+  scoring profile is selected
+  */
+  const $select = $('#scoring-profile');
+  const $teamGrade = $('#team-grade');
+  $teamGrade.data('grade', $teamGrade.text());
+  $select.change(async () => {
+    await showWhatIfGrades($select.val());
+  });
+}
+
 async function addPageItems() {
   /*
   Adds necessary items to the page,
@@ -317,6 +342,7 @@ async function addPageItems() {
   await addNewLeagueLoadingScreen();
   await addPlayerListeners();
   await addSaveTradeListener();
+  addWhatIfListener();
 }
 
 $(async () => {
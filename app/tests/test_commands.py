@@ -0,0 +1,53 @@
+from unittest import TestCase
+from app.app import app
+from app.database import db, add_to_db
+from app import commands  # Registers the commands with the app
+from espn.classes.import_class import LeagueImporter
+from espn.models import LeagueModel
+from espn.testing import create_test_payload
+from user.models import UserModel
+
+app.config['TESTING'] = True
+app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql:///ffl_trade_tips_test'
+app.config['SQLALCHEMY_ECHO'] = False
+
+db.drop_all()
+
+
+class RegradeLeaguesTestCase(TestCase):
+    '''Test Case for the regrade-leagues command'''
+
+    def setUp(self):
+        db.session.remove()
+        db.create_all()
+        user = UserModel(username='commanduser', email='command@email.com', password='password')
+        add_to_db(user)
+        self.league_ids = [LeagueImporter(league_id=league_id, year=2020, user_id=user.id,
+                                          data=create_test_payload()).run()
+                           for league_id in (78901, 78902, 78903)]
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_regrade_leagues(self):
+        '''Testing every league is regraded by default'''
+        result = app.test_cli_runner().invoke(args=['regrade-leagues', '--workers', '1'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Regraded 3 leagues', result.output)
+
+    def test_league_ids(self):
+        '''Testing only the given leagues are regraded'''
+        # Regrading sets the grade mode back to the default, so this shows which leagues were regraded
+        LeagueModel.query.update({LeagueModel.grade_mode: 'percentile'})
+        db.session.commit()
+        args = ['regrade-leagues', '--workers', '1']
+        for league_id in self.league_ids[:2]:
+            args.extend(['--league-id', str(league_id)])
+        result = app.test_cli_runner().invoke(args=args)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Regraded 2 leagues', result.output)
+
+        db.session.expire_all()
+        grade_modes = [LeagueModel.query.get(league_id).grade_mode for league_id in self.league_ids]
+        self.assertEqual(grade_modes, ['range', 'range', 'percentile'])
@@ -0,0 +1,257 @@
+import json
+from unittest import TestCase
+from sqlalchemy.dialects import postgresql
+from app.app import app
+from app.database import db
+from app.migrations import MigrationRunner, MIGRATIONS
+from espn.models import LeagueModel, UserLeagueModel, TeamModel, ProPlayerModel, PlayerModel, PlayerOutlookModel
+from user.models import UserModel, TradeModel
+
+app.config['TESTING'] = True
+app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql:///ffl_trade_tips_test'
+app.config['SQLALCHEMY_ECHO'] = False
+
+db.drop_all()
+
+num_users = 2000
+teams_per_league = 10
+players_per_team = 8
+num_pro_players = 5000
+
+
+def get_index_names():
+    '''Returns a set of the index names in the database'''
+    rows = db.session.execute(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = 'public'")
+    return {name for (name,) in rows}
+
+
+def seed_large_dataset():
+    '''
+    Fills the tables with one league per user, with
+    teams_per_league teams of players_per_team players each,
+    drawn from num_pro_players pro players in each of 5 seasons
+    '''
+    db.session.execute(f'''
+        INSERT INTO users (username, email, password)
+        SELECT 'User' || n, 'user' || n || '@email.com', 'password'
+        FROM generate_series(1, {num_users}) AS n''')
+    db.session.execute('''
+        INSERT INTO leagues (league_id, year, name, week, num_teams, ref_count)
+        SELECT 1000 + id, 2020, 'League ' || id, 10, 10, 1 FROM users''')
+    db.session.execute('''
+        INSERT INTO user_leagues (user_id, league_id)
+        SELECT users.id, leagues.id FROM users JOIN leagues ON leagues.league_id = 1000 + users.id''')
+    db.session.execute(f'''
+        INSERT INTO teams (team_id, league_id, location, nickname, points)
+        SELECT t, leagues.id, 'Team', 'Number ' || t, t * 100
+        FROM leagues, generate_series(1, {teams_per_league}) AS t''')
+    db.session.execute(f'''
+        INSERT INTO pro_players (player_id, year, first_name, last_name, pro_team, position)
+        SELECT n, year, 'Test', 'Player ' || n, 'FA', (ARRAY['QB', 'RB', 'WR', 'TE', 'K', 'D/ST'])[n % 6 + 1]
+        FROM generate_series(1, {num_pro_players}) AS n, generate_series(2016, 2020) AS year''')
+    db.session.execute(f'''
+        INSERT INTO players (player_id, team_id, league_id, pro_player_id,
+                             position, points, projected_points, position_rank, grade)
+        SELECT pro_players.player_id, teams.id, teams.league_id, pro_players.id,
+               pro_players.position, p * 10, p * 10, p, (ARRAY['A', 'B', 'C', 'D', 'F'])[p % 5 + 1]
+        FROM teams CROSS JOIN generate_series(1, {players_per_team}) AS p
+        JOIN pro_players ON pro_players.year = 2020
+            AND pro_players.player_id = (teams.league_id * 80 + teams.team_id * 8 + p) % {num_pro_players} + 1''')
+    db.session.execute('''
+        INSERT INTO players_outlooks (pro_player_id, week, outlook)
+        SELECT pro_players.id, week, 'Outlook' FROM pro_players, generate_series(1, 3) AS week''')
+    db.session.execute('''
+        INSERT INTO trades (user_id, player_to_trade_id, first_player_id)
+        SELECT players.league_id, players.id, players.id FROM players
+        WHERE players.position_rank = 1''')
+    db.session.commit()
+    db.session.execute('ANALYZE')
+
+
+def get_hot_queries():
+    '''Returns a dict of name => query for the app's hot query patterns'''
+    return {
+        'player by ESPN id': PlayerModel.query.filter_by(player_id=4001, league_id=500),
+        'pro player by ESPN id': ProPlayerModel.query.filter_by(player_id=4001, year=2020),
+        'outlooks by pro player': PlayerOutlookModel.query.filter_by(pro_player_id=500),
+        'players by team and position': PlayerModel.query.filter(
+            PlayerModel.position == 'QB', PlayerModel.team_id == 5000),
+        'players by league, position, and grade': PlayerModel.query.filter_by(
+            league_id=500, position='RB', grade='A'),
+        'team by ESPN id': TeamModel.query.filter_by(team_id=5, league_id=500),
+        'teams by league': TeamModel.query.filter_by(league_id=500),
+        'league by ESPN id': LeagueModel.query.filter_by(league_id=1500, year=2020),
+        'leagues by user': UserLeagueModel.query.filter_by(user_id=500),
+        'users by league': UserLeagueModel.query.filter_by(league_id=500),
+        'trades by user': TradeModel.query.filter_by(user_id=500),
+        'user by username': UserModel.query.filter(
+            db.func.lower(UserModel.username) == 'user500'),
+        'user by email': UserModel.query.filter(
+            db.func.lower(UserModel.email) == 'user500@email.com'),
+    }
+
+
+def get_scan_types(plan):
+    '''Returns a list of (node type, table) for every node in the plan'''
+    scans = [(plan['Node Type'], plan.get('Relation Name'))]
+    for child in plan.get('Plans', []):
+        scans.extend(get_scan_types(child))
+    return scans
+
+
+class MigrationRunnerTestCase(TestCase):
+    '''Test Case for MigrationRunner Class'''
+
+    def setUp(self):
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.session.execute('DROP TABLE IF EXISTS schema_migrations')
+        db.session.commit()
+        db.drop_all()
+
+    def test_run(self):
+        '''Testing migrations are applied once, and recorded'''
+        runner = MigrationRunner()
+        self.assertEqual(runner.run(), [m.name for m in MIGRATIONS])
+        self.assertEqual(runner.get_applied(), {m.name for m in MIGRATIONS})
+        self.assertEqual(runner.run(), [])
+
+    def test_creates_indexes(self):
+        '''Testing the index migration adds the indexes to an existing database'''
+        index_names = {'ix_players_player_id_league_id', 'ix_players_team_id_position',
+                       'ix_teams_league_id', 'ix_trades_user_id', 'ix_users_lower_username',
+                       'ix_users_lower_email'}
+        for name in index_names:
+            db.session.execute(f'DROP INDEX {name}')
+        db.session.commit()
+        self.assertFalse(index_names & get_index_names())
+
+        MigrationRunner().run()
+        self.assertTrue(index_names <= get_index_names())
+
+    def test_copies_stats(self):
+        '''Testing the stat array migration copies the old stat rows into the arrays'''
+        db.session.execute('''
+            INSERT INTO users (id, username, email, password) VALUES (1, 'testuser', 'test@email.com', 'password');
+            INSERT INTO leagues (id, league_id, year, name, week, num_teams)
+                VALUES (1, 1234, 2020, 'Test League', 1, 1);
+            INSERT INTO pro_players (id, player_id, year, first_name, last_name, pro_team, position)
+                VALUES (1, 1, 2020, 'Test', 'Player', 'FA', 'QB');
+            INSERT INTO players (id, player_id, league_id, pro_player_id,
+                                 position, points, projected_points, position_rank)
+                VALUES (1, 1, 1, 1, 'QB', 100, 100, 1);
+            ALTER TABLE players DROP COLUMN stats;
+            CREATE TABLE players_stats (id SERIAL PRIMARY KEY, player_id INTEGER, league_id INTEGER,
+                                        stat_name TEXT NOT NULL, stat_value FLOAT NOT NULL);
+            INSERT INTO players_stats (player_id, league_id, stat_name, stat_value)
+                VALUES (1, 1, 'Passing Yards', 300.5), (1, 1, 'Lost Fumbles', 2);''')
+        db.session.commit()
+
+        MigrationRunner().run()
+        db.session.expire_all()
+        player = PlayerModel.query.get(1)
+        self.assertEqual(player.get_stats_dict(), {
+                         'Passing Yards': 300.5, 'Lost Fumbles': 2.0})
+        self.assertNotIn('players_stats', db.engine.table_names())
+
+    def test_shares_leagues(self):
+        '''Testing the shared league migration merges each user's copy of a league'''
+        db.session.execute('''
+            DROP TABLE user_leagues;
+            DROP INDEX uq_leagues_league_id_year;
+            ALTER TABLE leagues DROP COLUMN ref_count, DROP COLUMN imported_at,
+                ADD COLUMN user_id INTEGER, ADD COLUMN user_team INTEGER;
+            ALTER TABLE teams ADD COLUMN user_id INTEGER;
+            INSERT INTO users (id, username, email, password) VALUES
+                (1, 'testuser', 'test@email.com', 'password'),
+                (2, 'otheruser', 'other@email.com', 'password');
+            INSERT INTO leagues (id, league_id, user_id, user_team, year, name, week, num_teams) VALUES
+                (1, 1234, 1, 2, 2020, 'Test League', 1, 2),
+                (2, 1234, 2, 3, 2020, 'Test League', 1, 2);
+            INSERT INTO teams (id, team_id, league_id, user_id) VALUES
+                (1, 1, 1, 1), (2, 2, 1, 1), (3, 1, 2, 2), (4, 2, 2, 2);
+            INSERT INTO pro_players (id, player_id, year, first_name, last_name, pro_team, position)
+                VALUES (1, 10, 2020, 'Test', 'Player', 'FA', 'QB');
+            INSERT INTO players (id, player_id, team_id, league_id, pro_player_id,
+                                 position, points, projected_points, position_rank) VALUES
+                (1, 10, 1, 1, 1, 'QB', 100, 100, 1),
+                (2, 10, 3, 2, 1, 'QB', 100, 100, 1);
+            INSERT INTO trades (id, user_id, player_to_trade_id, first_player_id) VALUES (1, 2, 2, 2);''')
+        db.session.commit()
+
+        MigrationRunner().run()
+        db.session.expire_all()
+        league = LeagueModel.query.one()
+        self.assertEqual(league.id, 1)
+        self.assertEqual(league.ref_count, 2)
+        self.assertEqual(TeamModel.query.count(), 2)
+        memberships = {m.user_id: m.user_team for m in league.members}
+        # Each user keeps their team, in the shared copy of the league
+        self.assertEqual(memberships, {1: 2, 2: 1})
+        trade = TradeModel.query.get(1)
+        self.assertEqual(trade.player_to_trade_id, 1)
+        self.assertEqual(trade.first_player_id, 1)
+
+    def test_moves_pro_players(self):
+        '''Testing the pro player migration stores each player's info and outlooks once per season'''
+        db.session.execute('''
+            DROP INDEX uq_players_outlooks_pro_player_id_week;
+            ALTER TABLE players ALTER COLUMN pro_player_id DROP NOT NULL,
+                ADD COLUMN first_name TEXT, ADD COLUMN last_name TEXT, ADD COLUMN pro_team TEXT;
+            ALTER TABLE players_outlooks ALTER COLUMN pro_player_id DROP NOT NULL,
+                ADD COLUMN player_id INTEGER, ADD COLUMN league_id INTEGER;
+            INSERT INTO leagues (id, league_id, year, name, week, num_teams) VALUES
+                (1, 1234, 2020, 'Test League', 1, 1),
+                (2, 5678, 2020, 'Other League', 1, 1),
+                (3, 1234, 2019, 'Test League', 1, 1);
+            INSERT INTO players (id, player_id, league_id, first_name, last_name, pro_team,
+                                 position, points, projected_points, position_rank) VALUES
+                (1, 10, 1, 'Test', 'Player', 'FA', 'QB', 100, 100, 1),
+                (2, 10, 2, 'Test', 'Player', 'NE', 'QB', 100, 100, 1),
+                (3, 10, 3, 'Test', 'Player', 'FA', 'QB', 100, 100, 1);
+            INSERT INTO players_outlooks (player_id, league_id, week, outlook) VALUES
+                (1, 1, 1, 'Old outlook'), (2, 2, 1, 'New outlook'), (2, 2, 2, 'Week 2'),
+                (3, 3, 1, 'Last season');''')
+        db.session.commit()
+
+        MigrationRunner().run()
+        db.session.expire_all()
+        self.assertEqual(ProPlayerModel.query.count(), 2)
+        [player_1, player_2, player_3] = PlayerModel.query.order_by(PlayerModel.id).all()
+        self.assertEqual(player_1.pro_player_id, player_2.pro_player_id)
+        self.assertNotEqual(player_1.pro_player_id, player_3.pro_player_id)
+        self.assertEqual(player_1.pro_team, 'NE')
+        self.assertEqual([(o.week, o.outlook) for o in player_1.outlooks],
+                         [(1, 'New outlook'), (2, 'Week 2')])
+        self.assertEqual([o.outlook for o in player_3.outlooks], ['Last season'])
+        self.assertEqual(PlayerOutlookModel.query.count(), 3)
+
+
+class HotQueryPlanTestCase(TestCase):
+    '''Test Case for the query plans of the hot queries'''
+
+    @classmethod
+    def setUpClass(cls):
+        db.create_all()
+        seed_large_dataset()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+
+    def test_no_sequential_scans(self):
+        '''Testing none of the hot queries fall back to a sequential scan'''
+        for name, query in get_hot_queries().items():
+            sql = query.statement.compile(dialect=postgresql.dialect(),
+                                          compile_kwargs={'literal_binds': True})
+            [[plan]] = db.session.execute(f'EXPLAIN (FORMAT JSON) {sql}').fetchone()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = get_scan_types(plan['Plan'])
+            with self.subTest(query=name):
+                self.assertNotIn('Seq Scan', [node for (node, table) in scans],
+                                 f'{name} ran a sequential scan: {scans}')
@@ -0,0 +1,36 @@
+import random
+from espn.classes.grade_class import GradeCalculator, VectorGradeCalculator, PlayerRecord
+from espn.settings import DEFAULT_STAT_VALUES, POSITIONS
+
+
+def create_random_players(num_players, seed=0):
+    '''
+    Returns num_players random PlayerRecords, plus players
+    on 0, negative, and every grade bound at each position
+    '''
+    rng = random.Random(seed)
+    players = [PlayerRecord(round(rng.uniform(-20, 400), 2), rng.choice(POSITIONS))
+               for _ in range(num_players)]
+    for position in POSITIONS:
+        # 400 points is the max, so these are on the A, B, C, and D bounds
+        players.extend(PlayerRecord(points, position) for points in (0, -5, 80, 160, 240, 320, 400))
+    return players
+
+
+def grade_scalar(players):
+    '''Returns the players' grades, graded one at a time with GradeCalculator'''
+    grader = GradeCalculator(DEFAULT_STAT_VALUES)
+    for player in players:
+        grader.get_pos_extremes(player)
+    grader.set_grade_ranges()
+    return [grader.grade_player(player) for player in players]
+
+
+def grade_vector(players):
+    '''Returns the players' grades, graded all at once with VectorGradeCalculator'''
+    grader = VectorGradeCalculator(DEFAULT_STAT_VALUES)
+    [points, codes] = grader.get_record_arrays(players)
+    grader.set_extremes(points, codes)
+    grader.set_grade_tables(points, codes)
+    grader.set_grade_ranges()
+    return grader.grade_players(points, codes).tolist()
@@ -1,7 +1,185 @@
 import datetime
+import json
+import logging
+import os
+import random
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from app.database import db, add_to_db
-from espn.settings import STATS_MAP
+from espn.classes.fixture_class import espn_fixtures
+from espn.classes.response_cache_class import espn_response_cache
+from espn.classes.single_flight_class import single_flight
+from espn.settings import STAT_NAMES, STAT_INDEXES, ESPN_API_URL, ESPN_REQUEST_MODE, ESPN_CONNECT_TIMEOUT, ESPN_READ_TIMEOUT, ESPN_MAX_RETRIES, ESPN_RETRY_BACKOFF, ESPN_MAX_PAYLOAD_BYTES, ESPN_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Statuses that are worth retrying, anything else is returned as is
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ESPNRequestError(Exception):
+    '''
+    Raised when the ESPN API can't be reached, keeps
+    failing after every retry, or sends back a payload
+    bigger than we allow
+    '''
+
+
+class ESPNResponse:
+    '''
+    Class holding a fully read response from the
+    ESPN API, along with what the call cost
+    '''
+
+    def __init__(self, status_code, headers, content, latency, num_bytes, wire_bytes):
+        '''
+        Sets the status, headers, and body of the response,
+        the latency (seconds) of the call, and the number of
+        bytes read (decoded, and as sent over the wire)
+        '''
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.latency = latency
+        self.num_bytes = num_bytes
+        self.wire_bytes = wire_bytes
+
+    def json(self):
+        '''Returns the body of the response parsed as JSON'''
+        return json.loads(self.content)
+
+
+class ESPNClient:
+    '''
+    Shared HTTP client for the ESPN API. Keeps a pool
+    of keep-alive connections, asks for compressed responses,
+    retries failed requests with jittered backoff, and
+    keeps track of what the calls cost
+    '''
+
+    def __init__(self, connect_timeout=ESPN_CONNECT_TIMEOUT, read_timeout=ESPN_READ_TIMEOUT,
+                 max_retries=ESPN_MAX_RETRIES, retry_backoff=ESPN_RETRY_BACKOFF,
+                 max_payload_bytes=ESPN_MAX_PAYLOAD_BYTES, pool_size=ESPN_POOL_SIZE):
+        '''
+        Sets the timeouts, retry and payload settings,
+        and initializes the call counters. The session
+        itself is created on the first request
+        '''
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_payload_bytes = max_payload_bytes
+        self.pool_size = pool_size
+        self.session = None
+        self.pid = None
+        self.calls = 0
+        self.total_latency = 0
+        self.total_bytes = 0
+        self.total_wire_bytes = 0
+
+    def get_session(self):
+        '''
+        Returns the session for this process, creating
+        it if needed. Pooled connections can't be shared
+        between forked workers, so each process gets its own
+        '''
+        if self.session is None or self.pid != os.getpid():
+            session = requests.Session()
+            # We handle retries ourselves so we can add jitter
+            adapter = HTTPAdapter(pool_connections=self.pool_size,
+                                  pool_maxsize=self.pool_size, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'Accept': 'application/json',
+                                    'Accept-Encoding': 'gzip, deflate'})
+            self.session = session
+            self.pid = os.getpid()
+        return self.session
+
+    def get_backoff(self, attempt):
+        '''
+        Returns how long to wait before the given retry
+        attempt. The wait doubles each attempt, and is jittered
+        so workers retrying at the same time spread out
+        '''
+        return random.uniform(0, self.retry_backoff * (2 ** attempt))
+
+    def read_content(self, response):
+        '''
+        Reads the body of a streamed response, raising
+        an ESPNRequestError if it goes over the payload cap
+        '''
+        content_length = response.headers.get('Content-Length')
+        if content_length and int(content_length) > self.max_payload_bytes:
+            response.close()
+            raise ESPNRequestError(
+                f'Payload of {content_length} bytes is over the {self.max_payload_bytes} byte cap')
+
+        content = bytearray()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            content.extend(chunk)
+            if len(content) > self.max_payload_bytes:
+                response.close()
+                raise ESPNRequestError(
+                    f'Payload is over the {self.max_payload_bytes} byte cap')
+        return bytes(content)
+
+    def record_call(self, url, response):
+        '''Adds the call to the counters and logs what it cost'''
+        self.calls += 1
+        self.total_latency += response.latency
+        self.total_bytes += response.num_bytes
+        self.total_wire_bytes += response.wire_bytes
+        logger.info('ESPN GET %s status=%s latency=%.3fs bytes=%s wire_bytes=%s',
+                    url, response.status_code, response.latency, response.num_bytes, response.wire_bytes)
+
+    def get(self, url, params=None, cookies=None, headers=None):
+        '''
+        Sends a GET request to the url, retrying on connection
+        errors, timeouts, and retryable statuses. Returns an
+        ESPNResponse, or raises an ESPNRequestError if every
+        attempt fails
+        '''
+        session = self.get_session()
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.get_backoff(attempt - 1))
+
+            start = time.monotonic()
+            try:
+                response = session.get(url, params=params, cookies=cookies, headers=headers,
+                                       timeout=self.timeout, stream=True)
+                content = self.read_content(response)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as error:
+                last_error = error
+                continue
+
+            latency = time.monotonic() - start
+            # tell() gives the bytes read off the wire, before decompression
+            wire_bytes = response.raw.tell() if response.raw else len(content)
+            espn_response = ESPNResponse(
+                response.status_code, response.headers, content, latency, len(content), wire_bytes)
+            self.record_call(url, espn_response)
+
+            if response.status_code in RETRY_STATUSES:
+                last_error = f'status {response.status_code}'
+                continue
+            return espn_response
+
+        raise ESPNRequestError(
+            f'ESPN request failed after {self.max_retries + 1} attempts: {last_error}')
+
+    def get_stats(self):
+        '''Returns the call counters for this process'''
+        return {'calls': self.calls, 'total_latency': round(self.total_latency, 3),
+                'total_bytes': self.total_bytes, 'total_wire_bytes': self.total_wire_bytes}
+
+
+# One client per process, so connections are reused between requests
+espn_client = ESPNClient()
 
 
 class ESPNRequest:
@@ -10,26 +188,99 @@ class ESPNRequest:
     ESPN API
     '''
 
-    def __init__(self, league_id, year, cookies=None):
+    def __init__(self, league_id, year, cookies=None, mode=ESPN_REQUEST_MODE):
         '''
         Sets the league id & year from the parameters,
         and creates a base url with those params that will
-        be used for following API requests
+        be used for following API requests. mode is 'live',
+        'record' (live, and save fixtures), or 'replay'
+        (only serve saved fixtures)
         '''
         self.league_id = league_id
         self.year = year
         self.cookies = cookies
-        self.base_url = f'https://fantasy.espn.com/apis/v3/games/ffl/seasons/{self.year}/segments/0/leagues/{self.league_id}'
+        self.mode = mode
+        self.base_url = f'{ESPN_API_URL}/seasons/{self.year}/segments/0/leagues/{self.league_id}'
+        # Set after each request, so callers can see what it cost
+        self.latency = None
+        self.num_bytes = None
+        self.cache_hit = False
+
+    def send_request(self, params=None, headers=None):
+        '''
+        Sends the request through the shared client and
+        records what it cost on the instance
+        '''
+        response = espn_client.get(
+            self.base_url, params=params, cookies=self.cookies, headers=headers)
+        self.latency = response.latency
+        self.num_bytes = response.num_bytes
+        return response
+
+    def replay_response_content(self, params=None):
+        '''
+        Returns the raw body of a saved fixture for the
+        params, raising an ESPNRequestError if there isn't one
+        '''
+        content = espn_fixtures.load(self.league_id, self.year, params)
+        if content is None:
+            raise ESPNRequestError(
+                f'No fixture for league {self.league_id} ({self.year}) with params {params}')
+        self.latency = 0
+        self.num_bytes = len(content)
+        return content
+
+    def get_response_content(self, params=None):
+        '''
+        Returns the raw body of the response for the params.
+        In replay mode it comes from a saved fixture, in record
+        mode the response is saved as a fixture
+        '''
+        if self.mode == 'replay':
+            return self.replay_response_content(params=params)
+
+        content = self.get_live_response_content(params=params)
+        if self.mode == 'record':
+            espn_fixtures.save(self.league_id, self.year, params, content)
+        return content
+
+    def get_live_response_content(self, params=None):
+        '''
+        Returns the raw body of the response for the params.
+        If we have the response cached we send a conditional
+        request, and use the cached body if ESPN says it
+        hasn't changed (304). Raises an ESPNRequestError
+        if ESPN can't be reached
+        '''
+        cache_key = espn_response_cache.make_key(
+            self.base_url, params, self.cookies)
+        headers = espn_response_cache.get_conditional_headers(cache_key)
+        response = self.send_request(params=params, headers=headers)
+
+        if response.status_code == 304:
+            content = espn_response_cache.load(cache_key)
+            if content is not None:
+                espn_response_cache.record_hit()
+                self.cache_hit = True
+                return content
+            # The entry was evicted after we checked it, so we need the full response
+            response = self.send_request(params=params)
+
+        espn_response_cache.record_miss()
+        self.cache_hit = False
+        if response.status_code == 200:
+            espn_response_cache.store(
+                cache_key, self.base_url, response.headers, response.content)
+        return response.content
 
     def get_response_data(self, params=None):
         '''
         Takes in a dict 'params' that contains
         any views, and other settings to use with
-        the API request
+        the API request. Raises an ESPNRequestError
+        if ESPN can't be reached
         '''
-        response = requests.get(self.base_url, params=params)
-
-        data = response.json()
+        data = json.loads(self.get_response_content(params=params))
         return data
 
 
@@ -58,22 +309,42 @@ class ESPNBase:
         self._year = self.league_info['year']
         self._cookies = self.league_info['cookies']
 
-    def make_espn_request(self, params=None):
+    def make_espn_content_request(self, params=None):
         '''
         Makes an ESPN Request with the given params by
-        instantiating an ESPNRequest object
+        instantiating an ESPNRequest object, and returns
+        the raw body. Concurrent requests for the same
+        league and params share one fetch
         '''
         _request = ESPNRequest(
             league_id=self._league_id, year=self._year, cookies=self._cookies)
-        return _request.get_response_data(params=params)
+        key = single_flight.make_key(
+            self._league_id, self._year, params, self._cookies)
+        return single_flight.do(key, lambda: _request.get_response_content(params=params))
+
+    def make_espn_request(self, params=None):
+        '''
+        Makes an ESPN Request with the given params
+        and returns the parsed JSON
+        '''
+        return json.loads(self.make_espn_content_request(params=params))
+
+    def create_stats(self):
+        '''
+        Returns an empty stats list, which holds a value
+        for each stat in STAT_NAMES (None if there isn't one)
+        '''
+        return [None] * len(STAT_NAMES)
 
-    def add_stats(self, stats_to_check):
+    def add_stats(self, stats_to_check, stats=None):
         '''
         Adds each stat from dict 'stats_to_check'
-        to the player's stats dict.
+        to the stats list (the player's stats list
+        if there isn't one).
         '''
+        if stats is None:
+            stats = self.stats
         for stat, val in stats_to_check.items():
-            stat = int(stat)
-            stat_name = STATS_MAP.get(stat)
-            if stat_name:
-                self.stats[stat_name] = round(val, 2)
+            index = STAT_INDEXES.get(int(stat))
+            if index is not None:
+                stats[index] = round(val, 2)
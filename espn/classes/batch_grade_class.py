@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from app.database import db
+from espn.classes.grade_class import VectorGradeCalculator, PlayerRecord, get_team_grades
+from espn.classes.model_handler_classes import RegradeBatchModelHandler
+from espn.models import LeagueModel, PlayerModel
+from espn.settings import DEFAULT_STAT_VALUES, GRADE_MODE, REGRADE_BATCH_SIZE
+
+
+def grade_league_records(task):
+    '''
+    Grades one league from a (league_id, grade_mode, players)
+    task, where players is a list of (PlayerModel id, TeamModel id,
+    position, points) tuples. Only uses what's passed in, so it
+    can run in another process. Returns a list of the league_id,
+    a dict of player id => grade, a dict of team id => grade,
+    and a dict of position => sorted list of scores
+    '''
+    (league_id, grade_mode, players) = task
+    grader = VectorGradeCalculator(DEFAULT_STAT_VALUES, grade_mode)
+    records = [PlayerRecord(points, position) for (id, team_id, position, points) in players]
+    [points, codes] = grader.get_record_arrays(records)
+    grader.set_extremes(points, codes)
+    grader.set_grade_tables(points, codes)
+    grader.set_grade_ranges()
+    grades = grader.grade_players(points, codes).tolist()
+
+    team_ids = sorted({team_id for (id, team_id, position, points) in players})
+    team_indexes = {team_id: index for (index, team_id) in enumerate(team_ids)}
+    player_team_indexes = np.array([team_indexes[team_id] for (id, team_id, position, points) in players],
+                                   dtype=np.intp)
+    team_grades = get_team_grades(grades, player_team_indexes, len(team_ids))
+
+    return [league_id,
+            {id: grade for ((id, team_id, position, points), grade) in zip(players, grades)},
+            dict(zip(team_ids, team_grades)),
+            {position: table.tolist() for (position, table) in grader.grade_tables.items()}]
+
+
+class BatchRegrader:
+    '''
+    Regrades every stored league from the players' stored
+    points. Leagues are loaded and written back batch_size at
+    a time, and each league in a batch is graded in its own
+    task on a pool of processes, so every core is used
+    '''
+
+    def __init__(self, workers=None, batch_size=REGRADE_BATCH_SIZE, grade_mode=GRADE_MODE):
+        '''
+        Sets the number of processes (one per core if there
+        isn't one), how many leagues are loaded and written
+        at a time, and the mode leagues are graded with
+        '''
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.grade_mode = grade_mode
+
+    def get_league_ids(self):
+        '''Returns the id of every stored league'''
+        return [id for (id,) in db.session.query(LeagueModel.id).order_by(LeagueModel.id)]
+
+    def get_tasks(self, league_ids):
+        '''
+        Returns a grading task for each of the leagues
+        with players, loading their players with one query
+        '''
+        rows = db.session.query(PlayerModel.league_id, PlayerModel.id, PlayerModel.team_id,
+                                PlayerModel.position, PlayerModel.points).filter(
+            PlayerModel.league_id.in_(league_ids)).order_by(PlayerModel.id)
+        players = {}
+        for (league_id, id, team_id, position, points) in rows:
+            players.setdefault(league_id, []).append((id, team_id, position, points))
+        return [(league_id, self.grade_mode, players[league_id])
+                for league_id in league_ids if league_id in players]
+
+    def run(self, league_ids=None):
+        '''
+        Regrades the leagues (every league if there aren't
+        any given), and returns the number regraded
+        '''
+        if league_ids is None:
+            league_ids = self.get_league_ids()
+        num_leagues = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for start in range(0, len(league_ids), self.batch_size):
+                tasks = self.get_tasks(league_ids[start:start + self.batch_size])
+                results = list(executor.map(grade_league_records, tasks))
+                RegradeBatchModelHandler(results, self.grade_mode).update_records()
+                num_leagues += len(results)
+        return num_leagues
@@ -0,0 +1,58 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from espn.classes.base_classes import ESPNRequestError
+from espn.classes.payload_store_class import fetch_league_payload
+from espn.settings import BULK_FETCH_CONCURRENCY
+
+
+class BulkLeagueFetcher:
+    '''
+    Fetches the payloads for many leagues at once.
+    Fetches run concurrently (up to the concurrency limit),
+    so fetching every league takes about as long as the
+    slowest one instead of the sum of all of them
+    '''
+
+    def __init__(self, concurrency=BULK_FETCH_CONCURRENCY):
+        '''Sets the max number of fetches in flight at once'''
+        self.concurrency = concurrency
+
+    async def fetch_league(self, loop, executor, semaphore, league_id, year):
+        '''
+        Fetches a single league in the executor, and returns
+        ((league_id, year), payload) where payload is the raw
+        response. It's None if ESPN couldn't be reached
+        '''
+        async with semaphore:
+            try:
+                payload = await loop.run_in_executor(
+                    executor, lambda: fetch_league_payload(league_id, year, refresh=True))
+            except ESPNRequestError:
+                payload = None
+        return ((league_id, year), payload)
+
+    async def fetch_many(self, pairs):
+        '''
+        Fetches every (league_id, year) pair concurrently,
+        and returns a dict of (league_id, year) => payload
+        '''
+        loop = asyncio.get_event_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # ESPNRequest is blocking, so each fetch runs on a thread of its own.
+        # They all share the pooled ESPN client
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            results = await asyncio.gather(*[self.fetch_league(loop, executor, semaphore, league_id, year)
+                                             for (league_id, year) in pairs])
+        return dict(results)
+
+    def fetch_all(self, pairs):
+        '''
+        Takes a list of (league_id, year) pairs, and returns a
+        dict of (league_id, year) => payload. Ids are cast to
+        ints, and duplicate pairs are only fetched once
+        '''
+        pairs = list(dict.fromkeys((int(league_id), int(year))
+                                   for (league_id, year) in pairs))
+        if not pairs:
+            return {}
+        return asyncio.run(self.fetch_many(pairs))
@@ -1,9 +1,11 @@
-from app.database import db
+import numpy as np
 from espn.classes.base_classes import ESPNBase
-from espn.classes.grade_class import GradeCalculator
-from espn.classes.model_handler_classes import LeagueModelHandler, TeamModelHandler, PlayerModelHandler
-from espn.models import LeagueModel, TeamModel, TeamStatModel, PlayerModel, PlayerStatModel
-from espn.settings import PRO_TEAM_MAP, STATS_MAP, POSITION_MAP, DEFAULT_STAT_VALUES, GRADE_TO_VALUE, VALUE_TO_GRADE
+from espn.classes.grade_class import VectorGradeCalculator, IncrementalGrader, get_team_grades
+from espn.classes.model_handler_classes import LeagueModelHandler, TeamBatchModelHandler, ProPlayerBatchModelHandler, PlayerBatchModelHandler, GradeBatchModelHandler
+from espn.classes.payload_store_class import league_payload_store
+from espn.classes.scoring_class import ScoringEngine
+from espn.classes.stream_class import LeaguePayloadStream
+from espn.settings import PRO_TEAM_MAP, STATS_MAP, POSITION_MAP, DEFAULT_STAT_VALUES, FETCH_PROFILES, GRADE_MODE, GRADE_POINTS
 
 
 class LeagueSettings:
@@ -49,30 +51,50 @@ class LeagueSettings:
 class League(ESPNBase):
     '''ESPN API Wrapper for Leagues'''
 
-    def __init__(self, league_id, year, user_id, cookies=None):
+    def __init__(self, league_id, year, cookies=None, refresh=False, profile='full'):
         '''
         Gets basic league settings then
-        creates the league
+        creates the league. If refresh is True
+        the league data is fetched from the API
+        even if we have a stored copy. profile is
+        the fetch profile (see FETCH_PROFILES), which
+        sets which views are requested
         '''
         self.id = league_id
         self.year = year
+        self.profile = profile
         # Cookies are currently unnecessary, but will be needed for private league support in v2
         self.cookies = cookies
-        self.user_id = user_id
+        # team_ids and player_ids are the league's identity map (ESPN id => DB id),
+        # they're shared with every team and player through league_info. outlook_weeks
+        # is ESPN player id => weeks with a stored outlook, for the season
         self.league_info = {'league_model_id': None, 'league_id': self.id,
-                            'year': self.year, 'cookies': self.cookies, 'user_id': self.user_id}
+                            'year': self.year, 'cookies': self.cookies,
+                            'team_ids': None, 'player_ids': None, 'outlook_weeks': None,
+                            'stored_players': {}, 'stored_grading': None}
+        # Set by start_grading
+        self.grader = None
+        self.incremental_grades = None
+        if refresh:
+            league_payload_store.evict(self.id, self.year)
         self.create_league()
 
     def get_data(self):
         '''
         Gets the data for the league,
         we use this data to create the league,
-        every team, and every player
+        every team, and every player. The data is
+        shared through the payload store, so each step
+        of an import doesn't request it again.
+        Only the league level fields are parsed here,
+        teams are streamed from the payload in get_teams
         '''
         super().__init__()
-        views = ['mTeam', 'mRoster', 'mSettings', 'kona_playercard']
-        params = {'view': views}
-        self.data = self.make_espn_request(params)
+        params = {'view': FETCH_PROFILES[self.profile]}
+        content = league_payload_store.get_or_fetch(
+            self.id, self.year, lambda: self.make_espn_content_request(params), self.profile, self.cookies)
+        self.stream = LeaguePayloadStream(content, self.year)
+        self.data = self.stream.read_league_fields()
 
     def get_settings(self):
         '''
@@ -109,68 +131,160 @@ class League(ESPNBase):
         Gets the number of teams
         in the league from the API
         '''
-        self.num_teams = 0
-
-        for team in self.data['teams']:
-            self.num_teams += 1
+        self.num_teams = self.data['num_teams']
 
     def get_teams(self):
         '''
         Gets team data from the
         API, and iterates through
         the response, adding instances
-        of the Team class to the teams attribute
+        of the Team class to the teams attribute.
+        Teams are parsed from the payload one at a time
         '''
-        for team in self.data['teams']:
+        for team in self.stream.iter_teams():
             new_team = Team(data=team, league_info=self.league_info)
             self.teams.add(new_team)
 
         self.num_teams = len(self.teams)
 
+    def get_team_ids(self):
+        '''
+        Loads the ESPN team id => TeamModel id map for
+        the league with one query, unless we already have it
+        '''
+        if self.league_info['team_ids'] is None:
+            db_handler = TeamBatchModelHandler(
+                [], self.league_info['league_model_id'])
+            self.league_info['team_ids'] = db_handler.get_team_ids()
+
+    def get_player_ids(self):
+        '''
+        Loads the ESPN player id => PlayerModel id map for
+        the league with one query, unless we already have it
+        '''
+        if self.league_info['player_ids'] is None:
+            db_handler = PlayerBatchModelHandler(
+                [], self.league_info['league_model_id'])
+            self.league_info['player_ids'] = db_handler.get_player_ids()
+
+    def get_outlook_weeks(self):
+        '''
+        Loads the weeks each player in the season has a stored
+        outlook for with one query, unless we already have them
+        '''
+        if self.league_info['outlook_weeks'] is None:
+            db_handler = ProPlayerBatchModelHandler([], self.year)
+            self.league_info['outlook_weeks'] = db_handler.get_outlook_weeks()
+
+    def get_rosters(self):
+        '''
+        Gets the roster for every team. The teams need to
+        be in the database, so players can be given their team's id
+        '''
+        self.get_team_ids()
+        self.get_outlook_weeks()
+        for team in self.teams:
+            team.get_roster()
+
+    def get_grading_arrays(self):
+        '''
+        Sets the graded_players attribute to a list of every
+        rostered player, and the grading arrays (points,
+        position codes, and team indexes) to arrays in the
+        same order, so the league can be graded at once
+        '''
+        self.graded_teams = list(self.teams)
+        self.graded_players = []
+        team_indexes = []
+        for (index, team) in enumerate(self.graded_teams):
+            self.graded_players.extend(team.roster)
+            team_indexes.extend([index] * len(team.roster))
+        [self.player_points, self.position_codes] = self.grader.get_record_arrays(self.graded_players)
+        if GRADE_POINTS == 'stats':
+            engine = ScoringEngine(self.settings.scoring_settings)
+            self.player_points = engine.score([player.raw_stats for player in self.graded_players])
+        self.team_indexes = np.array(team_indexes, dtype=np.intp)
+
     def get_scoring_ranges(self):
         '''
         Gets the max and min score
         for each position in order
-        to accurately grade players
+        to accurately grade players.
+        The rosters we already have are used,
+        so there's no need to query for the players
         '''
-        for team in self.teams:
-            for player in team.roster:
-                record = PlayerModel.query.filter_by(
-                    player_id=player.id, league_id=player.league_id).first()
-                self.grader.get_pos_extremes(record)
+        self.get_grading_arrays()
+        self.grader.set_extremes(self.player_points, self.position_codes)
+        self.grader.set_grade_tables(self.player_points, self.position_codes)
 
     def get_grades(self):
         '''
         Gets the letter grades for each
         player in the league, then uses those
         grades to get the average grade of
-        each team.
-        '''
-        for team in self.teams:
-            team_score = 0
-            for player in team.roster:
-                record = PlayerModel.query.filter_by(
-                    player_id=player.id, league_id=player.league_id).first()
-                record.grade = self.grader.grade_player(record)
-                db.session.commit()
-                team_score += GRADE_TO_VALUE[record.grade]
-
-            team_grade = team_score / len(team.roster)
-            team_grade = VALUE_TO_GRADE[round(team_grade)]
-
-            record = TeamModel.query.filter_by(
-                team_id=team.id, league_id=team.league_id, user_id=self.user_id).first()
-            record.grade = team_grade
-            db.session.commit()
+        each team. Every grade is written to
+        the database at once at the end. If
+        start_grading hasn't been called it's
+        called first
+        '''
+        if self.grader is None:
+            self.start_grading()
+        self.get_team_ids()
+        self.get_player_ids()
+        team_ids = self.league_info['team_ids']
+        player_ids = self.league_info['player_ids']
+
+        if self.incremental_grades is not None:
+            [changed_grades, team_grades, grade_tables] = self.incremental_grades
+            player_grades = {player_ids[id]: grade for (id, grade) in changed_grades.items()}
+        else:
+            grades = self.grader.grade_players(self.player_points, self.position_codes).tolist()
+            player_grades = {player_ids[player.id]: grade
+                             for (player, grade) in zip(self.graded_players, grades)}
+            team_grades = {team_ids[team.id]: grade
+                           for (team, grade) in zip(self.graded_teams,
+                                                    get_team_grades(grades, self.team_indexes, len(self.graded_teams)))}
+            grade_tables = {position: table.tolist()
+                            for (position, table) in self.grader.grade_tables.items()}
+
+        db_handler = GradeBatchModelHandler(
+            player_grades, team_grades, self.league_info['league_model_id'],
+            grade_tables, self.grader.mode, replace_all=self.incremental_grades is None)
+        db_handler.update_records()
+
+    def get_incremental_grades(self):
+        '''
+        Regrades only what changed since the league was last
+        graded (see IncrementalGrader). Returns a list of a dict
+        of ESPN player id => grade for players whose grade
+        changed, a dict of TeamModel id => grade, and the changed
+        grade tables. Returns None if the whole league has to be
+        graded, because it's new, it was graded another way,
+        or players are graded on points from their stats
+        '''
+        stored = self.league_info['stored_players']
+        stored_grading = self.league_info['stored_grading']
+        if not stored or not stored_grading or GRADE_POINTS == 'stats':
+            return None
+        [grade_mode, grade_tables] = stored_grading
+        if grade_mode != self.grader.mode or not grade_tables:
+            return None
+        players = [player for team in self.teams for player in team.roster]
+        return IncrementalGrader(self.grader, grade_tables).grade(players, stored)
 
     def create_grader(self):
-        self.grader = GradeCalculator(self.settings.scoring_settings)
+        self.grader = VectorGradeCalculator(self.settings.scoring_settings, GRADE_MODE)
 
     def start_grading(self):
-        '''Calls grading functions'''
+        '''
+        Calls grading functions. A league that was graded
+        before only has what changed regraded
+        '''
         self.create_grader()
-        self.get_scoring_ranges()
-        self.grader.set_grade_ranges()
+        self.incremental_grades = self.get_incremental_grades()
+        if self.incremental_grades is None:
+            self.get_scoring_ranges()
+            self.grader.set_grade_ranges()
 
     def handle_db(self):
         '''Handles adding league info to the database'''
@@ -178,7 +292,34 @@ class League(ESPNBase):
         # Refresh league stats without having to worry
         # About whether a record already exists
         db_handler = LeagueModelHandler(self)
-        db_handler.add_record()
+        db_handler.add_or_update_record()
+
+    def handle_teams_db(self):
+        '''
+        Adds or updates every team in the league (and
+        their stats) in the database in one batch
+        '''
+        db_handler = TeamBatchModelHandler(
+            self.teams, self.league_info['league_model_id'])
+        self.league_info['team_ids'] = db_handler.add_or_update_records()
+
+    def handle_players_db(self):
+        '''
+        Adds or updates every rostered player in the league (and
+        their stats and outlooks) in the database in one batch.
+        Players who left the league are removed
+        '''
+        players = [player for team in self.teams for player in team.roster]
+        # Names and outlooks are stored once for the season, the league's rows point at them
+        ProPlayerBatchModelHandler(players, self.year).add_or_update_records()
+        db_handler = PlayerBatchModelHandler(
+            players, self.league_info['league_model_id'])
+        self.league_info['player_ids'] = db_handler.add_or_update_records()
+        # A league that's been graded before can be regraded from what changed
+        self.league_info['stored_players'] = db_handler.stored_rows
+        if db_handler.stored_rows:
+            self.league_info['stored_grading'] = GradeBatchModelHandler(
+                {}, {}, self.league_info['league_model_id']).get_stored_grading()
 
     def create_league(self):
         '''
@@ -201,7 +342,6 @@ class Team(ESPNBase):
         '''
         self.league_info = league_info
         self.data = data
-        self.user_id = league_info.get('user_id')
         self.roster = set()
         self.create_team()
 
@@ -224,7 +364,7 @@ class Team(ESPNBase):
 
     def get_stats(self):
         '''Gets the stats for the team'''
-        self.stats = {}
+        self.stats = self.create_stats()
         self.add_stats(self.data['valuesByStat'])
 
     def create_player(self, player):
@@ -237,8 +377,8 @@ class Team(ESPNBase):
         # Then the player does not have a ranking
         rank = player['playerPoolEntry']['ratings']['0']['positionalRanking'] if 'playerPoolEntry' in player else 0
         player_data = player['playerPoolEntry']['player'] if 'playerPoolEntry' in player else player['player']
-        team_id = TeamModel.query.filter_by(
-            team_id=self.id, league_id=self.league_id, user_id=self.user_id).first().id
+        # The team's id comes from the league's identity map, instead of a query for every player
+        team_id = self.league_info['team_ids'][self.id]
         new_player = Player(
             data=player_data, league_info=self.league_info, team_id=team_id, rank=rank)
         self.roster.add(new_player)
@@ -253,12 +393,6 @@ class Team(ESPNBase):
         for player in self.data['roster']['entries']:
             self.create_player(player)
 
-    def handle_db(self):
-        '''Handles adding the team to the database'''
-        # Used to add or update the db as needed
-        db_handler = TeamModelHandler(self)
-        db_handler.add_record()
-
     def create_team(self):
         '''Drives necessary functions for adding a team'''
         self.get_basic_info()
@@ -276,6 +410,8 @@ class Player(ESPNBase):
         self.league_info = league_info
         self.team_id = team_id
         self.league_id = league_info.get('league_model_id')
+        self.year = league_info['year']
+        self.pro_player_id = None
         self.league_info['team_id'] = team_id
         self.data = data
         self.rank = rank
@@ -292,11 +428,14 @@ class Player(ESPNBase):
         self.first_name = self.data['firstName']
         self.last_name = self.data['lastName']
         self.outlooks = []
+        # Outlooks are stored once for the season, so weeks we already have are skipped
+        stored_weeks = (self.league_info.get('outlook_weeks') or {}).get(self.id, set())
         # Some players don't have any outlooks, so we need this if statement
         if 'outlooks' in self.data:
             for week, outlook in self.data['outlooks']['outlooksByWeek'].items():
                 int_week = int(week)
-                self.outlooks.append((int_week, outlook))
+                if int_week not in stored_weeks:
+                    self.outlooks.append((int_week, outlook))
         else:
             self.outlooks = []
 
@@ -327,6 +466,8 @@ class Player(ESPNBase):
             self.league_info['total_weeks']
         self.projected_points = round(self.projected_points, 2)
 
+        # The raw stat values, which the league's scoring settings can rescore
+        self.raw_stat_data = stat_block.get('stats') or {}
         stats_to_check = stat_block['appliedStats'] if stat_block.get(
             'appliedStats') else stat_block['stats']
         return stats_to_check
@@ -334,18 +475,14 @@ class Player(ESPNBase):
     def get_stats(self):
         '''
         Initializes the stats attribute to an empty
-        dictionary, gets all stat data from the api,
-        then adds the stats to the dictionary
+        stats list, gets all stat data from the api,
+        then adds the stats to the list
         '''
-        self.stats = {}
+        self.stats = self.create_stats()
         stat_data = self.get_stat_data()
         self.add_stats(stat_data)
-
-    def handle_db(self):
-        '''Handles adding the instance to the database'''
-        # Allows us to add or update without any crazy logic
-        db_handler = PlayerModelHandler(self)
-        db_handler.add_record()
+        self.raw_stats = self.create_stats()
+        self.add_stats(self.raw_stat_data, self.raw_stats)
 
     def create_player(self):
         '''Drives player creation'''
@@ -0,0 +1,126 @@
+import glob
+import gzip
+import json
+import os
+from espn.settings import ESPN_FIXTURES_DIR
+
+# Top level fields ESPN sends back no matter which views are asked for
+BASE_FIELDS = ('gameId', 'id', 'scoringPeriodId',
+               'seasonId', 'segmentId', 'status')
+
+
+class ESPNFixtures:
+    '''
+    Recorded ESPN API responses, saved to disk so imports,
+    grading, and trade suggestions can run without the network.
+    Each fixture is the raw body of one response, gzipped,
+    and named by league id, year, and sorted views
+    '''
+
+    def __init__(self, fixtures_dir=ESPN_FIXTURES_DIR):
+        '''Sets the directory fixtures are saved to and loaded from'''
+        self.fixtures_dir = fixtures_dir
+
+    def get_views(self, params=None):
+        '''Returns the sorted list of views in the params'''
+        views = (params or {}).get('view', [])
+        if isinstance(views, str):
+            views = [views]
+        return sorted(views)
+
+    def get_path(self, league_id, year, views):
+        '''Returns the path of the fixture for the league and views'''
+        views_name = '+'.join(views) if views else 'default'
+        return os.path.join(self.fixtures_dir, f'{league_id}-{year}-{views_name}.json.gz')
+
+    def save(self, league_id, year, params, content):
+        '''Saves the raw body of a response as a fixture'''
+        os.makedirs(self.fixtures_dir, exist_ok=True)
+        path = self.get_path(league_id, year, self.get_views(params))
+        with gzip.open(path, 'wb') as fixture:
+            fixture.write(content)
+
+    def read(self, path):
+        '''Returns the raw body saved at path'''
+        with gzip.open(path, 'rb') as fixture:
+            return fixture.read()
+
+    def find_superset(self, league_id, year, views):
+        '''
+        Returns the path of a fixture for the league that has
+        every one of the views (and maybe more), or None
+        '''
+        pattern = os.path.join(self.fixtures_dir, f'{league_id}-{year}-*.json.gz')
+        for path in sorted(glob.glob(pattern)):
+            views_name = os.path.basename(path)[:-len('.json.gz')].split('-', 2)[2]
+            if set(views) <= set(views_name.split('+')):
+                return path
+        return None
+
+    def strip_player_cards(self, roster):
+        '''
+        Returns a copy of the roster without the fields
+        that come from the kona_playercard view (outlooks)
+        '''
+        entries = []
+        for entry in roster.get('entries', []):
+            entry = dict(entry)
+            if 'playerPoolEntry' in entry:
+                pool_entry = dict(entry['playerPoolEntry'])
+                pool_entry['player'] = {key: val for key, val in pool_entry['player'].items()
+                                        if key != 'outlooks'}
+                entry['playerPoolEntry'] = pool_entry
+            entries.append(entry)
+        return dict(roster, entries=entries)
+
+    def filter_views(self, data, views):
+        '''
+        Returns a copy of a full payload with only the fields
+        the given views would have sent. This is an approximation
+        of ESPN's filtering, it covers the fields this app reads
+        '''
+        filtered = {key: data[key] for key in BASE_FIELDS if key in data}
+        if 'mSettings' in views and 'settings' in data:
+            filtered['settings'] = data['settings']
+        if 'mTeam' in views and 'members' in data:
+            filtered['members'] = data['members']
+
+        team_views = {'mTeam', 'mRoster', 'kona_playercard'} & set(views)
+        if team_views and 'teams' in data:
+            teams = []
+            for team in data['teams']:
+                if 'mTeam' in views:
+                    new_team = {key: val for key, val in team.items()
+                                if key != 'roster'}
+                else:
+                    new_team = {'id': team['id']}
+                if 'roster' in team and team_views - {'mTeam'}:
+                    if 'kona_playercard' in views:
+                        new_team['roster'] = team['roster']
+                    else:
+                        new_team['roster'] = self.strip_player_cards(
+                            team['roster'])
+                teams.append(new_team)
+            filtered['teams'] = teams
+        return filtered
+
+    def load(self, league_id, year, params=None):
+        '''
+        Returns the raw body for the league and params. If
+        there isn't a fixture for those exact views, one with
+        more views is filtered down. Returns None if there
+        isn't a fixture that covers the views
+        '''
+        views = self.get_views(params)
+        path = self.get_path(league_id, year, views)
+        if os.path.exists(path):
+            return self.read(path)
+
+        path = self.find_superset(league_id, year, views)
+        if not path:
+            return None
+        data = json.loads(self.read(path))
+        return json.dumps(self.filter_views(data, views)).encode()
+
+
+espn_fixtures = ESPNFixtures()
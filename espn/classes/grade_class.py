@@ -1,6 +1,39 @@
-from flask import session
-from espn.models import PlayerModel
-from espn.settings import POSITIONS
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+import numpy as np
+from espn.settings import POSITIONS, STAT_NAMES, GRADE_MODES, GRADE_PERCENTILES, GRADE_TO_VALUE
+
+# Letter grades in order of the grade ranges, so a count of
+# the ranges a score clears is the index of its grade
+GRADES = np.array(['F', 'D', 'C', 'B', 'A'])
+
+# The only fields grading reads. Player instances, PlayerModels,
+# or these can be graded, grading never reads from the database
+PlayerRecord = namedtuple('PlayerRecord', ['points', 'position'])
+
+
+def get_team_grades(player_grades, team_indexes, num_teams):
+    '''
+    Returns a list of each team's letter grade, the average
+    of their players' grades. team_indexes is an array of
+    the index of each player's team
+    '''
+    values = np.array([GRADE_TO_VALUE[grade] for grade in player_grades], dtype=np.float64)
+    totals = np.bincount(team_indexes, weights=values, minlength=num_teams)
+    counts = np.bincount(team_indexes, minlength=num_teams)
+    # np.round rounds halves to even, like round
+    return GRADES[np.round(totals / counts).astype(np.intp)].tolist()
+
+
+def get_percentile_rank(table, score):
+    '''
+    Returns the percent of a sorted grade table that is below
+    score, with ties counted as half below. Uses two binary
+    searches, so it's O(log n) in the size of the table
+    '''
+    below = bisect_left(table, score)
+    not_above = bisect_right(table, score)
+    return (below + not_above) / 2 / len(table) * 100
 
 
 class GradeCalculator:
@@ -10,14 +43,17 @@ class GradeCalculator:
     on their stats and their position
     '''
 
-    def __init__(self, stat_scores):
+    def __init__(self, stat_scores, mode='range'):
         '''
         Sets necessary info to attributes 
-        (positions, cap, weight, stat_scores),
+        (positions, cap, weight, stat_scores, mode),
         then sets the extremes attributes
         to values that should be overwritten
         by player data
         '''
+        if mode not in GRADE_MODES:
+            raise ValueError(f'Unknown grade mode {mode}')
+        self.mode = mode
         self.positions = POSITIONS
         self.cap = 1
         # 0.05 is an arbitrary value. Any value that is less than cap will work. I use 0.05 since it is 0.05% of the cap
@@ -43,16 +79,17 @@ class GradeCalculator:
     def adjust_score_total(self, player_stats, current_stat, current_total):
         '''
         Adjusts the total score for the player
-        given a single stat (not currently used)
+        given a single stat (not currently used,
+        ScoringEngine scores every stat at once)
         '''
         # So in PPR this would mean (Receptions=1 => 1 * 0.05 = 0.05 is the stat weight)
         stat_weight = (self.stat_scores[current_stat] * self.weight)
-        player_stat = [s for s in player_stats if s.stat_name == current_stat]
-        if player_stat:
+        player_stat = player_stats[STAT_NAMES.index(current_stat)]
+        if player_stat is not None:
             # So if they have 50 points from receptions, thats 50 * 0.05 which = 2.5. This is basically
             # their score in that stat. The app currently only evaluates points, because it is faster
             # And if you add up all the stat values you get the point value anyway
-            current_total += (player_stat[0].stat_value * stat_weight)
+            current_total += (player_stat * stat_weight)
         return current_total
 
     def get_score(self, player):
@@ -60,7 +97,6 @@ class GradeCalculator:
         Calculates and returns the
         players weighted score
         '''
-        stats = player.stats
         total = 0
 
         # If a player has 500 points and weight is 0.05 their total = 25
@@ -133,3 +169,235 @@ class GradeCalculator:
 
         grade = self.get_grade(score, player.position)
         return grade
+
+    def grade_from_table(self, score, table):
+        '''
+        Given a weighted score and the sorted scores of a
+        graded position (its grade table), returns the letter
+        grade for the score without the rest of the league.
+        Gives the same grade as grading the whole league
+        '''
+        if self.mode == 'percentile':
+            return str(GRADES[bisect_right(GRADE_PERCENTILES, get_percentile_rank(table, score))])
+        # The top score is the position max, so these are the grade ranges' bounds
+        increment = table[-1] / 5
+        return str(GRADES[bisect_right([increment, increment * 2, increment * 3, increment * 4], score)])
+
+
+class VectorGradeCalculator(GradeCalculator):
+    '''
+    Grades every player in a league at once. Takes arrays
+    of points and position codes (indexes into positions),
+    and gives the same grades as GradeCalculator
+    '''
+
+    def get_record_arrays(self, players):
+        '''
+        Returns a list of an array of the players' points and an
+        array of their position codes, from any player records
+        with points and position (see PlayerRecord)
+        '''
+        points = np.array([player.points for player in players], dtype=np.float64)
+        codes = self.get_position_codes([player.position for player in players])
+        return [points, codes]
+
+    def get_position_codes(self, positions):
+        '''Returns an array of the index of each position in positions'''
+        codes = {position: code for (code, position) in enumerate(self.positions)}
+        return np.array([codes[position] for position in positions], dtype=np.intp)
+
+    def get_scores(self, points):
+        '''Returns an array of the weighted score for each player's points'''
+        totals = np.asarray(points, dtype=np.float64) * self.weight
+        # Same as get_score, a negative total is a score of 0
+        return np.where(totals >= 0, totals / self.cap, 0.0)
+
+    def set_extremes(self, points, codes):
+        '''
+        Sets the extremes attribute to the max and min score of
+        each position, with one grouped reduction over the league.
+        Positions without players keep the starting extremes
+        '''
+        scores = self.get_scores(points)
+        maxes = np.full(len(self.positions), -1000.0)
+        mins = np.full(len(self.positions), 1000.0)
+        np.maximum.at(maxes, codes, scores)
+        np.minimum.at(mins, codes, scores)
+        for (code, position) in enumerate(self.positions):
+            self.extremes[position] = {'MIN': mins[code], 'MAX': maxes[code]}
+
+    def set_grade_tables(self, points, codes):
+        '''
+        Sets the grade_tables attribute to a dict of position =>
+        sorted array of the position's scores. The whole league
+        is sorted once by position then score, and split up,
+        so positions without players have no table
+        '''
+        scores = self.get_scores(points)
+        codes = np.asarray(codes, dtype=np.intp)
+        order = np.lexsort((scores, codes))
+        sorted_codes = codes[order]
+        sorted_scores = scores[order]
+        self.grade_tables = {}
+        for (code, position) in enumerate(self.positions):
+            start = np.searchsorted(sorted_codes, code, side='left')
+            end = np.searchsorted(sorted_codes, code, side='right')
+            if start < end:
+                self.grade_tables[position] = sorted_scores[start:end]
+
+    def get_percentile_ranks(self, scores, codes):
+        '''
+        Returns an array of each score's percentile rank in
+        its position's grade table, like get_percentile_rank
+        '''
+        ranks = np.zeros(len(scores))
+        for (code, position) in enumerate(self.positions):
+            table = self.grade_tables.get(position)
+            if table is None:
+                continue
+            in_position = codes == code
+            below = np.searchsorted(table, scores[in_position], side='left')
+            not_above = np.searchsorted(table, scores[in_position], side='right')
+            ranks[in_position] = (below + not_above) / 2 / len(table) * 100
+        return ranks
+
+    def get_grade_bounds(self):
+        '''
+        Returns a (positions x 4) array of the lowest D, C, B,
+        and A score for each position, from the grade ranges
+        '''
+        return np.array([[self.grade_ranges[position][grade][0] for grade in ('D', 'C', 'B', 'A')]
+                         for position in self.positions])
+
+    def grade_players(self, points, codes):
+        '''
+        Returns an array of the letter grade for each player.
+        The count of their position's bounds a score is on or
+        above is where searchsorted(side='right') would put it,
+        and is the index of its grade. Percentile mode needs
+        the grade tables set first
+        '''
+        scores = self.get_scores(points)
+        codes = np.asarray(codes, dtype=np.intp)
+        if self.mode == 'percentile':
+            ranks = self.get_percentile_ranks(scores, codes)
+            return GRADES[np.searchsorted(GRADE_PERCENTILES, ranks, side='right')]
+        bounds = self.get_grade_bounds()[codes]
+        # A score on a bound gets the higher grade, like get_grade
+        grade_indexes = (scores[:, np.newaxis] >= bounds).sum(axis=1)
+        return GRADES[grade_indexes]
+
+
+class IncrementalGrader:
+    '''
+    Regrades a league that's been graded before, from the grade
+    tables saved with it. Only the players whose points or
+    position changed are taken out of and put into the tables,
+    a position is only regraded if its grade bounds moved, and
+    only the teams whose players changed are regraded. Gives
+    the same grades as grading the whole league again
+    '''
+
+    def __init__(self, grader, grade_tables):
+        '''
+        Sets the grader attribute to a VectorGradeCalculator,
+        and grade_tables to a dict of position => sorted list
+        of scores from the last time the league was graded
+        '''
+        self.grader = grader
+        self.grade_tables = {position: list(table) for (position, table) in grade_tables.items()}
+
+    def get_record_score(self, player):
+        '''Returns the weighted score for a record's points'''
+        return self.grader.get_score(PlayerRecord(player.points, player.position))
+
+    def remove_score(self, position, score):
+        '''
+        Takes the score out of the position's table. Returns
+        False if it isn't there, which means the tables don't
+        match the stored players
+        '''
+        table = self.grade_tables.get(position, [])
+        index = bisect_left(table, score)
+        if index == len(table) or table[index] != score:
+            return False
+        table.pop(index)
+        return True
+
+    def add_score(self, position, score):
+        '''Puts the score in the position's table, keeping it sorted'''
+        table = self.grade_tables.setdefault(position, [])
+        table.insert(bisect_right(table, score), score)
+
+    def get_bounds(self, table):
+        '''
+        Returns what a position's grades are decided by, the top
+        score for range grading and every score for percentile
+        '''
+        if not table:
+            return None
+        return tuple(table) if self.grader.mode == 'percentile' else table[-1]
+
+    def grade(self, players, stored):
+        '''
+        Takes the current player records (with id, team_id,
+        points, and position) and a dict of id => stored record
+        (which also has the grade) from the last grading. Returns
+        a list of a dict of id => grade for players whose grade
+        changed, a dict of team_id => grade for teams with a
+        changed player, and a dict of position => sorted scores
+        for the positions whose table changed (empty if the
+        position has no players). Returns None if the stored
+        records don't match the tables
+        '''
+        if any(record.grade is None for record in stored.values()):
+            return None
+        current_ids = {player.id for player in players}
+        changed = [player for player in players if player.id not in stored or
+                   stored[player.id].points != player.points or stored[player.id].position != player.position]
+        removed = [record for (id, record) in stored.items() if id not in current_ids]
+
+        old_bounds = {position: self.get_bounds(table) for (position, table) in self.grade_tables.items()}
+        changed_positions = set()
+        for record in removed + [stored[player.id] for player in changed if player.id in stored]:
+            if not self.remove_score(record.position, self.get_record_score(record)):
+                return None
+            changed_positions.add(record.position)
+        for player in changed:
+            self.add_score(player.position, self.get_record_score(player))
+            changed_positions.add(player.position)
+
+        moved_positions = {position for position in changed_positions
+                           if self.get_bounds(self.grade_tables.get(position)) != old_bounds.get(position)}
+        changed_ids = {player.id for player in changed}
+        to_grade = [player for player in players
+                    if player.position in moved_positions or player.id in changed_ids]
+        player_grades = {}
+        if to_grade:
+            self.grader.grade_tables = {position: np.array(table)
+                                        for (position, table) in self.grade_tables.items() if table}
+            for (position, table) in self.grader.grade_tables.items():
+                self.grader.extremes[position] = {'MIN': table[0], 'MAX': table[-1]}
+            self.grader.set_grade_ranges()
+            [points, codes] = self.grader.get_record_arrays(to_grade)
+            grades = self.grader.grade_players(points, codes).tolist()
+            player_grades = {player.id: grade for (player, grade) in zip(to_grade, grades)
+                             if player.id not in stored or stored[player.id].grade != grade}
+
+        # Teams that gained, lost, or kept a player whose grade changed
+        changed_teams = {record.team_id for record in removed}
+        changed_teams.update(player.team_id for player in players
+                             if player.id in player_grades or player.id not in stored or
+                             stored[player.id].team_id != player.team_id)
+        changed_teams.update(stored[player.id].team_id for player in players
+                             if player.id in stored and stored[player.id].team_id != player.team_id)
+        team_values = {}
+        for player in players:
+            if player.team_id in changed_teams:
+                grade = player_grades.get(player.id) or stored[player.id].grade
+                team_values.setdefault(player.team_id, []).append(GRADE_TO_VALUE[grade])
+        team_grades = {team_id: str(GRADES[round(sum(values) / len(values))])
+                       for (team_id, values) in team_values.items()}
+
+        grade_tables = {position: self.grade_tables.get(position, []) for position in changed_positions}
+        return [player_grades, team_grades, grade_tables]
@@ -0,0 +1,110 @@
+from espn.settings import IMPORT_STAGES
+from espn.models import LeagueModel
+from espn.classes.espn_classes import League
+from espn.classes.model_handler_classes import UserLeagueModelHandler
+from espn.classes.payload_store_class import league_payload_store
+
+
+class LeagueImporter:
+    '''
+    Runs every step of a league import (league, teams,
+    players, and grades) in one process with a single
+    League instance. Leagues are shared between users, if
+    the league is already stored it's refreshed in place,
+    only what changed is written. If it was imported in the
+    last LEAGUE_IMPORT_TTL seconds the import is skipped
+    and the user just joins the league
+    '''
+
+    def __init__(self, league_id, year, user_id, data=None, refresh=False, on_progress=None):
+        '''
+        Sets the league to import. If data (a raw payload)
+        is given it's used instead of fetching the league,
+        if refresh is True the payload is fetched fresh.
+        on_progress is called with (stage, percent done)
+        after each stage in IMPORT_STAGES
+        '''
+        self.league_id = league_id
+        self.year = year
+        self.user_id = user_id
+        self.data = data
+        self.refresh = refresh
+        self.on_progress = on_progress
+        self.league = None
+        self.league_model_id = None
+
+    def create_league(self):
+        '''Creates the league and adds or updates it in the database'''
+        if self.data:
+            league_payload_store.set(self.league_id, self.year, self.data)
+        self.league = League(league_id=self.league_id, year=self.year,
+                             refresh=self.refresh and not self.data)
+        self.league.handle_db()
+
+    def create_teams(self):
+        '''Creates every team and adds or updates them in the database'''
+        self.league.get_teams()
+        self.league.handle_teams_db()
+
+    def create_players(self):
+        '''
+        Creates every player and adds or updates them
+        in the database, players who left are removed
+        '''
+        self.league.get_rosters()
+        self.league.handle_players_db()
+
+    def create_grades(self):
+        '''Grades every player and team in the league'''
+        self.league.start_grading()
+        self.league.get_grades()
+
+    def get_fresh_league(self):
+        '''
+        Returns the stored LeagueModel if it was imported
+        recently enough to be reused, otherwise None. A
+        given payload or a refresh always imports
+        '''
+        if self.data or self.refresh:
+            return None
+        league_model = LeagueModel.query.filter_by(
+            league_id=self.league_id, year=self.year).first()
+        if league_model and league_model.is_fresh():
+            return league_model
+        return None
+
+    def join_league(self, league_model_id):
+        '''Adds the user to the league if they don't have it yet'''
+        db_handler = UserLeagueModelHandler(self.user_id, league_model_id)
+        db_handler.add_or_update_record()
+
+    def run_stages(self):
+        '''
+        Drives the import, yielding (stage, percent done)
+        after each stage in IMPORT_STAGES. Once it's
+        exhausted league_model_id is set
+        '''
+        league_model = self.get_fresh_league()
+        if league_model:
+            self.league_model_id = league_model.id
+            # There's nothing to import, so every stage is done
+            yield IMPORT_STAGES[-1]
+        else:
+            steps = {'league': self.create_league, 'teams': self.create_teams,
+                     'players': self.create_players, 'grades': self.create_grades}
+            for (stage, progress) in IMPORT_STAGES:
+                steps[stage]()
+                yield (stage, progress)
+            self.league_model_id = self.league.league_info['league_model_id']
+        self.join_league(self.league_model_id)
+
+    def run(self):
+        '''
+        Drives the import, and returns the id of the
+        LeagueModel record. on_progress (if we have one)
+        is told when each stage is done
+        '''
+        for (stage, progress) in self.run_stages():
+            if self.on_progress:
+                self.on_progress(stage, progress)
+        return self.league_model_id
@@ -0,0 +1,136 @@
+import datetime
+import time
+from sqlalchemy import and_, or_
+from app.database import db, add_to_db
+from espn.settings import JOB_KINDS, JOB_POLL_INTERVAL, JOB_TIMEOUT
+from espn.models import JobModel
+from espn.classes.base_classes import ESPNRequestError
+from espn.classes.import_class import LeagueImporter
+
+
+class JobQueue:
+    '''
+    A queue of league jobs kept in the jobs table, so imports
+    can be handed off to worker processes without another
+    service. Jobs are claimed with SELECT ... FOR UPDATE SKIP
+    LOCKED, so any number of workers can share the queue
+    '''
+
+    def __init__(self, timeout=JOB_TIMEOUT):
+        '''
+        Sets how long (in seconds) a running job can go
+        without progress before it's given to another worker
+        '''
+        self.timeout = timeout
+
+    def enqueue(self, user_id, league_id, year, kind='import'):
+        '''Adds a job for the league to the queue, and returns it'''
+        if kind not in JOB_KINDS:
+            raise ValueError(f'Unknown job kind {kind}')
+        job = JobModel(user_id=user_id, league_id=league_id,
+                       year=year, kind=kind, status='queued', progress=0)
+        add_to_db(job)
+        return job
+
+    def claim(self):
+        '''
+        Marks the oldest queued job as running and returns it,
+        or returns None if there's nothing to run. Jobs left
+        running by a worker that died are claimed again
+        '''
+        now = datetime.datetime.utcnow()
+        stale = now - datetime.timedelta(seconds=self.timeout)
+        job = JobModel.query.filter(or_(
+            JobModel.status == 'queued',
+            and_(JobModel.status == 'running', JobModel.updated_at < stale))).order_by(
+            JobModel.id).with_for_update(skip_locked=True).first()
+        if job:
+            job.status = 'running'
+            job.updated_at = now
+        db.session.commit()
+        return job
+
+    def set_progress(self, job, stage, progress):
+        '''Records the last stage the job finished'''
+        job.stage = stage
+        job.progress = progress
+        job.updated_at = datetime.datetime.utcnow()
+        db.session.commit()
+
+    def finish(self, job, league_model_id):
+        '''Marks the job as done'''
+        job.status = 'done'
+        job.progress = 100
+        job.league_model_id = league_model_id
+        job.updated_at = datetime.datetime.utcnow()
+        db.session.commit()
+
+    def fail(self, job, error):
+        '''Marks the job as failed, with what went wrong'''
+        job.status = 'failed'
+        job.error = error
+        job.updated_at = datetime.datetime.utcnow()
+        db.session.commit()
+
+
+class JobWorker:
+    '''
+    Runs league jobs from the queue. Each job is a whole
+    import (league, teams, players, and grades) run by a
+    LeagueImporter, with its progress saved after each stage
+    '''
+
+    def __init__(self, queue=None, poll_interval=JOB_POLL_INTERVAL):
+        '''
+        Sets the queue to take jobs from, and how long
+        (in seconds) to wait when there aren't any
+        '''
+        self.queue = queue or JobQueue()
+        self.poll_interval = poll_interval
+
+    def run_job(self, job):
+        '''
+        Runs the job, and records whether it worked.
+        Returns True if it did
+        '''
+        importer = LeagueImporter(league_id=job.league_id, year=job.year, user_id=job.user_id,
+                                  refresh=job.kind == 'refresh',
+                                  on_progress=lambda stage, progress: self.queue.set_progress(job, stage, progress))
+        try:
+            league_model_id = importer.run()
+        except ESPNRequestError:
+            db.session.rollback()
+            self.queue.fail(job, 'ESPN could not be reached')
+            return False
+        except Exception as error:
+            db.session.rollback()
+            self.queue.fail(job, f'{type(error).__name__}: {error}')
+            return False
+        self.queue.finish(job, league_model_id)
+        return True
+
+    def run_next(self):
+        '''
+        Claims and runs the next job. Returns False
+        if there wasn't one, otherwise True
+        '''
+        job = self.queue.claim()
+        if not job:
+            return False
+        self.run_job(job)
+        return True
+
+    def run(self, burst=False):
+        '''
+        Runs jobs as they come in. If burst is True
+        it returns once the queue is empty, and
+        returns the number of jobs it ran
+        '''
+        num_jobs = 0
+        while True:
+            if self.run_next():
+                num_jobs += 1
+                continue
+            if burst:
+                return num_jobs
+            time.sleep(self.poll_interval)
@@ -1,9 +1,15 @@
 from flask import session, flash, request
-from app.database import delete_from_db
-from espn.settings import GRADE_MAP
-from espn.models import PlayerModel, TeamModel, LeagueModel
-from espn.classes.base_classes import ESPNRequest
+from app.database import db
+from espn.settings import GRADE_MAP, GRADE_TO_VALUE, VALUE_TO_GRADE
+from espn.models import PlayerModel, TeamModel, LeagueModel, UserLeagueModel, GradeTableModel
+from espn.classes.base_classes import ESPNRequestError
+from espn.classes.bulk_fetch_class import BulkLeagueFetcher
 from espn.classes.espn_classes import League
+from espn.classes.grade_class import GradeCalculator, get_percentile_rank
+from espn.classes.import_class import LeagueImporter
+from espn.classes.model_handler_classes import UserLeagueModelHandler
+from espn.classes.payload_store_class import fetch_league_payload, is_valid_payload
+from espn.classes.stream_class import LeaguePayloadStream
 
 
 class FakeTeam:
@@ -157,8 +163,60 @@ class LeagueHandler:
                 for other_player in other_player_models:
                     if user_player.position == other_player.position:
                         fake_team.switch_players(user_player, other_player)
+            fake_team.grade = self.get_sim_team_grade(fake_team) or fake_team.grade
             return fake_team
 
+    def get_grade_table(self, league_id, position):
+        '''
+        Returns the GradeTableModel for the position in the
+        league, or None if the league hasn't been graded since
+        grade tables were added
+        '''
+        return GradeTableModel.query.filter_by(league_id=league_id, position=position).first()
+
+    def grade_in_league(self, player, league, grade_tables=None):
+        '''
+        Returns the letter grade the player would have in the
+        league, with a binary search of the league's grade table
+        for their position. grade_tables is a dict of position =>
+        GradeTableModel for the league, so a roster can share one.
+        Returns None if there's no table
+        '''
+        if grade_tables is None:
+            grade_table = self.get_grade_table(league.id, player.position)
+        else:
+            grade_table = grade_tables.get(player.position)
+        if not grade_table:
+            return None
+        grader = GradeCalculator({}, league.grade_mode)
+        return grader.grade_from_table(grader.get_score(player), grade_table.scores)
+
+    def get_sim_team_grade(self, fake_team):
+        '''
+        Returns the fake team's grade with the players it traded
+        for graded against its league, or None if a player
+        can't be graded
+        '''
+        league = fake_team.league
+        grade_tables = {table.position: table for table in league.grade_tables}
+        grades = [self.grade_in_league(player, league, grade_tables) for player in fake_team.players]
+        if not grades or None in grades:
+            return None
+        team_score = sum(GRADE_TO_VALUE[grade] for grade in grades) / len(grades)
+        return VALUE_TO_GRADE[round(team_score)]
+
+    def get_percentile(self, player):
+        '''
+        Returns the player's percentile rank among the players
+        at their position in their league, rounded to a whole
+        number, or None if the league has no grade table for it
+        '''
+        grade_table = self.get_grade_table(player.league_id, player.position)
+        if not grade_table:
+            return None
+        score = GradeCalculator({}).get_score(player)
+        return round(get_percentile_rank(grade_table.scores, score))
+
     def get_trade_suggestions(self, user_id, player):
         '''
         Gets players with grades 1 below and above the current
@@ -168,7 +226,8 @@ class LeagueHandler:
         trade_suggestions = []
         if player_grade:
             acceptable_grades = GRADE_MAP[player_grade]
-            teams = TeamModel.query.filter_by(user_id=user_id)
+            teams = TeamModel.query.join(UserLeagueModel, UserLeagueModel.league_id == TeamModel.league_id).filter(
+                UserLeagueModel.user_id == user_id)
             for team in teams:
                 for p in team.players:
                     if p.grade in (acceptable_grades) and p.position == player.position and p.id != player.id and p.points >= player.points:
@@ -182,13 +241,16 @@ class LeagueHandler:
         '''
         Gets league data from the form,
         then gets data from the api given
-        the form data, and returns it
+        the form data, and returns the league
+        level fields of it
         '''
         league_id = form.league_id.data
         year = form.year.data
-        # We make this single request in order to validate the league id and year
-        espn_request = ESPNRequest(league_id=league_id, year=year)
-        data = espn_request.get_response_data()
+        # We make this single request in order to validate the league id and year.
+        # It only asks for the settings, which is a small fraction of the full payload
+        content = fetch_league_payload(
+            league_id, year, refresh=True, profile='settings')
+        data = LeaguePayloadStream(content, year).read_league_fields()
         return [league_id, year, data]
 
     def add_league(self, form):
@@ -203,20 +265,103 @@ class LeagueHandler:
             flash('You need to login to do that!')
             return False
 
-        [league_id, year, data] = self.get_league_data(form)
+        try:
+            [league_id, year, data] = self.get_league_data(form)
+        except ESPNRequestError:
+            flash('ESPN could not be reached, please try again!', 'danger')
+            return False
 
-        # data['teams'] will only be present if we sent a valid request
-        if data.get('teams'):
-            league = League(league_id=league_id, year=year, user_id=user_id)
+        # There will only be settings if we sent a valid request
+        if data.get('settings', {}).get('name'):
             return True
         else:
             flash('Invalid League ID and/or year!', 'danger')
             return False
 
-    def delete(self, league_id):
-        '''Deletes the league from the db'''
-        league = LeagueModel.query.get_or_404(league_id)
-        delete_from_db(league)
+    def refresh_league(self, form):
+        '''
+        Refreshes the league with the given form data in place,
+        only what changed since the last import is written. If
+        successful returns the LeagueModel id, otherwise flashes
+        a message to the user and returns False
+        '''
+        # add_league validates the form data. The league is fetched fresh
+        # even if another user imported it in the last LEAGUE_IMPORT_TTL seconds
+        if not self.add_league(form):
+            return False
+        importer = LeagueImporter(league_id=form.league_id.data, year=form.year.data,
+                                  user_id=session['user_id'], refresh=True)
+        return importer.run()
+
+    def refresh_standings(self, league_model):
+        '''
+        Updates the league's current week and each team's
+        record, points, and waiver position. Only the
+        standings views are fetched, rosters and player
+        cards are left out
+        '''
+        league = League(league_id=league_model.league_id, year=league_model.year,
+                        refresh=True, profile='standings')
+        league.league_info['league_model_id'] = league_model.id
+        league.get_teams()
+
+        team_records = {team.team_id: team for team in league_model.teams}
+        for team in league.teams:
+            record = team_records.get(team.id)
+            if record:
+                record.record = team.record
+                record.points = team.points
+                record.waiver_position = team.waiver_position
+        league_model.week = league.week
+        db.session.commit()
+
+    def refresh_all(self, user_id):
+        '''
+        Refreshes every league the user has. Leagues another user
+        refreshed in the last LEAGUE_IMPORT_TTL seconds are counted
+        as refreshed without fetching them, the rest are fetched
+        concurrently, then each league is refreshed in place.
+        Returns a list of [leagues refreshed, total leagues]
+        '''
+        leagues = LeagueModel.query.join(UserLeagueModel).filter(
+            UserLeagueModel.user_id == user_id).all()
+        league_data = [(league.league_id, league.year)
+                       for league in leagues if not league.is_fresh()]
+
+        fetcher = BulkLeagueFetcher()
+        payloads = fetcher.fetch_all(league_data)
+
+        num_refreshed = 0
+        for (league_id, year) in league_data:
+            # Pop so each payload can be freed once its league is imported
+            payload = payloads.pop((int(league_id), int(year)), None)
+            if not is_valid_payload(payload):
+                continue
+            importer = LeagueImporter(
+                league_id=league_id, year=year, user_id=user_id, data=payload)
+            importer.run()
+            num_refreshed += 1
+
+        num_refreshed += len(leagues) - len(league_data)
+        return [num_refreshed, len(leagues)]
+
+    def get_membership(self, league_id, user_id):
+        '''
+        Returns the user's UserLeagueModel for the
+        league, or None if they don't have it
+        '''
+        if not user_id:
+            return None
+        return UserLeagueModel.query.filter_by(league_id=league_id, user_id=user_id).first()
+
+    def delete(self, league_id, user_id):
+        '''
+        Removes the league from the user. The
+        league is deleted once no users have it
+        '''
+        LeagueModel.query.get_or_404(league_id)
+        db_handler = UserLeagueModelHandler(user_id, league_id)
+        db_handler.remove_record()
         flash('League Deleted Successfuly', 'success')
 
     def set_trade_sim_choices(self, player, form):
@@ -1,6 +1,12 @@
+import csv
+import datetime
+import io
+from sqlalchemy import bindparam, case, cast
+from sqlalchemy.dialects import postgresql
 from app.database import db, add_to_db
 from espn.classes.base_classes import ModelHandlerBase
-from espn.models import LeagueModel, TeamModel, TeamStatModel, PlayerModel, PlayerStatModel, PlayerOutlookModel
+from espn.models import LeagueModel, UserLeagueModel, TeamModel, ProPlayerModel, PlayerModel, PlayerOutlookModel, GradeTableModel
+from user.models import TradeModel
 
 
 class LeagueModelHandler(ModelHandlerBase):
@@ -10,6 +16,33 @@ class LeagueModelHandler(ModelHandlerBase):
         to an instance of the League class
         '''
         self.instance = current_instance
+        self.record = None
+
+    def check_for_record(self):
+        '''
+        Checks if the league is already stored,
+        if so sets the record attribute to it
+        '''
+        self.record = LeagueModel.query.filter_by(
+            league_id=self.instance.id, year=self.instance.year).first()
+        if self.record:
+            self.instance.league_info['league_model_id'] = self.record.id
+            return True
+        return False
+
+    def check_for_record_update(self):
+        '''Checks if any of the league's info has changed'''
+        return (self.record.name != self.instance.name or self.record.week != self.instance.week
+                or self.record.num_teams != self.instance.num_teams
+                or self.record.stat_values != self.instance.settings.scoring_settings)
+
+    def update_record(self):
+        '''Updates the league record with the instance's info'''
+        self.record.name = self.instance.name
+        self.record.week = self.instance.week
+        self.record.num_teams = self.instance.num_teams
+        self.record.stat_values = self.instance.settings.scoring_settings
+        db.session.commit()
 
     def add_record(self):
         '''
@@ -20,65 +53,501 @@ class LeagueModelHandler(ModelHandlerBase):
         # Currently obsolete, but will be useful with private leagues
         if self.instance.cookies:
             new_league = LeagueModel(
-                league_id=self.instance.id, user_id=self.instance.user_id, year=self.instance.year, espn_s2=espn_s2, swid=swid, num_teams=self.instance.num_teams, name=self.instance.name, week=self.instance.week)
+                league_id=self.instance.id, year=self.instance.year, espn_s2=espn_s2, swid=swid, num_teams=self.instance.num_teams, name=self.instance.name, week=self.instance.week,
+                stat_values=self.instance.settings.scoring_settings)
         else:
             new_league = LeagueModel(
-                league_id=self.instance.id, user_id=self.instance.user_id, year=self.instance.year, num_teams=self.instance.num_teams, name=self.instance.name, week=self.instance.week)
+                league_id=self.instance.id, year=self.instance.year, num_teams=self.instance.num_teams, name=self.instance.name, week=self.instance.week,
+                stat_values=self.instance.settings.scoring_settings)
         add_to_db(new_league)
         self.instance.league_info['league_model_id'] = new_league.id
 
 
-class TeamModelHandler(ModelHandlerBase):
-    def __init__(self, current_instance):
+class UserLeagueModelHandler(ModelHandlerBase):
+    def __init__(self, user_id, league_model_id):
         '''
-        Sets the instance attribute (team instance) to parameter
-        current_instance
+        Sets the user and the shared league
+        the membership is for
         '''
-        self.instance = current_instance
+        self.user_id = user_id
+        self.league_model_id = league_model_id
+        self.record = None
+
+    def check_for_record(self):
+        '''
+        Checks if the user already has the league,
+        if so sets the record attribute to it
+        '''
+        self.record = UserLeagueModel.query.filter_by(
+            user_id=self.user_id, league_id=self.league_model_id).first()
+        return self.record is not None
+
+    def check_for_record_update(self):
+        '''A membership has nothing to update from the league data'''
+        return False
+
+    def change_ref_count(self, change):
+        '''Adds change to the league's ref_count, in the database'''
+        LeagueModel.query.filter_by(id=self.league_model_id).update(
+            {LeagueModel.ref_count: LeagueModel.ref_count + change}, synchronize_session=False)
 
     def add_record(self):
         '''
-        Adds a new team record to the database
-        using the info from the instance attribute
+        Adds the user to the league, and counts
+        them in the league's ref_count
+        '''
+        self.record = UserLeagueModel(
+            user_id=self.user_id, league_id=self.league_model_id)
+        db.session.add(self.record)
+        self.change_ref_count(1)
+        db.session.commit()
+
+    def remove_record(self):
         '''
-        new_team = TeamModel(team_id=self.instance.id, league_id=self.instance.league_id, accronym=self.instance.accronym,
-                             location=self.instance.location, nickname=self.instance.nickname, logo_url=self.instance.logo_url, record=self.instance.record, waiver_position=self.instance.waiver_position, points=self.instance.points, user_id=self.instance.user_id)
-        add_to_db(new_team)
+        Removes the user (and their saved trades) from
+        the league. The league is deleted once no
+        users have it
+        '''
+        if not self.check_for_record():
+            return
+        # Saved trades are the user's own, so they go with the membership
+        player_ids = db.session.query(PlayerModel.id).filter(
+            PlayerModel.league_id == self.league_model_id)
+        TradeModel.query.filter(TradeModel.user_id == self.user_id,
+                                TradeModel.player_to_trade_id.in_(player_ids)).delete(synchronize_session=False)
+        db.session.delete(self.record)
+        self.change_ref_count(-1)
+        db.session.flush()
 
-        # When we create a new team we also create their stats
-        for stat, val in self.instance.stats.items():
-            new_stat = TeamStatModel(
-                team_id=new_team.id, league_id=self.instance.league_id, stat_name=stat, stat_value=val)
-            db.session.add(new_stat)
+        league = LeagueModel.query.get(self.league_model_id)
+        db.session.refresh(league)
+        if league.ref_count <= 0:
+            db.session.delete(league)
         db.session.commit()
 
 
-class PlayerModelHandler(ModelHandlerBase):
-    def __init__(self, current_instance):
+class BatchModelHandlerBase:
+    '''
+    Base class for handlers that write many records at
+    once. Rows are written with COPY on Postgres, and with
+    a single executemany insert on other databases.
+    Existing records are diffed against the incoming ones,
+    so only what changed is written
+    '''
+
+    def is_postgres(self):
+        '''Returns True if the database is Postgres'''
+        return db.session.get_bind().dialect.name == 'postgresql'
+
+    def format_copy_value(self, value):
         '''
-        Sets the instance attribute (player instance) to parameter
-        current_instance
+        Returns the value as it's written in the COPY
+        data, lists (stats) are written as array literals
         '''
-        self.instance = current_instance
+        if value is None:
+            # \N is our NULL marker, so empty strings stay empty strings
+            return '\\N'
+        if isinstance(value, list):
+            values = ','.join('NULL' if val is None else repr(val) for val in value)
+            return f'{{{values}}}'
+        return value
 
-    def add_record(self):
+    def copy_rows(self, table, rows):
+        '''
+        Streams the rows (a list of dicts) into the table
+        with COPY, using the session's connection so they're
+        part of the current transaction
+        '''
+        columns = list(rows[0].keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([self.format_copy_value(row[column])
+                             for column in columns])
+        buffer.seek(0)
+
+        cursor = db.session.connection().connection.cursor()
+        column_names = ', '.join(columns)
+        cursor.copy_expert(
+            f"COPY {table.name} ({column_names}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+        cursor.close()
+
+    def insert_rows(self, table, rows):
+        '''Inserts the rows (a list of dicts) into the table in bulk'''
+        if not rows:
+            return
+        if self.is_postgres():
+            self.copy_rows(table, rows)
+        else:
+            db.session.execute(table.insert(), rows)
+
+    def insert_missing_rows(self, table, rows):
+        '''
+        Inserts the rows (a list of dicts) into the table in
+        bulk, skipping rows that conflict with a unique index.
+        Used for shared rows another import may be adding too
+        '''
+        if not rows:
+            return
+        if self.is_postgres():
+            db.session.execute(postgresql.insert(table).on_conflict_do_nothing(), rows)
+        else:
+            db.session.execute(table.insert().prefix_with('OR IGNORE'), rows)
+
+    def update_rows(self, table, rows):
+        '''
+        Updates the rows (a list of dicts, each with
+        the primary key as id) with a single executemany
+        '''
+        if not rows:
+            return
+        columns = [column for column in rows[0] if column != 'id']
+        # The bind names can't match the column names, so they're prefixed. The binds
+        # are cast to the column types, so a stats list of all None is still a float array
+        statement = table.update().where(table.c.id == bindparam('row_id')).values(
+            {column: cast(bindparam(f'new_{column}'), table.c[column].type) for column in columns})
+        params = [dict({f'new_{column}': row[column] for column in columns}, row_id=row['id'])
+                  for row in rows]
+        db.session.execute(statement, params)
+
+    def update_column(self, table, column, values):
+        '''
+        Sets the column to values[id] for every row id in
+        values (a dict), with a single set based UPDATE.
+        On Postgres the ids and values are sent as two arrays
+        and joined, a CASE with a branch for every row gets
+        slow once there are thousands of rows
+        '''
+        if not values:
+            return
+        if self.is_postgres():
+            db.session.execute(
+                f'UPDATE {table.name} SET {column} = new.value '
+                f'FROM unnest(:ids, :values) AS new(id, value) WHERE {table.name}.id = new.id',
+                {'ids': list(values), 'values': list(values.values())})
+            return
+        statement = table.update().where(table.c.id.in_(list(values))).values(
+            {column: case(values, value=table.c.id)})
+        db.session.execute(statement)
+
+    def delete_rows(self, table, column, ids):
+        '''Deletes the rows where column is in ids'''
+        if ids:
+            db.session.execute(table.delete().where(column.in_(ids)))
+
+    def get_stored_rows(self, table, key, league_id):
+        '''
+        Returns a dict of key => stored row for
+        every row in the league, in a single query
+        '''
+        rows = db.session.execute(
+            table.select().where(table.c.league_id == league_id))
+        return {row[key]: row for row in rows}
+
+    def diff_rows(self, stored, rows, key):
+        '''
+        Splits the incoming rows into a list of rows that
+        aren't stored yet, and a list of rows whose values changed
+        (with the stored primary key added as id)
+        '''
+        new_rows = []
+        changed_rows = []
+        for row in rows:
+            record = stored.get(row[key])
+            if record is None:
+                new_rows.append(row)
+            elif any(record[column] != val for (column, val) in row.items()):
+                changed_rows.append(dict(row, id=record['id']))
+        return [new_rows, changed_rows]
+
+
+class TeamBatchModelHandler(BatchModelHandlerBase):
+    def __init__(self, teams, league_id):
+        '''
+        Sets the instances attribute to the team
+        instances we are adding, and the league_id
+        attribute to the LeagueModel id they belong to
+        '''
+        self.instances = list(teams)
+        self.league_id = league_id
+
+    def get_team_ids(self):
+        '''
+        Returns a dict of ESPN team id => TeamModel id
+        for the league, in a single query
+        '''
+        rows = db.session.query(TeamModel.team_id, TeamModel.id).filter(
+            TeamModel.league_id == self.league_id).all()
+        return {team_id: id for (team_id, id) in rows}
+
+    def get_record_fields(self, team):
+        '''Returns a dict of the team's column values'''
+        return {'team_id': team.id, 'league_id': team.league_id, 'accronym': team.accronym, 'location': team.location, 'nickname': team.nickname,
+                'logo_url': team.logo_url, 'record': team.record, 'waiver_position': team.waiver_position,
+                'points': team.points, 'stats': team.stats}
+
+    def delete_teams(self, ids):
+        '''Deletes the teams, with their players'''
+        if not ids:
+            return
+        player_ids = [id for (id,) in db.session.query(
+            PlayerModel.id).filter(PlayerModel.team_id.in_(ids))]
+        PlayerBatchModelHandler([], self.league_id).delete_players(player_ids)
+        self.delete_rows(TeamModel.__table__, TeamModel.id, ids)
+
+    def add_or_update_records(self):
+        '''
+        Adds new teams, updates teams that changed, and
+        removes teams that are no longer in the league.
+        Everything happens in one transaction. Returns a
+        dict of ESPN team id => TeamModel id
+        '''
+        stored = self.get_stored_rows(
+            TeamModel.__table__, 'team_id', self.league_id)
+        rows = [self.get_record_fields(team) for team in self.instances]
+        [new_rows, changed_rows] = self.diff_rows(stored, rows, 'team_id')
+
+        team_ids = {team.id for team in self.instances}
+        self.delete_teams([record['id'] for (team_id, record) in stored.items()
+                           if team_id not in team_ids])
+        self.insert_rows(TeamModel.__table__, new_rows)
+        self.update_rows(TeamModel.__table__, changed_rows)
+        db.session.commit()
+
+        # Get every new team's primary key with one query, instead of flushing each team
+        return self.get_team_ids()
+
+
+class ProPlayerBatchModelHandler(BatchModelHandlerBase):
+    def __init__(self, players, year):
+        '''
+        Sets the instances attribute to the player
+        instances we are adding, and the year
+        attribute to the season they're in
+        '''
+        self.instances = list(players)
+        self.year = year
+
+    def get_pro_player_ids(self):
+        '''
+        Returns a dict of ESPN player id => ProPlayerModel id
+        for the instances, in a single query
+        '''
+        rows = db.session.query(ProPlayerModel.player_id, ProPlayerModel.id).filter(
+            ProPlayerModel.year == self.year,
+            ProPlayerModel.player_id.in_([player.id for player in self.instances]))
+        return {player_id: id for (player_id, id) in rows}
+
+    def get_record_fields(self, player):
+        '''Returns a dict of the player's season wide column values'''
+        return {'player_id': player.id, 'year': player.year, 'first_name': player.first_name,
+                'last_name': player.last_name, 'pro_team': player.pro_team, 'position': player.position}
+
+    def get_outlook_weeks(self):
+        '''
+        Returns a dict of ESPN player id => set of the weeks
+        with a stored outlook, for every player in the season.
+        Only the weeks are read, not the outlook text
+        '''
+        outlook_weeks = {}
+        rows = db.session.query(ProPlayerModel.player_id, PlayerOutlookModel.week).join(
+            PlayerOutlookModel).filter(ProPlayerModel.year == self.year)
+        for (player_id, week) in rows:
+            outlook_weeks.setdefault(player_id, set()).add(week)
+        return outlook_weeks
+
+    def get_stored_rows(self):
+        '''
+        Returns a dict of ESPN player id => stored row
+        for the instances, in a single query
+        '''
+        table = ProPlayerModel.__table__
+        rows = db.session.execute(table.select().where(table.c.year == self.year).where(
+            table.c.player_id.in_([player.id for player in self.instances])))
+        return {row['player_id']: row for row in rows}
+
+    def add_or_update_records(self):
+        '''
+        Adds players who are new to the season, updates
+        players whose info changed (a new pro team, etc.), and
+        adds the outlooks that aren't stored yet. Nothing is
+        committed, so it's part of the league's player import.
+        Sets each instance's pro_player_id, and returns a dict
+        of ESPN player id => ProPlayerModel id
+        '''
+        if not self.instances:
+            return {}
+        stored = self.get_stored_rows()
+        rows = [self.get_record_fields(player) for player in self.instances]
+        [new_rows, changed_rows] = self.diff_rows(stored, rows, 'player_id')
+        # Other leagues in the season may be adding the same players
+        self.insert_missing_rows(ProPlayerModel.__table__, new_rows)
+        self.update_rows(ProPlayerModel.__table__, changed_rows)
+
+        ids = self.get_pro_player_ids()
+        outlook_rows = []
+        for player in self.instances:
+            player.pro_player_id = ids[player.id]
+            outlook_rows.extend({'pro_player_id': player.pro_player_id, 'week': week, 'outlook': outlook}
+                                for (week, outlook) in player.outlooks)
+        self.insert_missing_rows(PlayerOutlookModel.__table__, outlook_rows)
+        return ids
+
+
+class PlayerBatchModelHandler(BatchModelHandlerBase):
+    def __init__(self, players, league_id):
+        '''
+        Sets the instances attribute to the player
+        instances we are adding, and the league_id
+        attribute to the LeagueModel id they belong to
+        '''
+        self.instances = list(players)
+        self.league_id = league_id
+        self.stored_rows = {}
+
+    def get_player_ids(self):
+        '''
+        Returns a dict of ESPN player id => PlayerModel id
+        for the league, in a single query
+        '''
+        rows = db.session.query(PlayerModel.player_id, PlayerModel.id).filter(
+            PlayerModel.league_id == self.league_id).all()
+        return {player_id: id for (player_id, id) in rows}
+
+    def get_record_fields(self, player):
+        '''Returns a dict of the player's column values in the league'''
+        return {'player_id': player.id, 'league_id': player.league_id, 'team_id': player.team_id,
+                'pro_player_id': player.pro_player_id, 'position': player.position, 'points': player.points,
+                'projected_points': player.projected_points, 'position_rank': player.rank,
+                'stats': player.stats, 'raw_stats': player.raw_stats}
+
+    def delete_players(self, ids):
+        '''
+        Deletes the players. Their pro player and outlooks
+        are kept, they're shared by the season's leagues
+        '''
+        self.delete_rows(PlayerModel.__table__, PlayerModel.id, ids)
+
+    def add_or_update_records(self):
+        '''
+        Adds new players, updates players that changed (a
+        new team, more points, etc.), and removes players
+        that are no longer on a roster in the league. The
+        instances need their pro_player_id set (see
+        ProPlayerBatchModelHandler). Everything happens in one
+        transaction. The rows that were stored before are kept
+        in stored_rows. Returns a dict of ESPN player id => PlayerModel id
+        '''
+        stored = self.get_stored_rows(
+            PlayerModel.__table__, 'player_id', self.league_id)
+        self.stored_rows = stored
+        rows = [self.get_record_fields(player) for player in self.instances]
+        [new_rows, changed_rows] = self.diff_rows(stored, rows, 'player_id')
+
+        player_ids = {player.id for player in self.instances}
+        self.delete_players([record['id'] for (player_id, record) in stored.items()
+                             if player_id not in player_ids])
+        self.insert_rows(PlayerModel.__table__, new_rows)
+        self.update_rows(PlayerModel.__table__, changed_rows)
+
+        db.session.commit()
+
+        # Get every new player's primary key with one query, instead of flushing each player
+        return self.get_player_ids()
+
+
+class GradeBatchModelHandler(BatchModelHandlerBase):
+    def __init__(self, player_grades, team_grades, league_id, grade_tables=None, grade_mode='range',
+                 replace_all=True):
+        '''
+        Sets the grades attributes to dicts of
+        PlayerModel/TeamModel id => letter grade,
+        the league_id attribute to the LeagueModel id,
+        and grade_tables to a dict of position => sorted
+        list of scores, graded with grade_mode. If
+        replace_all is False only the positions in
+        grade_tables are replaced
         '''
-        Adds a new player record to the database given
-        the instance attribute's info
+        self.player_grades = player_grades
+        self.team_grades = team_grades
+        self.league_id = league_id
+        self.grade_tables = grade_tables or {}
+        self.grade_mode = grade_mode
+        self.replace_all = replace_all
+
+    def get_stored_grading(self):
+        '''
+        Returns a list of the mode the league was last graded
+        with, and a dict of position => its stored grade table
+        '''
+        grade_mode = db.session.query(LeagueModel.grade_mode).filter(
+            LeagueModel.id == self.league_id).scalar()
+        rows = db.session.query(GradeTableModel.position, GradeTableModel.scores).filter(
+            GradeTableModel.league_id == self.league_id)
+        return [grade_mode, {position: scores for (position, scores) in rows}]
+
+    def replace_grade_tables(self):
+        '''
+        Replaces the league's grade tables with the new ones.
+        Positions with an empty table are removed
+        '''
+        query = GradeTableModel.query.filter_by(league_id=self.league_id)
+        if not self.replace_all:
+            query = query.filter(GradeTableModel.position.in_(list(self.grade_tables)))
+        query.delete(synchronize_session=False)
+        self.insert_rows(GradeTableModel.__table__, [
+            {'league_id': self.league_id, 'position': position, 'scores': scores}
+            for (position, scores) in self.grade_tables.items() if scores])
+
+    def update_records(self):
         '''
-        new_player = PlayerModel(player_id=self.instance.id, league_id=self.instance.league_id, team_id=self.instance.team_id, first_name=self.instance.first_name, last_name=self.instance.last_name,
-                                 pro_team=self.instance.pro_team, position=self.instance.position, points=self.instance.points, projected_points=self.instance.projected_points, position_rank=self.instance.rank)
-        db.session.add(new_player)
+        Writes every player and team grade, and the
+        grade tables, in one transaction, with one UPDATE
+        for each table. Grading is the last step of an
+        import, so the league is marked as imported
+        '''
+        self.update_column(PlayerModel.__table__, 'grade', self.player_grades)
+        self.update_column(TeamModel.__table__, 'grade', self.team_grades)
+        self.replace_grade_tables()
+        LeagueModel.query.filter_by(id=self.league_id).update(
+            {LeagueModel.imported_at: datetime.datetime.utcnow(),
+             LeagueModel.grade_mode: self.grade_mode}, synchronize_session=False)
         db.session.commit()
 
-        for stat, val in self.instance.stats.items():
-            new_stat = PlayerStatModel(
-                player_id=new_player.id, league_id=new_player.league_id, stat_name=stat, stat_value=val)
-            db.session.add(new_stat)
 
-        if self.instance.outlooks:
-            for outlook in self.instance.outlooks:
-                new_outlook = PlayerOutlookModel(
-                    player_id=new_player.id, league_id=new_player.league_id, week=outlook[0], outlook=outlook[1])
-                db.session.add(new_outlook)
+class RegradeBatchModelHandler(BatchModelHandlerBase):
+    def __init__(self, results, grade_mode):
+        '''
+        Sets the results attribute to a list of graded leagues,
+        each a list of the LeagueModel id, a dict of PlayerModel
+        id => grade, a dict of TeamModel id => grade, and a dict
+        of position => sorted list of scores, graded with grade_mode
+        '''
+        self.results = results
+        self.grade_mode = grade_mode
+
+    def update_records(self):
+        '''
+        Writes the grades and grade tables of every league
+        in results in one transaction, with one UPDATE for
+        each table
+        '''
+        if not self.results:
+            return
+        league_ids = [league_id for (league_id, player_grades, team_grades, grade_tables) in self.results]
+        player_grades = {}
+        team_grades = {}
+        table_rows = []
+        for (league_id, league_player_grades, league_team_grades, grade_tables) in self.results:
+            player_grades.update(league_player_grades)
+            team_grades.update(league_team_grades)
+            table_rows.extend({'league_id': league_id, 'position': position, 'scores': scores}
+                              for (position, scores) in grade_tables.items())
+
+        self.update_column(PlayerModel.__table__, 'grade', player_grades)
+        self.update_column(TeamModel.__table__, 'grade', team_grades)
+        self.delete_rows(GradeTableModel.__table__, GradeTableModel.league_id, league_ids)
+        self.insert_rows(GradeTableModel.__table__, table_rows)
+        LeagueModel.query.filter(LeagueModel.id.in_(league_ids)).update(
+            {LeagueModel.grade_mode: self.grade_mode}, synchronize_session=False)
         db.session.commit()
@@ -0,0 +1,157 @@
+import hashlib
+import io
+import json
+import time
+import threading
+import ijson
+from espn.classes.base_classes import ESPNRequest
+from espn.classes.single_flight_class import single_flight
+from espn.settings import LEAGUE_PAYLOAD_TTL, LEAGUE_PAYLOAD_MAX_ENTRIES, FETCH_PROFILES
+
+
+def is_valid_payload(content):
+    '''
+    Returns True if the raw payload is for a valid league.
+    ESPN only sends the league's name or teams back if we
+    sent a valid request. The payload is streamed, and we
+    stop at the first top level settings.name or teams key
+    '''
+    if not content:
+        return False
+    try:
+        for prefix, event, value in ijson.parse(io.BytesIO(content)):
+            if prefix == 'settings.name' and event == 'string' and value:
+                return True
+            if prefix == '' and event == 'map_key' and value == 'teams':
+                return True
+    except ijson.JSONError:
+        return False
+    return False
+
+
+class LeaguePayloadStore:
+    '''
+    Holds league payloads from the ESPN API, keyed by
+    (league_id, year, cookies, profile), so each step of a
+    league import can reuse one request instead of making
+    its own. Payloads are held as the raw response body,
+    which is a fraction of the size of the parsed JSON.
+    The store is per process, so an import only makes one
+    request because every step of it runs in one process
+    (see LeagueImporter)
+    '''
+
+    def __init__(self, ttl=LEAGUE_PAYLOAD_TTL, max_entries=LEAGUE_PAYLOAD_MAX_ENTRIES):
+        '''
+        Sets the time to live (in seconds) and the max
+        number of payloads held, then initializes the
+        payloads attribute to an empty dict
+        '''
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Maps (league_id, year, cookies hash, profile) => (time stored, payload)
+        self.payloads = {}
+        self.lock = threading.Lock()
+
+    def hash_cookies(self, cookies=None):
+        '''Returns a hash of the cookies, or None if there aren't any'''
+        if not cookies:
+            return None
+        return hashlib.sha1(json.dumps(cookies, sort_keys=True, default=str).encode()).hexdigest()
+
+    def make_key(self, league_id, year, profile='full', cookies=None):
+        '''
+        Returns the key for the given league id, year, fetch
+        profile, and cookies. League ids can come in as strings
+        from forms and env vars, so we cast them. Cookies are
+        part of the key so a private league is only ever
+        served back to the same cookies
+        '''
+        return (int(league_id), int(year), self.hash_cookies(cookies), profile)
+
+    def is_expired(self, stored_at):
+        '''Returns True if an entry stored at stored_at is expired'''
+        return (time.monotonic() - stored_at) > self.ttl
+
+    def remove_expired(self):
+        '''Removes every expired payload'''
+        expired = [key for key, (stored_at, payload) in self.payloads.items()
+                   if self.is_expired(stored_at)]
+        for key in expired:
+            self.payloads.pop(key)
+
+    def get(self, league_id, year, profile='full', cookies=None):
+        '''
+        Returns the payload for the league and profile, or
+        None if there isn't one or it has expired. A full
+        payload has every view, so it's used for any profile
+        '''
+        keys = [self.make_key(league_id, year, profile, cookies),
+                self.make_key(league_id, year, 'full', cookies)]
+        with self.lock:
+            for key in keys:
+                entry = self.payloads.get(key)
+                if not entry:
+                    continue
+                (stored_at, payload) = entry
+                if self.is_expired(stored_at):
+                    self.payloads.pop(key)
+                    continue
+                return payload
+        return None
+
+    def set(self, league_id, year, payload, profile='full', cookies=None):
+        '''
+        Stores the payload for the league, dropping
+        the oldest payloads if we are over max_entries
+        '''
+        key = self.make_key(league_id, year, profile, cookies)
+        with self.lock:
+            self.remove_expired()
+            self.payloads[key] = (time.monotonic(), payload)
+            while len(self.payloads) > self.max_entries:
+                oldest = min(self.payloads,
+                             key=lambda k: self.payloads[k][0])
+                self.payloads.pop(oldest)
+
+    def evict(self, league_id, year):
+        '''Removes every payload stored for the league, for any cookies'''
+        league = (int(league_id), int(year))
+        with self.lock:
+            for key in [key for key in self.payloads if key[:2] == league]:
+                self.payloads.pop(key)
+
+    def get_or_fetch(self, league_id, year, fetch, profile='full', cookies=None):
+        '''
+        Returns the stored payload for the league, otherwise
+        calls fetch() to get it from the API. Only valid
+        payloads are stored
+        '''
+        payload = self.get(league_id, year, profile, cookies)
+        if payload is not None:
+            return payload
+
+        payload = fetch()
+        if is_valid_payload(payload):
+            self.set(league_id, year, payload, profile, cookies)
+        return payload
+
+
+# One store per process, shared by every request the process handles
+league_payload_store = LeaguePayloadStore()
+
+
+def fetch_league_payload(league_id, year, cookies=None, refresh=False, profile='full'):
+    '''
+    Returns the raw payload for the league with the views
+    of the given fetch profile, from the store if we have
+    it, otherwise from the API. If refresh is True the
+    stored payloads are ignored
+    '''
+    if refresh:
+        league_payload_store.evict(league_id, year)
+    espn_request = ESPNRequest(league_id=league_id, year=year, cookies=cookies)
+    params = {'view': FETCH_PROFILES[profile]}
+    key = single_flight.make_key(league_id, year, params, cookies)
+    return league_payload_store.get_or_fetch(league_id, year, lambda: single_flight.do(
+        key, lambda: espn_request.get_response_content(params=params)), profile, cookies)
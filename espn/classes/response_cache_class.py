@@ -0,0 +1,178 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from espn.settings import ESPN_CACHE_DIR, ESPN_CACHE_MAX_BYTES, ESPN_CACHE_ENABLED
+
+
+class ESPNResponseCache:
+    '''
+    Disk cache for ESPN API responses. Entries are keyed by
+    url plus sorted params, stored gzipped, and revalidated with
+    conditional GETs (ETag/Last-Modified) so unchanged data
+    isn't downloaded again. The cache is size bounded and
+    evicts the least recently used entries first
+    '''
+
+    def __init__(self, cache_dir=ESPN_CACHE_DIR, max_bytes=ESPN_CACHE_MAX_BYTES, enabled=ESPN_CACHE_ENABLED):
+        '''
+        Sets the cache directory, the max total size (in
+        bytes) of the cache, and initializes the counters
+        '''
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def make_key(self, url, params=None, cookies=None):
+        '''
+        Returns the cache key for the url and params. Views
+        are sorted so the order they're asked for doesn't
+        matter, and cookies are included so a private league
+        is only ever served back to the same cookies
+        '''
+        params = dict(params or {})
+        if 'view' in params:
+            params['view'] = sorted(params['view'])
+        raw_key = json.dumps([url, params, cookies],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(raw_key.encode()).hexdigest()
+
+    def get_path(self, key):
+        '''Returns the path of the entry for the key'''
+        return os.path.join(self.cache_dir, f'{key}.json.gz')
+
+    def get_meta(self, key):
+        '''
+        Returns the meta data (url, etag, last_modified)
+        stored with the entry, or None if there isn't one.
+        The first line of each entry holds its meta data
+        '''
+        if not self.enabled:
+            return None
+        try:
+            with gzip.open(self.get_path(key), 'rb') as entry:
+                return json.loads(entry.readline())
+        except (OSError, ValueError, EOFError):
+            return None
+
+    def get_conditional_headers(self, key):
+        '''
+        Returns the headers needed to revalidate the
+        entry for the key, or None if it isn't cached
+        '''
+        meta = self.get_meta(key)
+        if not meta:
+            return None
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers or None
+
+    def open(self, key):
+        '''
+        Opens the entry for the key and returns a file object
+        positioned at the start of the body, or None if the
+        entry doesn't exist. Opening an entry counts as using it
+        '''
+        path = self.get_path(key)
+        try:
+            entry = gzip.open(path, 'rb')
+            entry.readline()
+        except (OSError, EOFError):
+            return None
+        # Eviction goes by mtime, so touching the entry marks it recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def load(self, key):
+        '''Returns the body of the entry for the key, or None'''
+        entry = self.open(key)
+        if not entry:
+            return None
+        try:
+            with entry:
+                return entry.read()
+        except (OSError, EOFError):
+            return None
+
+    def store(self, key, url, headers, content):
+        '''
+        Stores the body of a response if it can be revalidated
+        later (it has an ETag or Last-Modified header), then
+        evicts old entries if the cache is over its size
+        '''
+        if not self.enabled:
+            return
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified,
+                'stored_at': time.time()}
+        path = self.get_path(key)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with gzip.open(temp_path, 'wb') as entry:
+                entry.write(json.dumps(meta).encode() + b'\n')
+                entry.write(content)
+            # Replacing means other workers never read a partial entry
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self.evict()
+
+    def evict(self):
+        '''
+        Removes the least recently used entries until
+        the cache is under its max size
+        '''
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith('.json.gz'):
+                continue
+            path = os.path.join(self.cache_dir, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for (mtime, size, path) in entries)
+        for (mtime, size, path) in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+
+    def record_hit(self):
+        with self.lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def get_stats(self):
+        '''Returns the hit/miss counters for this process'''
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+# One per process, the entries on disk are shared by every worker
+espn_response_cache = ESPNResponseCache()
@@ -0,0 +1,47 @@
+import numpy as np
+from espn.settings import STAT_NAMES, DEFAULT_STAT_VALUES
+
+
+class ScoringEngine:
+    '''
+    Scores players from their stats. The players' stats
+    (STAT_NAMES ordered lists) are put in a players x stats
+    matrix, which is multiplied by a vector of the points
+    each stat is worth, so a whole league is scored with
+    one matrix product instead of a loop over every stat
+    '''
+
+    def __init__(self, stat_values=None, stat_weights=None):
+        '''
+        Sets the stat_vector attribute to the points each stat
+        is worth, from the stat_values dict of stat name => points
+        (DEFAULT_STAT_VALUES if there isn't one). stat_weights is
+        an optional dict of stat name => multiplier, for counting
+        some stats more or less than the league does
+        '''
+        self.stat_values = DEFAULT_STAT_VALUES if stat_values is None else stat_values
+        self.stat_weights = stat_weights or {}
+        self.stat_vector = self.get_stat_vector()
+
+    def get_stat_vector(self):
+        '''
+        Returns an array of the points each stat in STAT_NAMES
+        is worth, 0 for stats that aren't scored
+        '''
+        return np.array([self.stat_values.get(name, 0) * self.stat_weights.get(name, 1)
+                         for name in STAT_NAMES], dtype=np.float64)
+
+    def get_stat_matrix(self, stats):
+        '''
+        Returns a (players x stats) array from a list of each
+        player's stats list. Stats without a value are 0
+        '''
+        matrix = np.array([row or [None] * len(STAT_NAMES) for row in stats], dtype=np.float64)
+        return np.nan_to_num(matrix.reshape(len(stats), len(STAT_NAMES)), copy=False)
+
+    def score(self, stats):
+        '''
+        Returns an array of each player's points, from a
+        list of each player's stats list
+        '''
+        return self.get_stat_matrix(stats) @ self.stat_vector
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from espn.settings import SINGLE_FLIGHT_DIR, SINGLE_FLIGHT_WINDOW
+
+try:
+    import fcntl
+except ImportError:
+    # File locks are only available on unix, elsewhere we only coalesce within a process
+    fcntl = None
+
+
+class InFlightCall:
+    '''
+    Class for a fetch that is currently in flight,
+    callers for the same key wait on the event
+    and share the result
+    '''
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    '''
+    Coalesces concurrent fetches for the same key so only
+    one of them goes to the ESPN API. Callers in the same
+    process wait on the in flight call, and callers in other
+    workers wait on a file lock then read the leader's result
+    from a result file. Only callers that were waiting while
+    the fetch was in flight get the result, anyone who comes
+    after it makes their own fetch. Results are raw response
+    bodies (bytes)
+    '''
+
+    def __init__(self, lock_dir=SINGLE_FLIGHT_DIR, window=SINGLE_FLIGHT_WINDOW):
+        '''
+        Sets the directory for lock and result files, and
+        the window (in seconds) after which a result file
+        is never shared, and is removed
+        '''
+        self.lock_dir = lock_dir
+        self.window = window
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def make_key(self, league_id, year, params=None, cookies=None):
+        '''
+        Returns a key for a fetch of the league with the
+        given params. Cookies are part of the key so a private
+        league's data is never shared with someone else
+        '''
+        params = dict(params or {})
+        if 'view' in params:
+            params['view'] = sorted(params['view'])
+        raw_key = json.dumps([str(league_id), str(year), params, cookies],
+                             sort_keys=True, default=str)
+        return hashlib.sha1(raw_key.encode()).hexdigest()
+
+    def do(self, key, fetch):
+        '''
+        Returns the result of fetch(), making sure only one
+        caller per key is fetching at a time. Everyone waiting
+        gets the same result (or the same error)
+        '''
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = InFlightCall()
+                self.calls[key] = call
+
+        if not is_leader:
+            call.event.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self.fetch_across_workers(key, fetch)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.event.set()
+        return call.result
+
+    def fetch_across_workers(self, key, fetch):
+        '''
+        Takes the file lock for the key, then either reads
+        a result another worker wrote while we were waiting,
+        or fetches and writes the result for the workers
+        waiting behind us
+        '''
+        if fcntl is None:
+            return fetch()
+
+        # Payloads can be for private leagues, so only our user can read them
+        os.makedirs(self.lock_dir, mode=0o700, exist_ok=True)
+        lock_path = os.path.join(self.lock_dir, f'{key}.lock')
+        result_path = os.path.join(self.lock_dir, f'{key}.result')
+
+        waiting_since = time.time()
+        with os.fdopen(os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)) as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                result = self.read_result(result_path, waiting_since)
+                if result is None:
+                    result = fetch()
+                    self.remove_stale_results()
+                    self.write_result(result_path, result)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_result(self, result_path, waiting_since):
+        '''
+        Returns the result in the file if it was written
+        after we started waiting (by the fetch we were waiting
+        on) and within the window, otherwise None
+        '''
+        try:
+            written_at = os.path.getmtime(result_path)
+            if written_at < waiting_since or (time.time() - written_at) > self.window:
+                return None
+            with open(result_path, 'rb') as result_file:
+                return result_file.read()
+        except OSError:
+            return None
+
+    def remove_stale_results(self):
+        '''
+        Removes result files that are past the window,
+        payloads are large so we don't leave them around
+        '''
+        for file_name in os.listdir(self.lock_dir):
+            if not file_name.endswith('.result'):
+                continue
+            path = os.path.join(self.lock_dir, file_name)
+            try:
+                if (time.time() - os.path.getmtime(path)) > self.window:
+                    os.remove(path)
+            except OSError:
+                # Another worker removed it first
+                pass
+
+    def write_result(self, result_path, result):
+        '''
+        Writes the result to a temp file and moves it into
+        place, so other workers never read a partial file
+        '''
+        temp_path = f'{result_path}.{os.getpid()}.tmp'
+        try:
+            with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as temp_file:
+                temp_file.write(result)
+            os.replace(temp_path, result_path)
+        except OSError:
+            # The result is only shared as an optimization, failing to write it is fine
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+# One per process, the file locks coordinate between processes
+single_flight = SingleFlight()
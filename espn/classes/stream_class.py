@@ -0,0 +1,117 @@
+import io
+import ijson
+
+# League level fields we need, each is built as a whole value
+LEAGUE_PREFIXES = ('scoringPeriodId', 'status', 'settings.name', 'settings.size',
+                   'settings.scoringSettings.scoringItems')
+
+# Fields of each team and player that the Team and Player classes use
+TEAM_KEYS = ('id', 'abbrev', 'location', 'nickname', 'logo', 'points',
+             'record', 'waiverRank', 'valuesByStat')
+PLAYER_KEYS = ('id', 'defaultPositionId', 'firstName', 'lastName',
+               'outlooks', 'injured', 'injuryStatus', 'proTeamId')
+
+
+class LeaguePayloadStream:
+    '''
+    Walks a raw league payload from the ESPN API without
+    ever parsing the whole document into memory. League
+    level fields are read in one pass, and teams are parsed
+    one at a time (trimmed to the fields we use) in another
+    '''
+
+    def __init__(self, content, year):
+        '''
+        Sets the raw payload (bytes) and the year
+        of the league, which is used to drop stats
+        from other seasons
+        '''
+        self.content = content
+        self.year = year
+
+    def open(self):
+        '''Returns a new file object over the payload'''
+        return io.BytesIO(self.content)
+
+    def set_value(self, data, prefix, value):
+        '''
+        Sets value into the nested dict data at the
+        dotted prefix, ie 'settings.name' => data['settings']['name']
+        '''
+        keys = prefix.split('.')
+        for key in keys[:-1]:
+            data = data.setdefault(key, {})
+        data[keys[-1]] = value
+
+    def read_league_fields(self):
+        '''
+        Reads the league level fields (current week, status,
+        name, and scoring items) and counts the teams, skipping
+        over everything else. Returns a dict shaped like the
+        full payload, with num_teams in place of teams
+        '''
+        data = {'num_teams': 0}
+        builder = None
+        depth = 0
+
+        for prefix, event, value in ijson.parse(self.open(), use_float=True):
+            if builder:
+                builder.event(event, value)
+                if event in ('start_map', 'start_array'):
+                    depth += 1
+                elif event in ('end_map', 'end_array'):
+                    depth -= 1
+                if depth == 0:
+                    self.set_value(data, building_prefix, builder.value)
+                    builder = None
+                continue
+
+            if prefix == 'teams.item' and event == 'start_map':
+                data['num_teams'] += 1
+            elif prefix in LEAGUE_PREFIXES:
+                if event in ('start_map', 'start_array'):
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                    building_prefix = prefix
+                    depth = 1
+                elif event not in ('map_key', 'end_map', 'end_array'):
+                    self.set_value(data, prefix, value)
+
+        # Settings only payloads don't have teams, but the settings have the league size
+        if not data['num_teams']:
+            data['num_teams'] = data.get('settings', {}).get('size', 0)
+        return data
+
+    def trim_entry(self, entry):
+        '''
+        Trims a roster entry down to what the Player class
+        uses, keeping only the current season's stats
+        '''
+        year_id = f'00{self.year}'
+        pool_entry = entry.get('playerPoolEntry')
+        player = pool_entry['player'] if pool_entry else entry['player']
+
+        trimmed_player = {key: player[key]
+                          for key in PLAYER_KEYS if key in player}
+        trimmed_player['stats'] = [stat for stat in player.get('stats', [])
+                                   if stat.get('id') == year_id]
+
+        if pool_entry:
+            return {'playerPoolEntry': {'ratings': pool_entry.get('ratings'), 'player': trimmed_player}}
+        return {'player': trimmed_player}
+
+    def trim_team(self, team):
+        '''Trims a team down to what the Team class uses'''
+        trimmed_team = {key: team[key] for key in TEAM_KEYS if key in team}
+        entries = team.get('roster', {}).get('entries', [])
+        trimmed_team['roster'] = {
+            'entries': [self.trim_entry(entry) for entry in entries]}
+        return trimmed_team
+
+    def iter_teams(self):
+        '''
+        Yields each team in the payload, one at a time,
+        so only a single team is ever fully parsed
+        '''
+        for team in ijson.items(self.open(), 'teams.item', use_float=True):
+            yield self.trim_team(team)
@@ -0,0 +1,68 @@
+from unittest import TestCase
+from app.app import app
+from app.database import db, add_to_db
+from espn.classes.batch_grade_class import BatchRegrader, grade_league_records
+from espn.classes.import_class import LeagueImporter
+from espn.benchmark import create_random_players, grade_scalar
+from espn.models import LeagueModel, TeamModel, PlayerModel, GradeTableModel
+from espn.testing import create_test_payload
+from user.models import UserModel
+
+app.config['TESTING'] = True
+app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql:///ffl_trade_tips_test'
+app.config['SQLALCHEMY_ECHO'] = False
+
+db.drop_all()
+
+
+def get_league_grades(league_id):
+    '''Returns the league's player grades, team grades, and grade tables'''
+    league = LeagueModel.query.get(league_id)
+    return [sorted((player.player_id, player.grade) for player in league.players),
+            sorted((team.team_id, team.grade) for team in league.teams),
+            sorted((table.position, table.scores) for table in league.grade_tables)]
+
+
+class BatchRegraderTestCase(TestCase):
+    '''Test Case for BatchRegrader Class'''
+
+    def setUp(self):
+        db.session.remove()
+        db.create_all()
+        user = UserModel(username='batchuser', email='batch@email.com', password='password')
+        add_to_db(user)
+        self.league_ids = [LeagueImporter(league_id=league_id, year=2020, user_id=user.id,
+                                          data=create_test_payload()).run()
+                           for league_id in (67890, 67891, 67892)]
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_run(self):
+        '''Testing every league is regraded to the grades an import gives, in batches'''
+        grades = [get_league_grades(league_id) for league_id in self.league_ids]
+        PlayerModel.query.update({PlayerModel.grade: 'F'})
+        TeamModel.query.update({TeamModel.grade: 'F'})
+        GradeTableModel.query.delete()
+        db.session.commit()
+
+        self.assertEqual(BatchRegrader(workers=2, batch_size=2).run(), 3)
+        db.session.expire_all()
+        self.assertEqual([get_league_grades(league_id) for league_id in self.league_ids], grades)
+
+    def test_grade_mode(self):
+        '''Testing leagues are regraded with the regrader's mode'''
+        BatchRegrader(workers=1, grade_mode='percentile').run(self.league_ids[:1])
+        db.session.expire_all()
+        self.assertEqual(LeagueModel.query.get(self.league_ids[0]).grade_mode, 'percentile')
+        self.assertEqual(LeagueModel.query.get(self.league_ids[1]).grade_mode, 'range')
+
+    def test_grade_league_records(self):
+        '''Testing a league is graded like GradeCalculator grades it'''
+        players = create_random_players(2000)
+        task = (1, 'range', [(id, id % 10, player.position, player.points)
+                             for (id, player) in enumerate(players)])
+        [league_id, player_grades, team_grades, grade_tables] = grade_league_records(task)
+        self.assertEqual(list(player_grades.values()), grade_scalar(players))
+        self.assertEqual(set(team_grades), set(range(10)))
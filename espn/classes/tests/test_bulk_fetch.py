@@ -0,0 +1,47 @@
+from unittest import TestCase
+from espn.classes.bulk_fetch_class import BulkLeagueFetcher
+from espn.classes.payload_store_class import is_valid_payload, league_payload_store
+from espn.testing import create_test_payload, StandInESPN, failing_league_id
+
+test_year = 2020
+
+
+class BulkLeagueFetcherTestCase(TestCase):
+    '''Test Case for BulkLeagueFetcher Class'''
+
+    league_ids = [11111, 22222, 33333, 44444]
+
+    def setUp(self):
+        self.espn = StandInESPN({(league_id, test_year): create_test_payload()
+                                 for league_id in self.league_ids})
+        self.espn.start()
+
+    def tearDown(self):
+        self.espn.stop()
+        for league_id in self.league_ids + [1, failing_league_id]:
+            league_payload_store.evict(league_id, test_year)
+
+    def test_fetch_all(self):
+        '''Testing every league is fetched once, concurrently, and no more than the limit at once'''
+        pairs = [(str(league_id), str(test_year)) for league_id in self.league_ids]
+        payloads = BulkLeagueFetcher(concurrency=2).fetch_all(pairs + pairs[:1])
+
+        self.assertEqual(set(payloads), {(league_id, test_year) for league_id in self.league_ids})
+        for payload in payloads.values():
+            self.assertEqual(payload, create_test_payload())
+        self.assertEqual(sorted(self.espn.handler.requested), self.league_ids)
+        self.assertEqual(self.espn.handler.max_in_flight, 2)
+
+    def test_failed_fetches(self):
+        '''Testing leagues that don't exist or can't be fetched don't stop the rest'''
+        payloads = BulkLeagueFetcher().fetch_all(
+            [(self.league_ids[0], test_year), (1, test_year), (failing_league_id, test_year)])
+
+        self.assertTrue(is_valid_payload(payloads[(self.league_ids[0], test_year)]))
+        self.assertFalse(is_valid_payload(payloads[(1, test_year)]))
+        self.assertIsNone(payloads[(failing_league_id, test_year)])
+
+    def test_no_leagues(self):
+        '''Testing nothing is fetched without any leagues'''
+        self.assertEqual(BulkLeagueFetcher().fetch_all([]), {})
+        self.assertEqual(self.espn.handler.requested, [])
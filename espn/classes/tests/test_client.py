@@ -0,0 +1,85 @@
+import io
+from unittest import TestCase
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from espn.classes.base_classes import ESPNClient, ESPNRequestError
+
+test_url = 'https://espn.test/apis/v3/games/ffl/seasons/2020/segments/0/leagues/12345'
+
+
+class FakeAdapter(BaseAdapter):
+    '''Sends back the given (status, body) responses in order, without the network'''
+
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        (status_code, content) = self.responses[min(self.sent, len(self.responses) - 1)]
+        self.sent += 1
+        response = Response()
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict({'Content-Length': str(len(content))})
+        response.raw = io.BytesIO(content)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def create_test_client(responses, **kwargs):
+    client = ESPNClient(retry_backoff=0, **kwargs)
+    adapter = FakeAdapter(responses)
+    client.get_session().mount('https://', adapter)
+    return [client, adapter]
+
+
+class ESPNClientTestCase(TestCase):
+    '''Test Case for ESPNClient Class'''
+
+    def test_get(self):
+        '''Testing a response is read and its cost recorded'''
+        [client, adapter] = create_test_client([(200, b'{"teams": []}')])
+        response = client.get(test_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'teams': []})
+        self.assertEqual(response.num_bytes, 13)
+        self.assertEqual(response.wire_bytes, 13)
+
+        stats = client.get_stats()
+        self.assertEqual(stats['calls'], 1)
+        self.assertEqual(stats['total_bytes'], 13)
+        self.assertEqual(stats['total_wire_bytes'], 13)
+        self.assertGreaterEqual(stats['total_latency'], 0)
+
+    def test_retry(self):
+        '''Testing retryable statuses are retried until one works'''
+        [client, adapter] = create_test_client(
+            [(429, b''), (503, b''), (200, b'{}')], max_retries=2)
+        self.assertEqual(client.get(test_url).status_code, 200)
+        self.assertEqual(adapter.sent, 3)
+        self.assertEqual(client.get_stats()['calls'], 3)
+
+    def test_retries_exhausted(self):
+        '''Testing an error is raised once every attempt fails'''
+        [client, adapter] = create_test_client([(500, b'')], max_retries=2)
+        with self.assertRaises(ESPNRequestError):
+            client.get(test_url)
+        self.assertEqual(adapter.sent, 3)
+
+    def test_not_retried(self):
+        '''Testing other statuses are returned without a retry'''
+        [client, adapter] = create_test_client([(404, b'{}')], max_retries=2)
+        self.assertEqual(client.get(test_url).status_code, 404)
+        self.assertEqual(adapter.sent, 1)
+
+    def test_payload_cap(self):
+        '''Testing payloads over the cap raise an error'''
+        [client, adapter] = create_test_client([(200, b'x' * 100)], max_payload_bytes=50)
+        with self.assertRaises(ESPNRequestError):
+            client.get(test_url)
+        self.assertEqual(client.get_stats()['calls'], 0)
@@ -31,9 +31,8 @@ def create_test_user():
     return test_user.id
 
 
-def create_test_league(test_user_id):
-    test_league = League(league_id=test_league_id,
-                         year=test_year, user_id=test_user_id)
+def create_test_league():
+    test_league = League(league_id=test_league_id, year=test_year)
 
     return test_league
 
@@ -60,8 +59,8 @@ class LeagueTestCase(TestCase):
 
     def setUp(self):
         db.create_all()
-        user_id = create_test_user()
-        self.league = create_test_league(user_id)
+        create_test_user()
+        self.league = create_test_league()
 
     def tearDown(self):
         db.drop_all()
@@ -70,7 +69,6 @@ class LeagueTestCase(TestCase):
         self.assertEqual(self.league.num_teams, 12)
         self.assertEqual(self.league.name, 'Minshew Crew II')
         for team in self.league.teams:
-            self.assertEqual(team.user_id, 1)
             self.assertIsNotNone(team.location)
             self.assertIsNotNone(team.nickname)
             self.assertIsNotNone(team.points)
@@ -0,0 +1,82 @@
+import json
+import tempfile
+import threading
+from unittest import TestCase
+from espn.classes.base_classes import ESPNClient
+from espn.classes.fixture_class import ESPNFixtures
+from espn.stand_in_server import create_server
+from espn.testing import create_test_payload
+
+test_league_id = 12345
+test_year = 2020
+full_views = {'view': ['mTeam', 'mRoster', 'mSettings', 'kona_playercard']}
+
+
+class ESPNFixturesTestCase(TestCase):
+    '''Test Case for ESPNFixtures Class'''
+
+    def setUp(self):
+        self.fixtures = ESPNFixtures(tempfile.mkdtemp())
+        self.fixtures.save(test_league_id, test_year,
+                           full_views, create_test_payload())
+
+    def test_load(self):
+        '''Testing loading a fixture with the exact views'''
+        content = self.fixtures.load(test_league_id, test_year, {
+            'view': ['kona_playercard', 'mSettings', 'mRoster', 'mTeam']})
+        self.assertEqual(content, create_test_payload())
+
+    def test_filter_views(self):
+        '''Testing a fixture is filtered down to fewer views'''
+        settings = json.loads(self.fixtures.load(
+            test_league_id, test_year, {'view': ['mSettings']}))
+        self.assertIn('settings', settings)
+        self.assertNotIn('teams', settings)
+
+        standings = json.loads(self.fixtures.load(
+            test_league_id, test_year, {'view': ['mTeam']}))
+        self.assertNotIn('roster', standings['teams'][0])
+        self.assertIn('record', standings['teams'][0])
+
+    def test_missing(self):
+        '''Testing there's no fixture for an unknown league'''
+        self.assertIsNone(self.fixtures.load(1, test_year, full_views))
+
+
+class StandInServerTestCase(TestCase):
+    '''Test Case for the ESPN stand in server'''
+
+    def setUp(self):
+        fixtures_dir = tempfile.mkdtemp()
+        ESPNFixtures(fixtures_dir).save(test_league_id,
+                                        test_year, full_views, create_test_payload())
+        self.server = create_server(fixtures_dir, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        port = self.server.server_address[1]
+        self.url = f'http://127.0.0.1:{port}/apis/v3/games/ffl/seasons/{test_year}/segments/0/leagues/{test_league_id}'
+        self.client = ESPNClient()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_league(self):
+        '''Testing the stand in serves the league with view filtering'''
+        response = self.client.get(self.url, params={'view': ['mSettings']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['settings']['name'], 'Test League')
+        self.assertNotIn('teams', response.json())
+
+    def test_revalidate(self):
+        '''Testing the stand in answers conditional requests'''
+        response = self.client.get(self.url, params=full_views)
+        etag = response.headers['ETag']
+        response = self.client.get(self.url, params=full_views, headers={
+                                   'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_found(self):
+        '''Testing an unknown league gets ESPN's error'''
+        response = self.client.get(self.url.replace(str(test_league_id), '1'))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('messages', response.json())
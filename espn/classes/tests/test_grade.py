@@ -0,0 +1,150 @@
+import random
+from collections import namedtuple
+from unittest import TestCase
+import numpy as np
+from espn.benchmark import create_random_players, grade_scalar, grade_vector
+from espn.classes.grade_class import VectorGradeCalculator, IncrementalGrader, PlayerRecord, get_team_grades
+from espn.settings import DEFAULT_STAT_VALUES, POSITIONS
+
+# A player as it's stored after grading
+StoredPlayer = namedtuple('StoredPlayer', ['id', 'team_id', 'points', 'position', 'grade'])
+
+
+def create_vector_grader(players, mode='range'):
+    grader = VectorGradeCalculator(DEFAULT_STAT_VALUES, mode)
+    [points, codes] = grader.get_record_arrays(players)
+    grader.set_extremes(points, codes)
+    grader.set_grade_tables(points, codes)
+    grader.set_grade_ranges()
+    return [grader, points, codes]
+
+
+class VectorGradeCalculatorTestCase(TestCase):
+    '''Test Case for VectorGradeCalculator Class'''
+
+    def test_same_grades(self):
+        '''Testing every player gets the same grade as GradeCalculator'''
+        players = create_random_players(12000)
+        self.assertEqual(grade_vector(players), grade_scalar(players))
+
+    def test_bounds(self):
+        '''Testing scores on a bound get the higher grade'''
+        players = create_random_players(0)
+        grades = grade_vector(players)
+        self.assertEqual(grades[:7], ['F', 'F', 'D', 'C', 'B', 'A', 'A'])
+
+    def test_grade_tables(self):
+        '''Testing each position's table is its sorted scores'''
+        players = create_random_players(1000)
+        [grader, points, codes] = create_vector_grader(players)
+        for position in POSITIONS:
+            scores = sorted(grader.get_score(player) for player in players if player.position == position)
+            self.assertEqual(grader.grade_tables[position].tolist(), scores)
+
+    def test_grade_from_table(self):
+        '''Testing a single player graded from their table gets the same grade as the league'''
+        players = create_random_players(2000)
+        for mode in ('range', 'percentile'):
+            [grader, points, codes] = create_vector_grader(players, mode)
+            grades = grader.grade_players(points, codes).tolist()
+            for (player, grade) in zip(players, grades):
+                table = grader.grade_tables[player.position]
+                self.assertEqual(grader.grade_from_table(grader.get_score(player), table), grade)
+
+    def test_percentile(self):
+        '''Testing percentile mode gives each fifth of a position its own grade'''
+        players = [PlayerRecord(points, 'RB') for points in range(10, 110, 10)]
+        [grader, points, codes] = create_vector_grader(players, 'percentile')
+        self.assertEqual(grader.grade_players(points, codes).tolist(),
+                         ['F', 'F', 'D', 'D', 'C', 'C', 'B', 'B', 'A', 'A'])
+        with self.assertRaises(ValueError):
+            VectorGradeCalculator(DEFAULT_STAT_VALUES, 'curve')
+
+
+class IncrementalGraderTestCase(TestCase):
+    '''Test Case for IncrementalGrader Class'''
+
+    def grade_league(self, players, mode):
+        '''Returns a dict of player id => grade, a dict of team id => grade, and the tables'''
+        [grader, points, codes] = create_vector_grader(players, mode)
+        grades = grader.grade_players(points, codes).tolist()
+        team_ids = sorted({player.team_id for player in players})
+        team_indexes = np.array([team_ids.index(player.team_id) for player in players])
+        team_grades = get_team_grades(grades, team_indexes, len(team_ids))
+        tables = {position: table.tolist() for (position, table) in grader.grade_tables.items()}
+        return [{player.id: grade for (player, grade) in zip(players, grades)},
+                dict(zip(team_ids, team_grades)), tables]
+
+    def create_league(self, rng):
+        return [StoredPlayer(id, rng.randrange(10), round(rng.uniform(-20, 400), 2),
+                             rng.choice(['QB', 'RB', 'WR', 'TE']), None) for id in range(160)]
+
+    def change_league(self, players, rng):
+        '''Returns the players with a few changed, dropped, added, and traded'''
+        changed = []
+        for player in players:
+            roll = rng.random()
+            if roll < 0.03:
+                continue
+            if roll < 0.08:
+                player = player._replace(points=round(player.points + rng.uniform(0, 30), 2))
+            elif roll < 0.1:
+                player = player._replace(team_id=rng.randrange(10))
+            elif roll < 0.11:
+                player = player._replace(position='TE')
+            changed.append(player)
+        changed.extend(StoredPlayer(1000 + id, rng.randrange(10), round(rng.uniform(0, 300), 2), 'WR', None)
+                       for id in range(rng.randrange(4)))
+        return changed
+
+    def test_same_grades(self):
+        '''Testing regrading what changed gives the same grades as grading everything'''
+        for mode in ('range', 'percentile'):
+            for seed in range(20):
+                rng = random.Random(seed)
+                players = self.create_league(rng)
+                [grades, team_grades, tables] = self.grade_league(players, mode)
+                stored = {player.id: player._replace(grade=grades[player.id]) for player in players}
+                new_players = self.change_league(players, rng)
+
+                grader = VectorGradeCalculator(DEFAULT_STAT_VALUES, mode)
+                [changed_grades, changed_teams, changed_tables] = IncrementalGrader(
+                    grader, tables).grade(new_players, stored)
+                [new_grades, new_team_grades, new_tables] = self.grade_league(new_players, mode)
+
+                for player in new_players:
+                    old_grade = stored[player.id].grade if player.id in stored else None
+                    self.assertEqual(changed_grades.get(player.id, old_grade), new_grades[player.id])
+                for (team_id, grade) in new_team_grades.items():
+                    self.assertEqual(changed_teams.get(team_id, team_grades.get(team_id)), grade)
+                for (position, table) in changed_tables.items():
+                    self.assertEqual(table, new_tables.get(position, []))
+                self.assertEqual({**tables, **changed_tables}, new_tables)
+
+    def test_unchanged(self):
+        '''Testing nothing is regraded if nothing changed, and one change only regrades its team'''
+        players = self.create_league(random.Random(0))
+        [grades, team_grades, tables] = self.grade_league(players, 'range')
+        stored = {player.id: player._replace(grade=grades[player.id]) for player in players}
+        grader = VectorGradeCalculator(DEFAULT_STAT_VALUES)
+        self.assertEqual(IncrementalGrader(grader, tables).grade(players, stored), [{}, {}, {}])
+
+        # Lowering a player that isn't the top of their position doesn't move the bounds
+        top_scores = {position: table[-1] for (position, table) in tables.items()}
+        player = next(p for p in players if p.points > 0 and p.points * 0.05 < top_scores[p.position])
+        new_players = [p._replace(points=0.0) if p.id == player.id else p for p in players]
+        [changed_grades, changed_teams, changed_tables] = IncrementalGrader(
+            grader, tables).grade(new_players, stored)
+        self.assertLessEqual(set(changed_grades), {player.id})
+        self.assertEqual(set(changed_teams), {player.team_id})
+        self.assertEqual(set(changed_tables), {player.position})
+
+    def test_mismatched_tables(self):
+        '''Testing stored players that aren't in the tables can't be regraded'''
+        players = self.create_league(random.Random(0))
+        [grades, team_grades, tables] = self.grade_league(players, 'range')
+        stored = {player.id: player._replace(grade=grades[player.id]) for player in players}
+        tables['QB'] = []
+        new_players = [player for player in players if player.position != 'QB']
+        grader = VectorGradeCalculator(DEFAULT_STAT_VALUES)
+        self.assertIsNone(IncrementalGrader(grader, tables).grade(new_players, stored))
@@ -0,0 +1,310 @@
+import datetime
+import json
+from unittest import TestCase
+from flask import session
+from sqlalchemy import event
+from app.app import app
+from app.forms import AddLeagueForm
+from app.database import db, add_to_db
+from espn.classes.import_class import LeagueImporter
+from espn.classes.model_handler_classes import UserLeagueModelHandler
+from espn.classes.payload_store_class import league_payload_store
+from espn.classes.league_handler_class import LeagueHandler
+from espn.settings import LEAGUE_IMPORT_TTL
+from espn.models import LeagueModel, UserLeagueModel, TeamModel, ProPlayerModel, PlayerModel, PlayerOutlookModel, GradeTableModel
+from espn.testing import create_test_payload, create_test_player, StandInESPN
+from user.models import UserModel, TradeModel
+from user.auth import UserAuthentication
+
+app.config['TESTING'] = True
+app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql:///ffl_trade_tips_test'
+app.config['SQLALCHEMY_ECHO'] = False
+
+db.drop_all()
+
+test_league_id = 12345
+test_year = 2020
+
+
+def create_test_user(username='importuser'):
+    auth = UserAuthentication()
+    test_password = auth.create_hashed_password('test_password')
+    test_user = UserModel(username=username,
+                          email=f'{username}@email.com', password=test_password)
+    add_to_db(test_user)
+
+    return test_user.id
+
+
+class LeagueImporterTestCase(TestCase):
+    '''Test Case for LeagueImporter Class'''
+
+    def setUp(self):
+        db.session.remove()
+        db.create_all()
+        self.user_id = create_test_user()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_import(self):
+        '''Testing a league is imported from a payload without the network'''
+        importer = LeagueImporter(league_id=test_league_id, year=test_year,
+                                  user_id=self.user_id, data=create_test_payload())
+        league_model_id = importer.run()
+
+        league = LeagueModel.query.get(league_model_id)
+        self.assertEqual(league.name, 'Test League')
+        self.assertEqual(league.num_teams, 2)
+        self.assertEqual(league.ref_count, 1)
+        self.assertTrue(league.is_fresh())
+        self.assertEqual([m.user_id for m in league.members], [self.user_id])
+        self.assertEqual(len(league.teams), 2)
+        for team in league.teams:
+            self.assertEqual(team.get_stats_dict(), {'Passing Yards': 1.5})
+
+        players = PlayerModel.query.filter_by(league_id=league_model_id).all()
+        self.assertEqual(len(players), 4)
+        for player in players:
+            self.assertIsNotNone(player.grade)
+            self.assertEqual(player.team.league_id, league_model_id)
+        self.assertEqual(PlayerOutlookModel.query.count(), 4)
+
+        top_qb = PlayerModel.query.filter_by(player_id=1).first()
+        self.assertEqual(top_qb.points, 200.25)
+        self.assertEqual(top_qb.get_stats_dict(), {
+                         'Passing Yards': 2002.5, 'Receiving Receptions': 20.0})
+        self.assertEqual(top_qb.grade, 'A')
+        for team in league.teams:
+            self.assertIsNotNone(team.grade)
+
+        # The identity map matches what's stored
+        league_info = importer.league.league_info
+        self.assertEqual(league_info['team_ids'], {t.team_id: t.id for t in league.teams})
+        self.assertEqual(league_info['player_ids'], {p.player_id: p.id for p in players})
+
+    def test_reimport(self):
+        '''Testing importing again updates the league in place'''
+        league_model_id = LeagueImporter(league_id=test_league_id, year=test_year,
+                                         user_id=self.user_id, data=create_test_payload()).run()
+        player_ids = {p.player_id: p.id for p in PlayerModel.query.all()}
+        team_ids = {t.team_id: t.id for t in TeamModel.query.all()}
+        membership = UserLeagueModel.query.filter_by(user_id=self.user_id).one()
+        membership.user_team = team_ids[1]
+        db.session.commit()
+
+        # Player 2 is traded to team 2, player 4 is dropped, player 5 is picked up,
+        # and player 1 scores more points
+        payload = json.loads(create_test_payload())
+        [team_1, team_2] = payload['teams']
+        [player_1, player_2] = [entry['playerPoolEntry']['player']
+                                for entry in team_1['roster']['entries']]
+        player_1['stats'][1]['appliedTotal'] = 300.5
+        player_1['outlooks']['outlooksByWeek'] = {'1': 'Rewritten outlook', '2': 'Week 2'}
+        team_2['roster']['entries'] = [team_2['roster']['entries'][0], team_1['roster']['entries'].pop()]
+        team_2['roster']['entries'].append(
+            {'playerPoolEntry': {'ratings': {'0': {'positionalRanking': 9}},
+                                 'player': create_test_player(5, 1, 20.0)}})
+        payload['scoringPeriodId'] = 11
+
+        refreshed_id = LeagueImporter(league_id=test_league_id, year=test_year, user_id=self.user_id,
+                                      data=json.dumps(payload).encode()).run()
+        self.assertEqual(refreshed_id, league_model_id)
+        self.assertEqual(LeagueModel.query.count(), 1)
+        league = LeagueModel.query.get(league_model_id)
+        self.assertEqual(league.week, 11)
+        self.assertEqual(league.ref_count, 1)
+        self.assertEqual(league.members[0].user_team, team_ids[1])
+        self.assertEqual({t.team_id: t.id for t in TeamModel.query.all()}, team_ids)
+
+        players = {p.player_id: p for p in PlayerModel.query.all()}
+        self.assertEqual(set(players), {1, 2, 3, 5})
+        for player_id in (1, 2, 3):
+            self.assertEqual(players[player_id].id, player_ids[player_id])
+        self.assertEqual(players[1].points, 300.5)
+        self.assertEqual(players[2].team_id, team_ids[2])
+        self.assertIsNotNone(players[5].grade)
+        self.assertEqual(players[5].get_stats_dict(), {
+                         'Passing Yards': 200.0, 'Receiving Receptions': 20.0})
+        # Stored outlooks aren't rewritten, and player 4's stay with the season
+        self.assertEqual([(o.week, o.outlook) for o in players[1].outlooks],
+                         [(1, 'Outlook for 1'), (2, 'Week 2')])
+        self.assertEqual(PlayerOutlookModel.query.count(), 6)
+
+    def test_shared_players(self):
+        '''Testing leagues in the same season share each player's info and outlooks'''
+        LeagueImporter(league_id=test_league_id, year=test_year,
+                       user_id=self.user_id, data=create_test_payload()).run()
+        other_league_id = LeagueImporter(league_id=test_league_id + 1, year=test_year,
+                                         user_id=self.user_id, data=create_test_payload()).run()
+
+        self.assertEqual(PlayerModel.query.count(), 8)
+        self.assertEqual(ProPlayerModel.query.count(), 4)
+        self.assertEqual(PlayerOutlookModel.query.count(), 4)
+        player = PlayerModel.query.filter_by(player_id=1, league_id=other_league_id).one()
+        self.assertEqual(player.full_name, 'Test Player 1')
+        self.assertEqual(player.pro_player.year, test_year)
+        self.assertEqual([o.outlook for o in player.outlooks], ['Outlook for 1'])
+
+    def test_shared_league(self):
+        '''Testing users share one copy of a league, which is kept until the last one leaves'''
+        league_model_id = LeagueImporter(league_id=test_league_id, year=test_year,
+                                         user_id=self.user_id, data=create_test_payload()).run()
+        other_user_id = create_test_user('otheruser')
+        player = PlayerModel.query.first()
+        add_to_db(TradeModel(user_id=other_user_id, player_to_trade_id=player.id))
+
+        # The league was just imported, so the other user joins it without
+        # a payload, and nothing is fetched
+        importer = LeagueImporter(
+            league_id=test_league_id, year=test_year, user_id=other_user_id)
+        self.assertEqual(importer.run(), league_model_id)
+        self.assertIsNone(importer.league)
+        league = LeagueModel.query.get(league_model_id)
+        self.assertEqual(league.ref_count, 2)
+        self.assertEqual(TeamModel.query.count(), 2)
+        self.assertEqual(PlayerModel.query.count(), 4)
+
+        UserLeagueModelHandler(other_user_id, league_model_id).remove_record()
+        league = LeagueModel.query.get(league_model_id)
+        self.assertEqual(league.ref_count, 1)
+        self.assertEqual(TradeModel.query.count(), 0)
+
+        UserLeagueModelHandler(self.user_id, league_model_id).remove_record()
+        self.assertEqual(LeagueModel.query.count(), 0)
+        self.assertEqual(PlayerModel.query.count(), 0)
+
+    def test_grade_tables(self):
+        '''Testing each position's sorted scores are saved, and grade players like the import'''
+        league_model_id = LeagueImporter(league_id=test_league_id, year=test_year,
+                                         user_id=self.user_id, data=create_test_payload()).run()
+        league = LeagueModel.query.get(league_model_id)
+        self.assertEqual(league.grade_mode, 'range')
+        grade_tables = {table.position: table.scores for table in league.grade_tables}
+        self.assertEqual(grade_tables, {'QB': [100.0 * 0.05, 200.25 * 0.05], 'RB': [50.0 * 0.05, 150.0 * 0.05]})
+
+        handler = LeagueHandler()
+        for player in league.players:
+            self.assertEqual(handler.grade_in_league(player, league), player.grade)
+        top_qb = PlayerModel.query.filter_by(player_id=1).first()
+        self.assertEqual(handler.get_percentile(top_qb), 75)
+
+        # A refresh replaces the tables
+        LeagueImporter(league_id=test_league_id, year=test_year, user_id=self.user_id,
+                       data=create_test_payload(), refresh=True).run()
+        self.assertEqual(GradeTableModel.query.filter_by(league_id=league_model_id).count(), 2)
+
+    def test_grading_reads_nothing(self):
+        '''Testing grading works on the players in memory, with no SELECTs'''
+        importer = LeagueImporter(league_id=test_league_id, year=test_year,
+                                  user_id=self.user_id, data=create_test_payload())
+        stages = importer.run_stages()
+        for (stage, progress) in stages:
+            if stage == 'players':
+                break
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement.split()[0])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            next(stages)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertIn('UPDATE', statements)
+        self.assertNotIn('SELECT', statements)
+        self.assertEqual(PlayerModel.query.filter(PlayerModel.grade.is_(None)).count(), 0)
+
+    def test_grades_without_grading(self):
+        '''Testing grades can be written for a league that hasn't started grading'''
+        importer = LeagueImporter(league_id=test_league_id, year=test_year,
+                                  user_id=self.user_id, data=create_test_payload())
+        for (stage, progress) in importer.run_stages():
+            if stage == 'players':
+                break
+        self.assertIsNone(importer.league.incremental_grades)
+        importer.league.get_grades()
+        self.assertEqual(PlayerModel.query.filter(PlayerModel.grade.is_(None)).count(), 0)
+
+    def test_incremental_grades(self):
+        '''Testing a refresh only regrades what changed, and gets the same grades as a new import'''
+        league_model_id = LeagueImporter(league_id=test_league_id, year=test_year,
+                                         user_id=self.user_id, data=create_test_payload()).run()
+        payload = json.loads(create_test_payload())
+        # The second QB passes the first, and a new RB joins the first team
+        payload['teams'][1]['roster']['entries'][0]['playerPoolEntry']['player']['stats'][1]['appliedTotal'] = 300.0
+        payload['teams'][0]['roster']['entries'].append(
+            {'playerPoolEntry': {'ratings': {'0': {'positionalRanking': 9}}, 'player': create_test_player(5, 2, 75.0)}})
+        payload = json.dumps(payload).encode()
+
+        importer = LeagueImporter(league_id=test_league_id, year=test_year,
+                                  user_id=self.user_id, data=payload)
+        importer.run()
+        self.assertIsNotNone(importer.league.incremental_grades)
+        new_league_model_id = LeagueImporter(league_id=test_league_id + 1, year=test_year,
+                                             user_id=self.user_id, data=payload).run()
+
+        old_league = LeagueModel.query.get(league_model_id)
+        new_league = LeagueModel.query.get(new_league_model_id)
+        self.assertEqual(sorted((p.player_id, p.grade) for p in old_league.players),
+                         sorted((p.player_id, p.grade) for p in new_league.players))
+        self.assertEqual(sorted((t.team_id, t.grade) for t in old_league.teams),
+                         sorted((t.team_id, t.grade) for t in new_league.teams))
+        self.assertEqual(sorted((t.position, t.scores) for t in old_league.grade_tables),
+                         sorted((t.position, t.scores) for t in new_league.grade_tables))
+
+
+class LeagueRefreshTestCase(TestCase):
+    '''Test Case for refreshing leagues from ESPN, with a stand in serving the leagues'''
+
+    fresh_league_id = 61111
+    stale_league_id = 62222
+    missing_league_id = 63333
+
+    def setUp(self):
+        db.session.remove()
+        db.create_all()
+        self.user_id = create_test_user()
+        self.espn = StandInESPN({(league_id, test_year): create_test_payload('Renamed League')
+                                 for league_id in (self.fresh_league_id, self.stale_league_id)})
+        self.espn.start()
+
+    def tearDown(self):
+        self.espn.stop()
+        for league_id in (self.fresh_league_id, self.stale_league_id, self.missing_league_id):
+            league_payload_store.evict(league_id, test_year)
+        db.session.remove()
+        db.drop_all()
+
+    def import_league(self, league_id, stale=False):
+        league_model_id = LeagueImporter(league_id=league_id, year=test_year,
+                                         user_id=self.user_id, data=create_test_payload()).run()
+        if stale:
+            league = LeagueModel.query.get(league_model_id)
+            league.imported_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=LEAGUE_IMPORT_TTL + 1)
+            db.session.commit()
+        return league_model_id
+
+    def test_refresh_all(self):
+        '''Testing fresh leagues count as refreshed without a fetch, and leagues that can't be fetched are skipped'''
+        fresh_id = self.import_league(self.fresh_league_id)
+        stale_id = self.import_league(self.stale_league_id, stale=True)
+        missing_id = self.import_league(self.missing_league_id, stale=True)
+
+        self.assertEqual(LeagueHandler().refresh_all(self.user_id), [2, 3])
+        self.assertEqual(sorted(self.espn.handler.requested), [self.stale_league_id, self.missing_league_id])
+        self.assertEqual(LeagueModel.query.get(fresh_id).name, 'Test League')
+        self.assertEqual(LeagueModel.query.get(stale_id).name, 'Renamed League')
+        self.assertEqual(LeagueModel.query.get(missing_id).name, 'Test League')
+
+    def test_refresh_league(self):
+        '''Testing a refresh imports the league again, even if it was just imported'''
+        league_model_id = self.import_league(self.fresh_league_id)
+        with app.test_request_context():
+            session['user_id'] = self.user_id
+            form = AddLeagueForm(meta={'csrf': False}, league_id=self.fresh_league_id, year=test_year)
+            self.assertEqual(LeagueHandler().refresh_league(form), league_model_id)
+
+        league = LeagueModel.query.get(league_model_id)
+        self.assertEqual(league.name, 'Renamed League')
+        self.assertEqual(league.ref_count, 1)
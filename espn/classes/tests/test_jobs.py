@@ -0,0 +1,100 @@
+import datetime
+from unittest import TestCase
+from app.app import app
+from app.database import db, add_to_db
+from espn.classes.job_queue_class import JobQueue, JobWorker
+from espn.classes.payload_store_class import league_payload_store
+from espn.models import JobModel, LeagueModel, UserLeagueModel
+from espn.testing import create_test_payload
+from user.models import UserModel
+from user.auth import UserAuthentication
+
+app.config['TESTING'] = True
+app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql:///ffl_trade_tips_test'
+app.config['SQLALCHEMY_ECHO'] = False
+
+db.drop_all()
+
+test_league_id = 23456
+test_year = 2020
+
+
+def create_test_user():
+    auth = UserAuthentication()
+    test_password = auth.create_hashed_password('test_password')
+    test_user = UserModel(username='jobuser',
+                          email='job@email.com', password=test_password)
+    add_to_db(test_user)
+
+    return test_user.id
+
+
+class JobQueueTestCase(TestCase):
+    '''Test Case for JobQueue and JobWorker Classes'''
+
+    def setUp(self):
+        db.session.remove()
+        db.create_all()
+        self.user_id = create_test_user()
+        self.queue = JobQueue()
+
+    def tearDown(self):
+        league_payload_store.evict(test_league_id, test_year)
+        db.session.remove()
+        db.drop_all()
+
+    def test_enqueue(self):
+        '''Testing jobs are queued, and unknown kinds are refused'''
+        job = self.queue.enqueue(self.user_id, test_league_id, test_year)
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(job.progress, 0)
+        self.assertEqual(job.kind, 'import')
+        with self.assertRaises(ValueError):
+            self.queue.enqueue(self.user_id, test_league_id, test_year, 'delete')
+
+    def test_claim(self):
+        '''Testing jobs are claimed oldest first, once each'''
+        first = self.queue.enqueue(self.user_id, test_league_id, test_year)
+        second = self.queue.enqueue(self.user_id, test_league_id, test_year, 'refresh')
+
+        self.assertEqual(self.queue.claim().id, first.id)
+        self.assertEqual(self.queue.claim().id, second.id)
+        self.assertIsNone(self.queue.claim())
+        self.assertEqual(JobModel.query.get(first.id).status, 'running')
+
+    def test_claim_stale(self):
+        '''Testing a job left running by a dead worker is claimed again'''
+        job = self.queue.enqueue(self.user_id, test_league_id, test_year)
+        self.queue.claim()
+        job.updated_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.queue.timeout + 1)
+        db.session.commit()
+        self.assertEqual(self.queue.claim().id, job.id)
+
+    def test_run_job(self):
+        '''Testing a worker imports the league, and records each stage'''
+        league_payload_store.set(test_league_id, test_year, create_test_payload())
+        job = self.queue.enqueue(self.user_id, test_league_id, test_year)
+        stages = []
+        self.queue.set_progress = lambda job, stage, progress: stages.append((stage, progress))
+
+        self.assertEqual(JobWorker(self.queue).run(burst=True), 1)
+        job = JobModel.query.get(job.id)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.progress, 100)
+        self.assertEqual([stage for (stage, progress) in stages],
+                         ['league', 'teams', 'players', 'grades'])
+        league = LeagueModel.query.get(job.league_model_id)
+        self.assertEqual(league.name, 'Test League')
+        self.assertIsNotNone(UserLeagueModel.query.filter_by(
+            user_id=self.user_id, league_id=league.id).first())
+
+    def test_failed_job(self):
+        '''Testing a job that raises is marked as failed, and the worker carries on'''
+        league_payload_store.set(test_league_id, test_year, b'{"settings": {}}')
+        failed = self.queue.enqueue(self.user_id, test_league_id, test_year)
+        self.assertFalse(JobWorker(self.queue).run_job(self.queue.claim()))
+
+        failed = JobModel.query.get(failed.id)
+        self.assertEqual(failed.status, 'failed')
+        self.assertIsNotNone(failed.error)
+        self.assertFalse(JobWorker(self.queue).run_next())
@@ -0,0 +1,77 @@
+from unittest import TestCase
+from espn.classes.payload_store_class import LeaguePayloadStore, is_valid_payload
+
+
+class LeaguePayloadStoreTestCase(TestCase):
+    '''Test Case for LeaguePayloadStore Class'''
+
+    def setUp(self):
+        self.store = LeaguePayloadStore(ttl=60, max_entries=2)
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return b'{"teams": [{"id": 1}]}'
+
+    def test_get_or_fetch(self):
+        '''Testing that a stored payload is reused'''
+        first = self.store.get_or_fetch('12345', '2020', self.fetch)
+        second = self.store.get_or_fetch(12345, 2020, self.fetch)
+        self.assertEqual(self.fetches, 1)
+        self.assertIs(first, second)
+
+    def test_invalid_payload(self):
+        '''Testing that payloads without teams aren't stored'''
+        self.store.get_or_fetch(1, 2020, lambda: b'{"messages": ["error"]}')
+        self.assertIsNone(self.store.get(1, 2020))
+
+    def test_expired(self):
+        '''Testing that expired payloads are fetched again'''
+        self.store.ttl = -1
+        self.store.get_or_fetch(1, 2020, self.fetch)
+        self.store.get_or_fetch(1, 2020, self.fetch)
+        self.assertEqual(self.fetches, 2)
+
+    def test_evict(self):
+        '''Testing evicting a payload'''
+        self.store.get_or_fetch(1, 2020, self.fetch)
+        self.store.evict(1, 2020)
+        self.assertIsNone(self.store.get(1, 2020))
+
+    def test_max_entries(self):
+        '''Testing the oldest payload is dropped when the store is full'''
+        self.store.set(1, 2020, b'{"teams": [1]}')
+        self.store.set(2, 2020, b'{"teams": [2]}')
+        self.store.set(3, 2020, b'{"teams": [3]}')
+        self.assertIsNone(self.store.get(1, 2020))
+        self.assertIsNotNone(self.store.get(3, 2020))
+
+    def test_profiles(self):
+        '''Testing a full payload is used for any profile, but not the other way'''
+        self.store.set(1, 2020, b'{"settings": {}}', 'settings')
+        self.assertIsNone(self.store.get(1, 2020))
+        self.store.set(1, 2020, b'{"teams": [1]}')
+        self.assertEqual(self.store.get(1, 2020, 'rosters'), b'{"teams": [1]}')
+        self.store.evict(1, 2020)
+        self.assertIsNone(self.store.get(1, 2020, 'settings'))
+
+    def test_is_valid_payload(self):
+        '''Testing only payloads with a top level league name or teams are valid'''
+        self.assertTrue(is_valid_payload(b'{"settings": {"name": "Test League"}}'))
+        self.assertTrue(is_valid_payload(b'{"id": 1, "teams": []}'))
+        self.assertFalse(is_valid_payload(None))
+        self.assertFalse(is_valid_payload(b'{"settings": {}}'))
+        self.assertFalse(is_valid_payload(b'{"messages": ["No \\"settings\\" or \\"teams\\""]}'))
+        self.assertFalse(is_valid_payload(b'{"details": [{"teams": [], "settings": {"name": "x"}}]}'))
+        self.assertFalse(is_valid_payload(b'<html>"teams"</html>'))
+
+    def test_cookies(self):
+        '''Testing a payload fetched with cookies is only served back to the same cookies'''
+        cookies = {'espn_s2': 'abc', 'SWID': '{123}'}
+        self.store.get_or_fetch(1, 2020, self.fetch, cookies=cookies)
+        self.assertIsNone(self.store.get(1, 2020))
+        self.assertIsNone(self.store.get(1, 2020, cookies={'espn_s2': 'xyz', 'SWID': '{123}'}))
+        self.assertIsNotNone(self.store.get(1, 2020, cookies=dict(cookies)))
+
+        self.store.evict(1, 2020)
+        self.assertIsNone(self.store.get(1, 2020, cookies=cookies))
@@ -0,0 +1,49 @@
+import os
+import tempfile
+from unittest import TestCase
+from espn.classes.response_cache_class import ESPNResponseCache
+
+test_url = 'https://fantasy.espn.com/apis/v3/games/ffl/seasons/2020/segments/0/leagues/1'
+
+
+class ESPNResponseCacheTestCase(TestCase):
+    '''Test Case for ESPNResponseCache Class'''
+
+    def setUp(self):
+        self.cache = ESPNResponseCache(
+            cache_dir=tempfile.mkdtemp(), max_bytes=1024 * 1024, enabled=True)
+
+    def test_make_key(self):
+        '''Testing the key doesn't depend on view order'''
+        first = self.cache.make_key(test_url, {'view': ['mTeam', 'mRoster']})
+        second = self.cache.make_key(test_url, {'view': ['mRoster', 'mTeam']})
+        other = self.cache.make_key(test_url, {'view': ['mTeam']})
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_store_and_load(self):
+        '''Testing storing a response and revalidating it'''
+        key = self.cache.make_key(test_url)
+        self.assertIsNone(self.cache.get_conditional_headers(key))
+
+        self.cache.store(key, test_url, {'ETag': '"abc"'}, b'{"teams": []}')
+        self.assertEqual(self.cache.get_conditional_headers(key),
+                         {'If-None-Match': '"abc"'})
+        self.assertEqual(self.cache.load(key), b'{"teams": []}')
+
+    def test_no_validators(self):
+        '''Testing responses that can't be revalidated aren't stored'''
+        key = self.cache.make_key(test_url)
+        self.cache.store(key, test_url, {}, b'{"teams": []}')
+        self.assertIsNone(self.cache.load(key))
+
+    def test_evict(self):
+        '''Testing the least recently used entries are evicted'''
+        self.cache.max_bytes = 2500
+        keys = [self.cache.make_key(test_url, {'n': n}) for n in range(3)]
+        for (n, key) in enumerate(keys):
+            # Random bytes so gzip can't shrink them
+            self.cache.store(key, test_url, {'ETag': str(n)}, os.urandom(1000))
+            os.utime(self.cache.get_path(key), (n, n))
+        self.assertIsNone(self.cache.load(keys[0]))
+        self.assertIsNotNone(self.cache.load(keys[2]))
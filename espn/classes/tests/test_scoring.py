@@ -0,0 +1,87 @@
+import json
+from unittest import TestCase, mock
+from app.app import app
+from app.database import db, add_to_db
+from espn.classes import espn_classes
+from espn.classes.grade_class import GradeCalculator
+from espn.classes.import_class import LeagueImporter
+from espn.classes.scoring_class import ScoringEngine
+from espn.models import PlayerModel
+from espn.settings import STAT_NAMES, DEFAULT_STAT_VALUES
+from espn.testing import create_test_payload
+from user.models import UserModel
+
+app.config['TESTING'] = True
+app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql:///ffl_trade_tips_test'
+app.config['SQLALCHEMY_ECHO'] = False
+
+db.drop_all()
+
+
+def create_test_stats(stats):
+    '''Returns a STAT_NAMES ordered stats list from a dict of stat name => value'''
+    return [stats.get(name) for name in STAT_NAMES]
+
+
+class ScoringEngineTestCase(TestCase):
+    '''Test Case for ScoringEngine Class'''
+
+    def test_score(self):
+        '''Testing players are scored with the default stat values'''
+        stats = [create_test_stats({'Passing Yards': 300, 'Passing Touchdowns': 2}),
+                 create_test_stats({'Receiving Receptions': 10, 'Lost Fumbles': 1}),
+                 None]
+        self.assertEqual(ScoringEngine().score(stats).tolist(), [20.0, 3.0, 0.0])
+
+    def test_league_scoring(self):
+        '''Testing a league's scoring settings are used, and unscored stats are worth 0'''
+        engine = ScoringEngine({'Receiving Receptions': 1, 'Rushing Touchdowns': 6})
+        stats = [create_test_stats({'Receiving Receptions': 10, 'Passing Yards': 300})]
+        self.assertEqual(engine.score(stats).tolist(), [10.0])
+
+    def test_stat_weights(self):
+        '''Testing stat weights scale the points a stat is worth'''
+        engine = ScoringEngine(stat_weights={'Passing Touchdowns': 0.5})
+        stats = [create_test_stats({'Passing Touchdowns': 2})]
+        self.assertEqual(engine.score(stats).tolist(), [4.0])
+
+    def test_same_as_adjust_score_total(self):
+        '''Testing the matrix product adds up the same points as adjusting one stat at a time'''
+        stats = create_test_stats({name: index + 1 for (index, name) in enumerate(STAT_NAMES)})
+        grader = GradeCalculator(DEFAULT_STAT_VALUES)
+        total = 0
+        for name in DEFAULT_STAT_VALUES:
+            if name in STAT_NAMES:
+                total = grader.adjust_score_total(stats, name, total)
+        self.assertAlmostEqual(ScoringEngine().score([stats])[0] * grader.weight, total)
+
+
+class StatGradingTestCase(TestCase):
+    '''Test Case for grading a league on points from raw stats'''
+
+    def setUp(self):
+        db.session.remove()
+        db.create_all()
+        self.user = UserModel(username='scoringuser', email='scoring@email.com', password='password')
+        add_to_db(self.user)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_grade_from_stats(self):
+        '''Testing the league's scoring settings decide grades when grading from stats'''
+        payload = json.loads(create_test_payload())
+        for team in payload['teams']:
+            for entry in team['roster']['entries']:
+                player = entry['playerPoolEntry']['player']
+                # The league only scores receptions, and the second QB has more
+                receptions = 10.0 if player['id'] == 3 else 1.0
+                player['stats'][1]['stats'] = {'53': receptions}
+
+        with mock.patch.object(espn_classes, 'GRADE_POINTS', 'stats'):
+            LeagueImporter(league_id=34567, year=2020, user_id=self.user.id,
+                           data=json.dumps(payload).encode()).run()
+        grades = {player.player_id: player.grade for player in PlayerModel.query}
+        self.assertEqual(grades[3], 'A')
+        self.assertEqual(grades[1], 'F')
@@ -0,0 +1,88 @@
+import os
+import stat
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from espn.classes.single_flight_class import SingleFlight
+
+
+class SingleFlightTestCase(TestCase):
+    '''Test Case for SingleFlight Class'''
+
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.flight = SingleFlight(lock_dir=self.lock_dir, window=10)
+        self.fetches = 0
+
+    def slow_fetch(self):
+        self.fetches += 1
+        time.sleep(0.2)
+        return b'{"teams": [1, 2, 3]}'
+
+    def test_make_key(self):
+        '''Testing the key doesn't depend on view order or id types'''
+        first = self.flight.make_key(1, 2020, {'view': ['mTeam', 'mRoster']})
+        second = self.flight.make_key('1', '2020', {'view': ['mRoster', 'mTeam']})
+        self.assertEqual(first, second)
+        private = self.flight.make_key(
+            1, 2020, {'view': ['mTeam', 'mRoster']}, {'swid': 'abc'})
+        self.assertNotEqual(first, private)
+
+    def test_coalesce(self):
+        '''Testing concurrent callers share one fetch'''
+        key = self.flight.make_key(1, 2020)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.flight.do(key, self.slow_fetch)))
+                   for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(len(results), 5)
+        for result in results:
+            self.assertEqual(result, b'{"teams": [1, 2, 3]}')
+
+    def test_error(self):
+        '''Testing errors are raised to the caller and not cached'''
+        key = self.flight.make_key(1, 2020)
+
+        def failing_fetch():
+            raise ValueError('ESPN is down')
+
+        with self.assertRaises(ValueError):
+            self.flight.do(key, failing_fetch)
+        self.assertEqual(self.flight.do(
+            key, self.slow_fetch), b'{"teams": [1, 2, 3]}')
+
+    def test_across_workers(self):
+        '''Testing a worker waiting on another worker's fetch gets its result'''
+        other_worker = SingleFlight(lock_dir=self.lock_dir, window=10)
+        key = self.flight.make_key(1, 2020)
+        results = []
+        threads = [threading.Thread(target=lambda flight=flight: results.append(flight.do(key, self.slow_fetch)))
+                   for flight in (self.flight, other_worker)]
+        threads[0].start()
+        time.sleep(0.05)
+        threads[1].start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(results, [b'{"teams": [1, 2, 3]}'] * 2)
+
+    def test_finished_fetch(self):
+        '''Testing a result isn't shared with workers that come after the fetch'''
+        key = self.flight.make_key(1, 2020)
+        self.flight.do(key, self.slow_fetch)
+        SingleFlight(lock_dir=self.lock_dir, window=10).do(key, self.slow_fetch)
+        self.assertEqual(self.fetches, 2)
+
+    def test_permissions(self):
+        '''Testing only our user can read the lock directory and results'''
+        lock_dir = os.path.join(self.lock_dir, 'flights')
+        flight = SingleFlight(lock_dir=lock_dir, window=10)
+        key = flight.make_key(1, 2020)
+        flight.do(key, self.slow_fetch)
+        self.assertEqual(stat.S_IMODE(os.stat(lock_dir).st_mode), 0o700)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.join(lock_dir, f'{key}.result')).st_mode), 0o600)
@@ -0,0 +1,36 @@
+from unittest import TestCase
+from espn.classes.stream_class import LeaguePayloadStream
+from espn.testing import create_test_payload
+
+
+class LeaguePayloadStreamTestCase(TestCase):
+    '''Test Case for LeaguePayloadStream Class'''
+
+    def setUp(self):
+        self.stream = LeaguePayloadStream(create_test_payload(), 2020)
+
+    def test_read_league_fields(self):
+        '''Testing reading the league level fields, even after the teams'''
+        data = self.stream.read_league_fields()
+        self.assertEqual(data['num_teams'], 2)
+        self.assertEqual(data['scoringPeriodId'], 10)
+        self.assertEqual(data['settings']['name'], 'Test League')
+        self.assertEqual(data['status'], {
+                         'isActive': True, 'finalScoringPeriod': 17})
+        self.assertEqual(data['settings']['scoringSettings']['scoringItems'],
+                         [{'statId': 53, 'pointsOverrides': {'16': 1.0}}])
+        self.assertNotIn('teams', data)
+
+    def test_iter_teams(self):
+        '''Testing teams are trimmed to what we use'''
+        teams = list(self.stream.iter_teams())
+        self.assertEqual([team['id'] for team in teams], [1, 2])
+        self.assertNotIn('transactionCounter', teams[0])
+        self.assertIsInstance(teams[0]['points'], float)
+
+        entry = teams[0]['roster']['entries'][0]
+        player = entry['playerPoolEntry']['player']
+        self.assertEqual(
+            entry['playerPoolEntry']['ratings']['0']['positionalRanking'], 3)
+        self.assertNotIn('draftRanksByRankType', player)
+        self.assertEqual([stat['id'] for stat in player['stats']], ['002020'])
@@ -0,0 +1,91 @@
+from unittest import TestCase
+from app.app import app
+from app.database import db, add_to_db
+from espn.classes.import_class import LeagueImporter
+from espn.classes.what_if_class import WhatIfCache, WhatIfGrader, get_profile_stat_values, hash_stat_values
+from espn.models import LeagueModel, TeamModel, PlayerModel
+from espn.testing import create_raw_stats_payload
+from user.models import UserModel
+
+app.config['TESTING'] = True
+app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql:///ffl_trade_tips_test'
+app.config['SQLALCHEMY_ECHO'] = False
+
+db.drop_all()
+
+class WhatIfGraderTestCase(TestCase):
+    '''Test Case for WhatIfGrader Class'''
+
+    def setUp(self):
+        db.session.remove()
+        db.create_all()
+        user = UserModel(username='whatifuser', email='whatif@email.com', password='password')
+        add_to_db(user)
+        league_model_id = LeagueImporter(league_id=45678, year=2020, user_id=user.id,
+                                         data=create_raw_stats_payload()).run()
+        self.league = LeagueModel.query.get(league_model_id)
+        self.grader = WhatIfGrader(self.league, WhatIfCache())
+        self.player_ids = {player.player_id: player.id for player in self.league.players}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_profiles(self):
+        '''Testing receptions decide the running backs' grades under each profile'''
+        ppr = self.grader.grade('ppr')
+        standard = self.grader.grade('standard')
+        self.assertEqual(ppr['players'][self.player_ids[4]], {'points': 110.0, 'grade': 'A'})
+        self.assertEqual(standard['players'][self.player_ids[4]]['points'], 30.0)
+        self.assertEqual(standard['players'][self.player_ids[2]]['grade'], 'A')
+        self.assertNotEqual(ppr['players'][self.player_ids[2]]['grade'], 'A')
+        self.assertEqual(set(ppr['teams']), {team.id for team in self.league.teams})
+
+    def test_league_scoring(self):
+        '''Testing profiles only change their stats from the league's own scoring'''
+        self.assertEqual(self.league.stat_values['Passing Yards'], 0.1)
+        ppr = self.grader.grade('ppr')
+        self.assertEqual(ppr['players'][self.player_ids[1]]['points'], 300.0)
+
+        # Leagues imported before their scoring was stored use the default scoring
+        self.league.stat_values = None
+        ppr = WhatIfGrader(self.league, WhatIfCache()).grade('ppr')
+        self.assertEqual(ppr['players'][self.player_ids[1]]['points'], 120.0)
+
+    def test_stored_grades(self):
+        '''Testing regrading doesn't change the stored grades'''
+        grades = {player.id: player.grade for player in PlayerModel.query}
+        team_grades = {team.id: team.grade for team in TeamModel.query}
+        self.grader.grade('ppr')
+        self.grader.grade({'Rushing Yards': 1})
+        db.session.expire_all()
+        self.assertEqual({player.id: player.grade for player in PlayerModel.query}, grades)
+        self.assertEqual({team.id: team.grade for team in TeamModel.query}, team_grades)
+
+    def test_cache(self):
+        '''Testing results are cached by the profile's stat values'''
+        results = self.grader.grade('ppr')
+        self.assertIs(self.grader.grade({'Receiving Receptions': 1}), results)
+        self.assertIsNot(self.grader.grade('half'), results)
+
+        # A new import is graded again
+        self.league.imported_at = None
+        self.assertIsNot(self.grader.grade('ppr'), results)
+
+    def test_profile_stat_values(self):
+        '''Testing profiles change the given stat values, and bad ones are refused'''
+        self.assertEqual(get_profile_stat_values('half')['Receiving Receptions'], 0.5)
+        self.assertEqual(get_profile_stat_values('half', {'Passing Yards': 0.1}),
+                         {'Passing Yards': 0.1, 'Receiving Receptions': 0.5})
+        self.assertEqual(hash_stat_values(get_profile_stat_values('ppr')),
+                         hash_stat_values(get_profile_stat_values({'Receiving Receptions': 1.0})))
+        for profile in ('superflex', {'Rushing Yards': 'lots'}, {'Rushing Yard': 0.1}, ['ppr']):
+            with self.assertRaises(ValueError):
+                get_profile_stat_values(profile)
+
+    def test_has_raw_stats(self):
+        '''Testing a league imported before raw stats were stored needs a refresh'''
+        self.assertTrue(self.grader.has_raw_stats())
+        PlayerModel.query.update({PlayerModel.raw_stats: None})
+        db.session.commit()
+        self.assertFalse(WhatIfGrader(self.league, WhatIfCache()).has_raw_stats())
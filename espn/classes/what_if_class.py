@@ -0,0 +1,171 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from app.database import db
+from espn.classes.grade_class import VectorGradeCalculator, get_team_grades
+from espn.classes.scoring_class import ScoringEngine
+from espn.models import PlayerModel
+from espn.settings import DEFAULT_STAT_VALUES, SCORING_PROFILES, WHAT_IF_MAX_ENTRIES
+
+
+def get_profile_stat_values(profile, stat_values=None):
+    '''
+    Returns the stat values for a scoring profile, which is
+    either the name of one of the SCORING_PROFILES or a dict
+    of stat name => points to change from the league's
+    stat_values (DEFAULT_STAT_VALUES if there aren't any).
+    Raises a ValueError if the profile isn't valid
+    '''
+    if isinstance(profile, str):
+        if profile not in SCORING_PROFILES:
+            raise ValueError(f'Unknown scoring profile {profile}')
+        profile = SCORING_PROFILES[profile]
+    if not isinstance(profile, dict):
+        raise ValueError('A scoring profile must be a name or a dict of stat values')
+    for (name, value) in profile.items():
+        if name not in DEFAULT_STAT_VALUES:
+            raise ValueError(f'Unknown stat {name}')
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f'The value for {name} must be a number')
+    if stat_values is None:
+        stat_values = DEFAULT_STAT_VALUES
+    return dict(stat_values, **profile)
+
+
+def hash_stat_values(stat_values):
+    '''
+    Returns a hash of the points each stat is worth, so it's
+    the same for any profile that scores every stat the same
+    '''
+    return hashlib.sha1(ScoringEngine(stat_values).stat_vector.tobytes()).hexdigest()
+
+
+class WhatIfCache:
+    '''
+    Holds regraded leagues, and the stats they're regraded
+    from, keyed by league and scoring profile. Only the
+    max_entries most recently used entries are kept
+    '''
+
+    def __init__(self, max_entries=WHAT_IF_MAX_ENTRIES):
+        '''Sets the max number of entries, and an empty cache'''
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        '''Returns the entry for key, or None if there isn't one'''
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        '''Stores the entry, dropping the least recently used if we are over max_entries'''
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        '''Removes every entry'''
+        with self.lock:
+            self.entries.clear()
+
+
+# One cache per process, shared by every request the process handles
+what_if_cache = WhatIfCache()
+
+
+class WhatIfGrader:
+    '''
+    Regrades a stored league under another scoring format.
+    Players are rescored from their stored raw stats, so
+    nothing is fetched from ESPN, and the results are only
+    returned, the stored grades aren't changed
+    '''
+
+    def __init__(self, league, cache=what_if_cache):
+        '''Sets the league attribute to the LeagueModel to regrade'''
+        self.league = league
+        self.cache = cache
+
+    def get_league_key(self):
+        '''
+        Returns the part of the cache keys for the league. It
+        changes when the league is imported again or regraded
+        another way, so results from the old stats aren't used
+        '''
+        return (self.league.id, self.league.imported_at, self.league.grade_mode)
+
+    def load_stats(self):
+        '''
+        Returns a dict of the league's players' ids, team
+        ids, positions, and stats matrix, from the cache if
+        it's there, otherwise with one query
+        '''
+        key = (self.get_league_key(), 'stats')
+        stats = self.cache.get(key)
+        if stats is not None:
+            return stats
+
+        rows = db.session.query(PlayerModel.id, PlayerModel.team_id, PlayerModel.position,
+                                PlayerModel.raw_stats).filter(
+            PlayerModel.league_id == self.league.id).order_by(PlayerModel.id).all()
+        team_ids = sorted({team_id for (id, team_id, position, raw_stats) in rows})
+        team_indexes = {team_id: index for (index, team_id) in enumerate(team_ids)}
+        stats = {
+            'player_ids': [id for (id, team_id, position, raw_stats) in rows],
+            'team_ids': team_ids,
+            'team_indexes': np.array([team_indexes[team_id] for (id, team_id, position, raw_stats) in rows],
+                                     dtype=np.intp),
+            'positions': [position for (id, team_id, position, raw_stats) in rows],
+            'matrix': ScoringEngine().get_stat_matrix([raw_stats for (id, team_id, position, raw_stats) in rows]),
+            'has_raw_stats': all(raw_stats is not None for (id, team_id, position, raw_stats) in rows)
+        }
+        self.cache.set(key, stats)
+        return stats
+
+    def has_raw_stats(self):
+        '''
+        Returns True if every player in the league has raw stats.
+        Leagues imported before they were stored need a refresh
+        '''
+        return self.load_stats()['has_raw_stats']
+
+    def grade(self, profile):
+        '''
+        Returns a dict of the profile's hash, and each player's
+        points and grade and each team's grade under the scoring
+        profile (see get_profile_stat_values), applied to the
+        league's own scoring. Results are cached by the hash
+        of the profile's stat values
+        '''
+        stat_values = get_profile_stat_values(profile, self.league.stat_values)
+        profile_hash = hash_stat_values(stat_values)
+        key = (self.get_league_key(), profile_hash)
+        results = self.cache.get(key)
+        if results is not None:
+            return results
+
+        stats = self.load_stats()
+        points = stats['matrix'] @ ScoringEngine(stat_values).stat_vector
+        grader = VectorGradeCalculator(stat_values, self.league.grade_mode)
+        codes = grader.get_position_codes(stats['positions'])
+        grader.set_extremes(points, codes)
+        grader.set_grade_tables(points, codes)
+        grader.set_grade_ranges()
+        player_grades = grader.grade_players(points, codes).tolist()
+        team_grades = get_team_grades(player_grades, stats['team_indexes'], len(stats['team_ids']))
+
+        results = {
+            'profile': profile_hash,
+            'players': {id: {'points': round(player_points, 2), 'grade': grade}
+                        for (id, player_points, grade) in zip(stats['player_ids'], points.tolist(), player_grades)},
+            'teams': dict(zip(stats['team_ids'], team_grades))
+        }
+        self.cache.set(key, results)
+        return results
@@ -1,40 +1,73 @@
+import datetime
 from app.database import db
-from espn.settings import GRADE_MAP
+from espn.settings import GRADE_MAP, STAT_NAMES, LEAGUE_IMPORT_TTL
+
+
+def get_stats_dict(stats):
+    '''
+    Returns a dict of stat name => value from a
+    stats array, leaving out the stats without a value
+    '''
+    return {name: val for (name, val) in zip(STAT_NAMES, stats or []) if val is not None}
 
 
 class LeagueModel(db.Model):
     '''
     id: primary key, from API
     league_id: int that holds ESPN league id
-    user_id: int FK connected to users
     year: int that holds ESPN year
     espn_s2: text holds espn_s2 for private leagues
     swid: text holds swid for private leagues
     name: text holds league name
     num_teams: int, number of owned teams in the league
-    user_team: int holds id for the team the user claimed
+    ref_count: int, number of users who have the league
+    imported_at: datetime the league was last fully imported
+    grade_mode: text how the league's players were graded (see GRADE_MODES)
+    stat_values: json the league's scoring, stat name => points
+
+    There's one league for each ESPN league and year, shared
+    by every user that adds it (see UserLeagueModel)
     '''
     __tablename__ = 'leagues'
+    __table_args__ = (
+        db.Index('uq_leagues_league_id_year',
+                 'league_id', 'year', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     league_id = db.Column(db.Integer, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey(
-        'users.id', ondelete='cascade'))
     year = db.Column(db.Integer, nullable=False)
     espn_s2 = db.Column(db.Text)
     swid = db.Column(db.Text)
     name = db.Column(db.Text, nullable=False)
     week = db.Column(db.Integer, nullable=False)
     num_teams = db.Column(db.Integer, nullable=False)
-    user_team = db.Column(db.Integer)
+    ref_count = db.Column(db.Integer, nullable=False, server_default='0')
+    imported_at = db.Column(db.DateTime)
+    grade_mode = db.Column(db.Text, nullable=False, server_default='range')
+    stat_values = db.Column(db.JSON)
 
     players = db.relationship(
         'PlayerModel', backref='league', cascade='all, delete')
     teams = db.relationship(
         'TeamModel', backref='league', cascade='all, delete')
+    members = db.relationship(
+        'UserLeagueModel', backref='league', cascade='all, delete')
+    grade_tables = db.relationship(
+        'GradeTableModel', backref='league', cascade='all, delete')
 
     def __repr__(self):
-        return f'<LeagueModel id={self.id} league_id={self.league_id} year={self.year} user_id={self.user_id}>'
+        return f'<LeagueModel id={self.id} league_id={self.league_id} year={self.year} ref_count={self.ref_count}>'
+
+    def is_fresh(self):
+        '''
+        Returns True if the league was imported in
+        the last LEAGUE_IMPORT_TTL seconds
+        '''
+        if not self.imported_at:
+            return False
+        age = datetime.datetime.utcnow() - self.imported_at
+        return age.total_seconds() < LEAGUE_IMPORT_TTL
 
     def get_top_team(self):
         '''
@@ -64,11 +97,39 @@ class LeagueModel(db.Model):
     bottom_scorer = property(get_bottom_team)
 
 
+class UserLeagueModel(db.Model):
+    '''
+    id: int serial primary key
+    user_id: int FK connected to users
+    league_id: int FK connected to leagues
+    user_team: int FK the team the user claimed
+
+    A user's membership in a shared league,
+    holding the user's own state for it
+    '''
+    __tablename__ = 'user_leagues'
+    __table_args__ = (
+        db.Index('uq_user_leagues_user_id_league_id',
+                 'user_id', 'league_id', unique=True),
+        db.Index('ix_user_leagues_league_id', 'league_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey(
+        'users.id', ondelete='cascade'), nullable=False)
+    league_id = db.Column(db.Integer, db.ForeignKey(
+        'leagues.id', ondelete='cascade'), nullable=False)
+    user_team = db.Column(db.Integer, db.ForeignKey(
+        'teams.id', ondelete='set null'))
+
+    def __repr__(self):
+        return f'<UserLeagueModel id={self.id} user_id={self.user_id} league_id={self.league_id} user_team={self.user_team}>'
+
+
 class TeamModel(db.Model):
     '''
     team_id: primary key, from API, set to unique due to error thrown when adding
     league_id: primary key, foreign key, from leagues table
-    user_id: primary key, foreign key, from users table
     accronym: text accronym for the team
     location: text location for team (first half of name)
     nickname: text nickname for team (second half of name)
@@ -77,15 +138,18 @@ class TeamModel(db.Model):
     waiver_position: int team's position on the waivers
     points: float team total points
     grade: text team letter grade
+    stats: float array team stat values, in STAT_NAMES order
     '''
     __tablename__ = 'teams'
+    __table_args__ = (
+        db.Index('ix_teams_team_id_league_id', 'team_id', 'league_id'),
+        db.Index('ix_teams_league_id', 'league_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     team_id = db.Column(db.Integer, nullable=False)
     league_id = db.Column(db.Integer, db.ForeignKey(
         'leagues.id', ondelete='cascade'))
-    user_id = db.Column(db.Integer, db.ForeignKey(
-        'users.id', ondelete='cascade'))
     accronym = db.Column(db.Text)
     location = db.Column(db.Text)
     nickname = db.Column(db.Text)
@@ -94,38 +158,83 @@ class TeamModel(db.Model):
     waiver_position = db.Column(db.Integer)
     points = db.Column(db.Float)
     grade = db.Column(db.Text)
+    stats = db.Column(db.ARRAY(db.Float))
 
     players = db.relationship(
         'PlayerModel', backref='team', cascade='all, delete')
 
-    stats = db.relationship(
-        'TeamStatModel', backref='team', cascade='all, delete')
-
     def __repr__(self):
-        return f'<TeamModel id={self.id} team_id={self.team_id} league_id={self.league_id} user_id={self.user_id}>'
+        return f'<TeamModel id={self.id} team_id={self.team_id} league_id={self.league_id}>'
 
     def get_team_name(self):
         return f'{self.location} {self.nickname}'
 
     team_name = property(get_team_name)
 
+    def get_stats_dict(self):
+        '''
+        Returns a dict of stat name => value for
+        the stats the team has a value for
+        '''
+        return get_stats_dict(self.stats)
 
-class PlayerModel(db.Model):
+
+class ProPlayerModel(db.Model):
     '''
-    id: primary key, from API
+    id: int serial primary key
     player_id: int ESPN player id
-    team_id: int FK connected to teams
-    league_id: int FK connected to leagues
+    year: int season
     first_name: text player first name
     last_name: text player last name
     pro_team: text player current pro team
     position: text player position
+
+    There's one pro player for each ESPN player and season, shared
+    by every league that rosters them (see PlayerModel)
+    '''
+    __tablename__ = 'pro_players'
+    __table_args__ = (
+        db.Index('uq_pro_players_player_id_year',
+                 'player_id', 'year', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    player_id = db.Column(db.Integer, nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    first_name = db.Column(db.Text, nullable=False)
+    last_name = db.Column(db.Text, nullable=False)
+    pro_team = db.Column(db.Text, nullable=False)
+    position = db.Column(db.Text, nullable=False)
+
+    outlooks = db.relationship('PlayerOutlookModel', backref='pro_player',
+                               cascade='all, delete', order_by='PlayerOutlookModel.week')
+
+    def __repr__(self):
+        return f'<ProPlayerModel id={self.id} player_id={self.player_id} year={self.year} name={self.first_name} {self.last_name}>'
+
+
+class PlayerModel(db.Model):
+    '''
+    id: primary key, from API
+    player_id: int ESPN player id
+    team_id: int FK connected to teams
+    league_id: int FK connected to leagues
+    pro_player_id: int FK the player's name, pro team, and outlooks
+    position: text player position, also kept here for the league queries
     points: float player total points
     projected_points: float player projected points
     position_rank: int player rank in their position
     grade: text player letter grade
+    stats: float array player stat values, in STAT_NAMES order
+    raw_stats: float array player raw stat values (before scoring), in STAT_NAMES order
     '''
     __tablename__ = 'players'
+    __table_args__ = (
+        db.Index('ix_players_player_id_league_id', 'player_id', 'league_id'),
+        db.Index('ix_players_team_id_position', 'team_id', 'position'),
+        db.Index('ix_players_league_id_position_grade',
+                 'league_id', 'position', 'grade'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     player_id = db.Column(db.Integer)
@@ -133,82 +242,141 @@ class PlayerModel(db.Model):
         'teams.id', ondelete='cascade'))
     league_id = db.Column(db.Integer, db.ForeignKey(
         'leagues.id', ondelete='cascade'))
-    first_name = db.Column(db.Text, nullable=False)
-    last_name = db.Column(db.Text, nullable=False)
-    pro_team = db.Column(db.Text, nullable=False)
+    pro_player_id = db.Column(db.Integer, db.ForeignKey(
+        'pro_players.id'), nullable=False)
     position = db.Column(db.Text, nullable=False)
 
     points = db.Column(db.Float, nullable=False)
     projected_points = db.Column(db.Float, nullable=False)
     position_rank = db.Column(db.Integer, nullable=False)
     grade = db.Column(db.Text)
+    stats = db.Column(db.ARRAY(db.Float))
+    raw_stats = db.Column(db.ARRAY(db.Float))
 
-    stats = db.relationship(
-        'PlayerStatModel', backref='player', cascade='all, delete')
-    outlooks = db.relationship(
-        'PlayerOutlookModel', backref='player', cascade='all, delete')
+    # Names are shown wherever players are, so they're loaded with the player
+    pro_player = db.relationship('ProPlayerModel', lazy='joined')
 
     def __repr__(self):
         return f'<PlayerModel id={self.id} team_id={self.team_id} league_id={self.league_id} name={self.full_name} grade={self.grade}>'
 
+    def get_first_name(self):
+        return self.pro_player.first_name
+
+    first_name = property(get_first_name)
+
+    def get_last_name(self):
+        return self.pro_player.last_name
+
+    last_name = property(get_last_name)
+
+    def get_pro_team(self):
+        return self.pro_player.pro_team
+
+    pro_team = property(get_pro_team)
+
+    def get_outlooks(self):
+        return self.pro_player.outlooks
+
+    outlooks = property(get_outlooks)
+
     def get_full_name(self):
         return f'{self.first_name} {self.last_name}'
 
     full_name = property(get_full_name)
 
-
-class PlayerStatModel(db.Model):
-    '''
-    id: int serial primary key
-    player_id: int FK connected to players
-    league_id: int FK connected to leagues
-    stat_name: text name of stat
-    stat_value: float points in stat
-    '''
-    __tablename__ = 'players_stats'
-
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    player_id = db.Column(db.Integer, db.ForeignKey(
-        'players.id', ondelete='cascade'))
-    league_id = db.Column(db.Integer, db.ForeignKey(
-        'leagues.id', ondelete='cascade'))
-    stat_name = db.Column(db.Text, nullable=False)
-    stat_value = db.Column(db.Float, nullable=False)
+    def get_stats_dict(self):
+        '''
+        Returns a dict of stat name => value for
+        the stats the player has a value for
+        '''
+        return get_stats_dict(self.stats)
 
 
 class PlayerOutlookModel(db.Model):
     '''
     id: int serial primary key
-    player_id: int FK connected to players
-    league_id: int FK connected to leagues
+    pro_player_id: int FK connected to pro_players
     week: int week of outlook
     outlook: text outlook text
     '''
     __tablename__ = 'players_outlooks'
+    __table_args__ = (
+        db.Index('uq_players_outlooks_pro_player_id_week',
+                 'pro_player_id', 'week', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    player_id = db.Column(db.Integer, db.ForeignKey(
-        'players.id', ondelete='cascade'))
-    league_id = db.Column(db.Integer, db.ForeignKey(
-        'leagues.id', ondelete='cascade'))
+    pro_player_id = db.Column(db.Integer, db.ForeignKey(
+        'pro_players.id', ondelete='cascade'), nullable=False)
     week = db.Column(db.Integer, nullable=False)
     outlook = db.Column(db.Text, nullable=False)
 
 
-class TeamStatModel(db.Model):
+class GradeTableModel(db.Model):
     '''
     id: int serial primary key
-    team_id: int FK connected to teams
     league_id: int FK connected to leagues
-    stat_name: text name of stat
-    stat_value: float points in stat
+    position: text position the table is for
+    scores: float array every weighted score in the position, sorted
+
+    Saved when the league is graded, so a single score can be
+    graded against the league with a binary search of its table
     '''
-    __tablename__ = 'teams_stats'
+    __tablename__ = 'grade_tables'
+    __table_args__ = (
+        db.Index('uq_grade_tables_league_id_position',
+                 'league_id', 'position', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    team_id = db.Column(db.Integer, db.ForeignKey(
-        'teams.id', ondelete='cascade'))
     league_id = db.Column(db.Integer, db.ForeignKey(
-        'leagues.id', ondelete='cascade'))
-    stat_name = db.Column(db.Text, nullable=False)
-    stat_value = db.Column(db.Float, nullable=False)
+        'leagues.id', ondelete='cascade'), nullable=False)
+    position = db.Column(db.Text, nullable=False)
+    scores = db.Column(db.ARRAY(db.Float), nullable=False)
+
+
+class JobModel(db.Model):
+    '''
+    id: int serial primary key
+    user_id: int FK connected to users
+    kind: text the kind of job, one of JOB_KINDS
+    league_id: int ESPN league id
+    year: int ESPN year
+    status: text queued, running, done, or failed
+    stage: text the last import stage the job finished
+    progress: int percent of the job that's done
+    league_model_id: int id of the imported league, once the job is done
+    error: text what went wrong, if the job failed
+    created_at: datetime the job was queued
+    updated_at: datetime the job last changed
+    '''
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_id', 'status', 'id'),
+        db.Index('ix_jobs_user_id', 'user_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey(
+        'users.id', ondelete='cascade'), nullable=False)
+    kind = db.Column(db.Text, nullable=False)
+    league_id = db.Column(db.Integer, nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.Text, nullable=False, default='queued')
+    stage = db.Column(db.Text)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    league_model_id = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<JobModel id={self.id} kind={self.kind} league_id={self.league_id} year={self.year} status={self.status}>'
+
+    def to_dict(self):
+        '''Returns a dict of the job's status, for the job endpoints'''
+        return {'id': self.id, 'kind': self.kind, 'league_id': self.league_id, 'year': self.year,
+                'status': self.status, 'stage': self.stage, 'progress': self.progress,
+                'league_model_id': self.league_model_id, 'error': self.error}
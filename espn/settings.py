@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 POSITION_MAP = {
     0: 'QB', 1: 'QB', 2: 'RB', 3: 'WR', 4: 'TE', 5: 'K',
     6: 'TE', 7: 'OP', 8: 'DT', 9: 'DE', 10: 'LB', 11: 'DL',
@@ -65,6 +68,13 @@ STATS_MAP = {
     155: 'TeamWin', 171: '20-24pointLossMargin', 172: '25+pointLossMargin',
 }
 
+# Player and team stats are stored as a float array in this order, with None where
+# there's no value for the stat. Both lost fumbles ids share a slot. The order is
+# stored in the database, so new stats have to be added to the end of STATS_MAP
+STAT_NAMES = list(dict.fromkeys(STATS_MAP.values()))
+STAT_INDEXES = {stat_id: STAT_NAMES.index(name)
+                for (stat_id, name) in STATS_MAP.items()}
+
 DEFAULT_STAT_VALUES = {
     # Offensive stats
     'Passing 2 PT Conversions': 2, 'Passing Yards': 0.04, 'Passing Interceptions': -2, 'Passing Touchdowns': 4,
@@ -82,3 +92,95 @@ DEFAULT_STAT_VALUES = {
     'Allowed 350-399 Yards': -1, 'Allowed 400-449 Yards': -3, 'Allowed 450-499 Yards': -5,
     'Allowed 500-549 Yards': -6, 'Allowed Over 500 Yards': -7
 }
+
+# Views needed to create a league, every team, and every player
+LEAGUE_VIEWS = ['mTeam', 'mRoster', 'mSettings', 'kona_playercard']
+
+# Views to fetch for each kind of operation, so each one pulls the smallest payload
+# it can. mSettings is small and every League needs it, so every profile has it
+FETCH_PROFILES = {
+    # Validating a league, and league settings
+    'settings': ['mSettings'],
+    # Team records, points, and stats
+    'standings': ['mSettings', 'mTeam'],
+    # Rosters and player points without the player cards (outlooks), used for grading
+    'rosters': ['mSettings', 'mTeam', 'mRoster'],
+    'full': LEAGUE_VIEWS
+}
+
+# How long (in seconds) a fetched league payload is reused, and how many are kept per process
+LEAGUE_PAYLOAD_TTL = int(os.environ.get('LEAGUE_PAYLOAD_TTL', 300))
+LEAGUE_PAYLOAD_MAX_ENTRIES = int(
+    os.environ.get('LEAGUE_PAYLOAD_MAX_ENTRIES', 16))
+
+# League data is shared by every user who adds the league. How long (in seconds) after
+# an import the shared data is used as is, instead of importing the league again
+LEAGUE_IMPORT_TTL = int(os.environ.get('LEAGUE_IMPORT_TTL', 300))
+
+# The stages of a league import, in order, with the percent of the import done after each
+IMPORT_STAGES = [('league', 10), ('teams', 30), ('players', 70), ('grades', 100)]
+
+# Kinds of background league jobs. A refresh always fetches the league again,
+# an import reuses the shared league if it was imported in the last LEAGUE_IMPORT_TTL
+JOB_KINDS = ['import', 'refresh']
+# How long (in seconds) an idle worker waits before checking for jobs again, and how
+# long a running job can go without progress before another worker picks it up
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 600))
+
+# Settings for the shared ESPN API client
+ESPN_CONNECT_TIMEOUT = float(os.environ.get('ESPN_CONNECT_TIMEOUT', 3.05))
+ESPN_READ_TIMEOUT = float(os.environ.get('ESPN_READ_TIMEOUT', 20))
+ESPN_MAX_RETRIES = int(os.environ.get('ESPN_MAX_RETRIES', 2))
+ESPN_RETRY_BACKOFF = float(os.environ.get('ESPN_RETRY_BACKOFF', 0.5))
+ESPN_MAX_PAYLOAD_BYTES = int(
+    os.environ.get('ESPN_MAX_PAYLOAD_BYTES', 50 * 1024 * 1024))
+ESPN_POOL_SIZE = int(os.environ.get('ESPN_POOL_SIZE', 10))
+
+# Where concurrent ESPN fetches for the same league coordinate between workers,
+# and how long (in seconds) a result file is kept for callers that were waiting on the fetch
+SINGLE_FLIGHT_DIR = os.environ.get('SINGLE_FLIGHT_DIR', os.path.join(
+    tempfile.gettempdir(), 'ffl-trade-tips-flights'))
+SINGLE_FLIGHT_WINDOW = int(os.environ.get('SINGLE_FLIGHT_WINDOW', 10))
+
+# Max number of league fetches in flight at once when refreshing many leagues
+BULK_FETCH_CONCURRENCY = int(os.environ.get('BULK_FETCH_CONCURRENCY', 6))
+
+# Disk cache for ESPN responses, revalidated with conditional GETs
+ESPN_CACHE_ENABLED = os.environ.get('ESPN_CACHE_ENABLED', 'true') == 'true'
+ESPN_CACHE_DIR = os.environ.get('ESPN_CACHE_DIR', os.path.join(
+    tempfile.gettempdir(), 'ffl-trade-tips-cache'))
+ESPN_CACHE_MAX_BYTES = int(
+    os.environ.get('ESPN_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Where ESPN requests go. Point this at the stand in server (espn/stand_in_server.py) to run without ESPN
+ESPN_API_URL = os.environ.get(
+    'ESPN_API_URL', 'https://fantasy.espn.com/apis/v3/games/ffl')
+# 'live' sends requests to ESPN_API_URL, 'record' does the same but also saves
+# each response as a fixture, and 'replay' only serves saved fixtures
+ESPN_REQUEST_MODE = os.environ.get('ESPN_REQUEST_MODE', 'live')
+ESPN_FIXTURES_DIR = os.environ.get('ESPN_FIXTURES_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
+
+# How players are graded. 'range' splits each position's 0 to max score into five
+# equal ranges, 'percentile' grades on where the score falls in the position
+GRADE_MODES = ['range', 'percentile']
+GRADE_MODE = os.environ.get('GRADE_MODE', 'range')
+# The lowest percentile rank for a D, C, B, and A in percentile mode
+GRADE_PERCENTILES = [20, 40, 60, 80]
+# The points players are graded on. 'espn' uses the season total from ESPN, 'stats'
+# rescores each player from their raw stats with the league's scoring settings
+GRADE_POINTS = os.environ.get('GRADE_POINTS', 'espn')
+
+# Scoring formats a league can be regraded under without changing its stored
+# grades, as the stat values they change from DEFAULT_STAT_VALUES
+SCORING_PROFILES = {
+    'standard': {'Receiving Receptions': 0},
+    'half': {'Receiving Receptions': 0.5},
+    'ppr': {'Receiving Receptions': 1}
+}
+# How many regraded leagues (and leagues' stats) are kept per process
+WHAT_IF_MAX_ENTRIES = int(os.environ.get('WHAT_IF_MAX_ENTRIES', 256))
+
+# How many leagues the regrade-leagues command loads and writes at a time
+REGRADE_BATCH_SIZE = int(os.environ.get('REGRADE_BATCH_SIZE', 100))
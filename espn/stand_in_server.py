@@ -0,0 +1,97 @@
+import argparse
+import gzip
+import hashlib
+import json
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from espn.classes.fixture_class import ESPNFixtures
+from espn.settings import ESPN_FIXTURES_DIR
+
+LEAGUE_PATH = re.compile(
+    r'^/apis/v3/games/ffl/seasons/(\d+)/segments/0/leagues/(\d+)$')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    '''
+    Handles requests the way the ESPN league endpoint does,
+    serving recorded fixtures filtered down to the asked for
+    views. Responses have an ETag, and are gzipped if the
+    client accepts it
+    '''
+    fixtures = None
+
+    def send_body(self, status, content, etag=None):
+        '''Sends the body with the status, compressing it if we can'''
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            content = gzip.compress(content)
+            encoding = 'gzip'
+        else:
+            encoding = None
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_not_found(self):
+        '''Sends the error ESPN sends for a league that doesn't exist'''
+        error = {'messages': ['Not Found'], 'details': [
+            {'message': 'Not Found', 'shortMessage': 'Not Found', 'type': 'NOT_FOUND'}]}
+        self.send_body(404, json.dumps(error).encode())
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        match = LEAGUE_PATH.match(url.path)
+        if not match:
+            self.send_not_found()
+            return
+
+        (year, league_id) = match.groups()
+        views = parse_qs(url.query).get('view', [])
+        content = self.fixtures.load(league_id, year, {'view': views})
+        if content is None:
+            self.send_not_found()
+            return
+
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_body(200, content, etag)
+
+    def log_message(self, format, *args):
+        # Keep test output quiet
+        pass
+
+
+def create_server(fixtures_dir=ESPN_FIXTURES_DIR, host='127.0.0.1', port=8001):
+    '''
+    Returns a server standing in for the ESPN API, serving
+    the fixtures in fixtures_dir. Point ESPN_API_URL at
+    http://host:port/apis/v3/games/ffl to use it
+    '''
+    handler = type('FixtureStandInHandler', (StandInHandler,), {
+                   'fixtures': ESPNFixtures(fixtures_dir)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serves recorded ESPN fixtures like the ESPN API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--fixtures', default=ESPN_FIXTURES_DIR)
+    args = parser.parse_args()
+
+    server = create_server(args.fixtures, args.host, args.port)
+    print(
+        f'Serving {args.fixtures} at http://{args.host}:{args.port}/apis/v3/games/ffl')
+    server.serve_forever()
@@ -0,0 +1,129 @@
+import json
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from unittest import mock
+from espn.classes import base_classes
+from espn.classes.fixture_class import ESPNFixtures
+from espn.classes.single_flight_class import single_flight
+from espn.settings import LEAGUE_VIEWS
+from espn.stand_in_server import StandInHandler, LEAGUE_PATH
+
+# Builders for the ESPN payloads, and a stand in ESPN server, shared by the tests
+
+
+def create_test_player(id, position_id, points):
+    return {'id': id, 'defaultPositionId': position_id, 'firstName': 'Test', 'lastName': f'Player {id}',
+            'proTeamId': 1, 'draftRanksByRankType': {'PPR': {'rank': 1}},
+            'outlooks': {'outlooksByWeek': {'1': f'Outlook for {id}'}},
+            'stats': [{'id': '002019', 'appliedTotal': 100.5, 'appliedAverage': 6.28, 'appliedStats': {'3': 1.0}},
+                      {'id': '002020', 'appliedTotal': points, 'appliedAverage': points / 10,
+                       'appliedStats': {'3': points * 10, '53': 20.0}}]}
+
+
+def create_test_team(id, players):
+    entries = [{'playerPoolEntry': {'ratings': {'0': {'positionalRanking': 3}}, 'player': player}}
+               for player in players]
+    return {'id': id, 'abbrev': f'TST{id}', 'location': 'Test', 'nickname': f'Team {id}',
+            'logo': 'logo.png', 'points': 1000.5 + id, 'waiverRank': id,
+            'record': {'overall': {'wins': 5, 'losses': 5}}, 'valuesByStat': {'3': 1.5},
+            'transactionCounter': {'trades': 1}, 'roster': {'entries': entries}}
+
+
+def create_test_payload(name='Test League'):
+    teams = [create_test_team(1, [create_test_player(1, 1, 200.25), create_test_player(2, 2, 150.0)]),
+             create_test_team(2, [create_test_player(3, 1, 100.0), create_test_player(4, 2, 50.0)])]
+    payload = {'teams': teams, 'scoringPeriodId': 10,
+               'settings': {'name': name,
+                            'scoringSettings': {'scoringItems': [{'statId': 53, 'pointsOverrides': {'16': 1.0}}]}},
+               'status': {'isActive': True, 'finalScoringPeriod': 17}}
+    return json.dumps(payload).encode()
+
+
+# ESPN player id => raw stats. Player 2 runs more, player 4 catches more
+test_raw_stats = {
+    1: {'3': 3000.0},
+    2: {'24': 500.0, '53': 10.0},
+    3: {'3': 2000.0},
+    4: {'24': 300.0, '53': 80.0}
+}
+
+
+# The raw stats league's scoring, passing yards are worth more than the default
+test_scoring_items = [{'statId': 3, 'pointsOverrides': {'16': 0.1}}, {'statId': 24, 'pointsOverrides': {}},
+                      {'statId': 53, 'pointsOverrides': {'16': 1.0}}]
+
+
+def create_raw_stats_payload():
+    '''Returns the test payload, with raw stats for each player and the test scoring'''
+    payload = json.loads(create_test_payload())
+    payload['settings']['scoringSettings']['scoringItems'] = test_scoring_items
+    for team in payload['teams']:
+        for entry in team['roster']['entries']:
+            player = entry['playerPoolEntry']['player']
+            player['stats'][1]['stats'] = test_raw_stats[player['id']]
+    return json.dumps(payload).encode()
+
+
+# The stand in sends a 503 for this league, like ESPN does when it's overloaded
+failing_league_id = 99999
+
+
+class CountingStandInHandler(StandInHandler):
+    '''
+    Stand in handler that records the leagues asked for, and
+    the most requests it had in flight at once. Each request
+    is held for delay seconds so they overlap
+    '''
+    delay = 0.05
+
+    def do_GET(self):
+        league_id = int(LEAGUE_PATH.match(self.path.split('?')[0]).group(2))
+        # The counts are kept on the class, every request gets a handler of its own
+        handler = type(self)
+        with self.lock:
+            self.requested.append(league_id)
+            handler.in_flight += 1
+            handler.max_in_flight = max(handler.max_in_flight, handler.in_flight)
+        time.sleep(self.delay)
+        try:
+            if league_id == failing_league_id:
+                self.send_body(503, b'')
+            else:
+                super().do_GET()
+        finally:
+            with self.lock:
+                handler.in_flight -= 1
+
+
+class StandInESPN:
+    '''
+    Serves (league_id, year) => payload from a stand in server,
+    with ESPN requests sent to it while it's running
+    '''
+
+    def __init__(self, payloads):
+        fixtures = ESPNFixtures(tempfile.mkdtemp())
+        for ((league_id, year), payload) in payloads.items():
+            fixtures.save(league_id, year, {'view': LEAGUE_VIEWS}, payload)
+        self.handler = type('TestStandInHandler', (CountingStandInHandler,), {
+            'fixtures': fixtures, 'lock': threading.Lock(), 'requested': [],
+            'in_flight': 0, 'max_in_flight': 0})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler)
+        port = self.server.server_address[1]
+        self.patches = [mock.patch.object(base_classes, 'ESPN_API_URL', f'http://127.0.0.1:{port}/apis/v3/games/ffl'),
+                        mock.patch.object(base_classes.espn_client, 'retry_backoff', 0),
+                        # So fetches from earlier tests aren't shared
+                        mock.patch.object(single_flight, 'window', -1)]
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        for patch in self.patches:
+            patch.start()
+
+    def stop(self):
+        for patch in self.patches:
+            patch.stop()
+        self.server.shutdown()
+        self.server.server_close()
@@ -6,9 +6,13 @@ from app.database import db, add_to_db
 from app.forms import AddLeagueForm, SelectTeamForm
 from espn import views
 from espn.classes.espn_classes import League
-from espn.models import LeagueModel
+from espn.classes.payload_store_class import league_payload_store
+from espn.classes.import_class import LeagueImporter
+from espn.models import LeagueModel, UserLeagueModel, JobModel
+from espn.testing import create_test_payload, StandInESPN, create_raw_stats_payload
 from user.auth import UserAuthentication
 from user.models import UserModel
+import json
 import os
 
 test_league_id = os.getenv('test_league_id')
@@ -32,9 +36,8 @@ def create_test_user():
     add_to_db(test_user)
 
 
-def create_test_league(test_user_id):
-    test_league = League(league_id=test_league_id,
-                         year=test_year, user_id=test_user_id)
+def create_test_league():
+    test_league = League(league_id=test_league_id, year=test_year)
 
     return test_league
 
@@ -84,7 +87,7 @@ class ESPNViewTestCase(TestCase):
         with app.test_client() as client:
             client.get('/')
 
-            create_test_league(1)
+            create_test_league()
 
             with client.session_transaction() as session:
                 session['user_id'] = 1
@@ -103,7 +106,7 @@ class ESPNViewTestCase(TestCase):
         with app.test_client() as client:
             client.get('/')
 
-            create_test_league(1)
+            create_test_league()
 
             with client.session_transaction() as session:
                 session['user_id'] = 1
@@ -122,7 +125,7 @@ class ESPNViewTestCase(TestCase):
         with app.test_client() as client:
             client.get('/')
 
-            create_test_league(1)
+            create_test_league()
 
             form = SelectTeamForm()
             form.team.data = 1
@@ -137,3 +140,177 @@ class ESPNViewTestCase(TestCase):
 
             self.assertEqual(session['user_id'], 1)
             self.assertIn('select-team', request.path)
+
+
+class JobViewTestCase(TestCase):
+    '''Test Case for the job views'''
+
+    def setUp(self):
+        db.session.remove()
+        db.create_all()
+        create_test_user()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_enqueue_job(self):
+        with app.test_client() as client:
+            with client.session_transaction() as session:
+                session['user_id'] = 1
+
+            response = client.post(
+                '/jobs', json={'league_id': 1234, 'year': 2020, 'kind': 'refresh'})
+            self.assertEqual(response.status_code, 202)
+            job = response.json['job']
+            self.assertEqual(job['status'], 'queued')
+            self.assertEqual(JobModel.query.get(job['id']).kind, 'refresh')
+
+            response = client.post(
+                '/jobs', json={'league_id': 1234, 'year': 2020, 'kind': 'delete'})
+            self.assertEqual(response.status_code, 400)
+
+    def test_get_job(self):
+        with app.test_client() as client:
+            with client.session_transaction() as session:
+                session['user_id'] = 1
+            job_id = client.post(
+                '/jobs', json={'league_id': 1234, 'year': 2020}).json['job']['id']
+
+            response = client.get(f'/jobs/{job_id}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json['job']['progress'], 0)
+
+            with client.session_transaction() as session:
+                session['user_id'] = 2
+            response = client.get(f'/jobs/{job_id}')
+            self.assertEqual(response.status_code, 404)
+
+
+def read_events(body):
+    '''Returns a list of (event, data) for the server-sent events in body'''
+    events = []
+    for message in body.strip().split('\n\n'):
+        [event_line, data_line] = message.split('\n')
+        events.append((event_line[len('event: '):], json.loads(data_line[len('data: '):])))
+    return events
+
+
+class ImportViewTestCase(TestCase):
+    '''Test Case for the league import views'''
+
+    import_league_id = 34567
+
+    def setUp(self):
+        db.session.remove()
+        db.create_all()
+        create_test_user()
+        league_payload_store.set(self.import_league_id, 2020, create_test_payload())
+
+    def tearDown(self):
+        league_payload_store.evict(self.import_league_id, 2020)
+        db.session.remove()
+        db.drop_all()
+
+    def test_import_league(self):
+        with app.test_client() as client:
+            with client.session_transaction() as session:
+                session['user_id'] = 1
+
+            response = client.get(
+                f'/import-league?league_id={self.import_league_id}&year=2020')
+            self.assertEqual(response.mimetype, 'text/event-stream')
+            events = read_events(response.get_data(as_text=True))
+
+            self.assertEqual([data['stage'] for (event, data) in events[:-1]],
+                             ['league', 'teams', 'players', 'grades'])
+            self.assertEqual(events[-2][1]['progress'], 100)
+            (event, data) = events[-1]
+            self.assertEqual(event, 'done')
+            league = LeagueModel.query.get(data['league_model_id'])
+            self.assertEqual(league.name, 'Test League')
+            self.assertEqual(UserLeagueModel.query.filter_by(
+                user_id=1, league_id=league.id).count(), 1)
+
+    def test_refresh_league(self):
+        '''Testing a refresh fetches a league that was just imported again'''
+        espn = StandInESPN({(self.import_league_id, 2020): create_test_payload('Renamed League')})
+        espn.start()
+        try:
+            with app.test_client() as client:
+                with client.session_transaction() as session:
+                    session['user_id'] = 1
+
+                url = f'/import-league?league_id={self.import_league_id}&year=2020'
+                read_events(client.get(url).get_data(as_text=True))
+                # It was just imported, so it's only joined
+                (event, data) = read_events(client.get(url).get_data(as_text=True))[-1]
+                self.assertEqual(espn.handler.requested, [])
+                self.assertEqual(LeagueModel.query.get(data['league_model_id']).name, 'Test League')
+                # The refresh page's form asks for a refresh
+                response = client.get(f"/leagues/{data['league_model_id']}/refresh")
+                self.assertIn('data-refresh="true"', response.get_data(as_text=True))
+
+                (event, data) = read_events(client.get(f'{url}&refresh=true').get_data(as_text=True))[-1]
+                self.assertEqual(event, 'done')
+                self.assertEqual(espn.handler.requested, [self.import_league_id])
+                self.assertEqual(LeagueModel.query.get(data['league_model_id']).name, 'Renamed League')
+        finally:
+            espn.stop()
+
+    def test_import_steps(self):
+        with app.test_client() as client:
+            with client.session_transaction() as session:
+                session['user_id'] = 1
+
+            response = client.post(
+                '/create-league', json={'league_id': self.import_league_id, 'year': 2020})
+            self.assertEqual(response.json['message'], 'League Created!')
+            league = LeagueModel.query.get(response.json['league_model_id'])
+            self.assertEqual(len(league.players), 4)
+            self.assertIsNotNone(league.imported_at)
+
+            for (url, message) in [('/create-teams', 'Teams Created!'), ('/create-players', 'Players Created!'),
+                                   ('/get-player-grades', 'Grades Created!')]:
+                response = client.post(url, json={'league_id': self.import_league_id})
+                self.assertEqual(response.json['message'], message)
+
+
+class WhatIfViewTestCase(TestCase):
+    '''Test Case for the what-if scoring view'''
+
+    def setUp(self):
+        db.session.remove()
+        db.create_all()
+        create_test_user()
+        self.league_model_id = LeagueImporter(league_id=56789, year=2020, user_id=1,
+                                              data=create_raw_stats_payload()).run()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_what_if(self):
+        with app.test_client() as client:
+            with client.session_transaction() as session:
+                session['user_id'] = 1
+
+            response = client.post(f'/leagues/{self.league_model_id}/what-if', json={'profile': 'ppr'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json['players']), 4)
+            self.assertEqual(len(response.json['teams']), 2)
+
+            response = client.post(f'/leagues/{self.league_model_id}/what-if',
+                                   json={'stat_values': {'Receiving Receptions': 2}})
+            self.assertEqual(response.status_code, 200)
+
+            response = client.post(f'/leagues/{self.league_model_id}/what-if', json={'profile': 'superflex'})
+            self.assertEqual(response.status_code, 400)
+
+    def test_what_if_other_user(self):
+        with app.test_client() as client:
+            with client.session_transaction() as session:
+                session['user_id'] = 2
+
+            response = client.post(f'/leagues/{self.league_model_id}/what-if', json={'profile': 'ppr'})
+            self.assertEqual(response.status_code, 404)
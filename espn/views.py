@@ -1,15 +1,20 @@
-from flask import render_template, redirect, session, request, jsonify, flash, url_for
+import json
+from flask import render_template, redirect, session, request, jsonify, flash, url_for, Response, stream_with_context
 from app.app import app
 from app.database import db, delete_from_db
-from espn.settings import POSITIONS, GRADE_MAP
+from espn.settings import POSITIONS, GRADE_MAP, JOB_KINDS
 from espn.classes.news_class import News
-from espn.classes.espn_classes import League
+from espn.classes.base_classes import ESPNRequestError
+from espn.classes.import_class import LeagueImporter
+from espn.classes.job_queue_class import JobQueue
 from espn.classes.league_handler_class import LeagueHandler
-from espn.models import LeagueModel, TeamModel, PlayerModel
+from espn.classes.what_if_class import WhatIfGrader
+from espn.models import LeagueModel, UserLeagueModel, TeamModel, PlayerModel, JobModel
 from user.models import UserModel
 from app.forms import AddLeagueForm, SelectTeamForm, SimulateTradeForm
 
 league_handler = LeagueHandler()
+job_queue = JobQueue()
 
 
 @app.route('/recent-news')
@@ -23,120 +28,130 @@ def show_news():
     return render_template('news.html', news=news.data)
 
 
+def format_event(event, data):
+    '''Returns a server-sent event with the data as JSON'''
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+@app.route('/import-league')
+def import_league():
+    '''
+    Imports the league (league, teams, players, and grades)
+    in this one request, and streams a server-sent event
+    as each stage is done. The last event is done, with
+    the league's id, or failed. If refresh is true the
+    league is fetched fresh even if it was just imported
+    '''
+    if 'user_id' not in session:
+        return (jsonify({'message': 'ERROR: USER NOT LOGGED IN'}), 400)
+    league_id = request.args.get('league_id', type=int)
+    year = request.args.get('year', type=int)
+    refresh = request.args.get('refresh') == 'true'
+    if not league_id or not year:
+        return (jsonify({'message': 'ERROR: MISSING DATA'}), 400)
+    importer = LeagueImporter(league_id=league_id, year=year, user_id=session['user_id'], refresh=refresh)
+
+    def generate_events():
+        try:
+            for (stage, progress) in importer.run_stages():
+                yield format_event('stage', {'stage': stage, 'progress': progress})
+        except ESPNRequestError:
+            db.session.rollback()
+            yield format_event('failed', {'message': 'ESPN could not be reached'})
+            return
+        yield format_event('done', {'league_model_id': importer.league_model_id})
+
+    # Proxies buffer responses by default, which would hold the events back
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(generate_events()), mimetype='text/event-stream', headers=headers)
+
+
+# The four step import endpoints below are kept for older clients. The whole import
+# runs in /create-league, the other steps have nothing left to do
+
+
 @app.route('/create-league', methods=['POST'])
 def create_league():
     if 'user_id' not in session:
         return (jsonify({'message': 'ERROR: USER NOT LOGGED IN'}), 400)
 
-    user_id = session['user_id']
     data = request.json
     if 'league_id' not in data or 'year' not in data:
         return (jsonify({'message': 'ERROR: MISSING DATA'}), 400)
 
     league_id = data['league_id']
     year = data['year']
-
-    existing_leagues = LeagueModel.query.filter_by(
-        league_id=league_id, year=year, user_id=user_id).all()
-    if existing_leagues:
-        for league in existing_leagues:
-            db.session.delete(league)
-            db.session.commit()
-
-    league = League(league_id=league_id, year=year, user_id=user_id)
-    league.handle_db()
-    league_model_id = league.league_info['league_model_id']
+    importer = LeagueImporter(league_id=league_id, year=year, user_id=session['user_id'])
+    try:
+        league_model_id = importer.run()
+    except ESPNRequestError:
+        return (jsonify({'message': 'ERROR: ESPN could not be reached'}), 503)
     session['league_model_id'] = league_model_id
     session['year'] = year
 
-    if league:
+    if league_model_id:
         return (jsonify({'message': 'League Created!', 'league_model_id': league_model_id}), 200)
     return (jsonify({'message': 'ERROR: League could not be created!'}))
 
 
-@app.route('/create-teams', methods=['POST'])
-def create_teams():
+def check_import_step():
+    '''
+    Returns an error response if the user can't run
+    an import step, otherwise None
+    '''
     if 'user_id' not in session:
         return (jsonify({'message': 'ERROR: USER NOT LOGGED IN'}), 400)
-    user_id = session['user_id']
-
     if 'year' not in session:
         return (jsonify({'message': 'ERROR: USER HAS NO LEAGUE'}), 400)
-    year = session['year']
-
-    data = request.json
-    if 'league_id' not in data:
+    if 'league_id' not in request.json:
         return (jsonify({'message': 'ERROR: MISSING DATA'}), 400)
-    league_id = data['league_id']
+    return None
 
-    league = League(league_id=league_id, year=year, user_id=user_id)
-    league_model_id = session.get('league_model_id')
-    league.league_info['league_model_id'] = league_model_id
-    if league_id != league.id:
-        return (jsonify({'message': 'ERROR: INVALID LEAGUE ID'}), 400)
 
-    league.get_teams()
-    for team in league.teams:
-        team.handle_db()
-    if league.teams:
-        return (jsonify({'message': 'Teams Created!'}), 200)
-    return (jsonify({'message': 'ERROR: Teams could not be created'}), 400)
+@app.route('/create-teams', methods=['POST'])
+def create_teams():
+    return check_import_step() or (jsonify({'message': 'Teams Created!'}), 200)
 
 
 @app.route('/create-players', methods=['POST'])
 def create_players():
-    if 'user_id' not in session:
-        return (jsonify({'message': 'ERROR: USER NOT LOGGED IN'}), 400)
-    user_id = session['user_id']
-
-    if 'year' not in session:
-        return (jsonify({'message': 'ERROR: USER HAS NO LEAGUE'}), 400)
-    year = session['year']
-
-    data = request.json
-    if 'league_id' not in data:
-        return (jsonify({'message': 'ERROR: MISSING DATA'}), 400)
-    league_id = data['league_id']
-
-    league = League(league_id=league_id, year=year, user_id=user_id)
-    league_model_id = session.get('league_model_id')
-    league.league_info['league_model_id'] = league_model_id
-    if league_id != league.id:
-        return (jsonify({'message': 'ERROR: INVALID LEAGUE ID'}), 400)
-    league.get_teams()
-    for team in league.teams:
-        team.get_roster()
-        for player in team.roster:
-            player.handle_db()
-    return (jsonify({'message': 'Players Created!'}), 200)
+    return check_import_step() or (jsonify({'message': 'Players Created!'}), 200)
 
 
 @app.route('/get-player-grades', methods=['POST'])
 def get_grade_ranges():
+    return check_import_step() or (jsonify({'message': 'Grades Created!'}))
+
+
+@app.route('/jobs', methods=['POST'])
+def enqueue_job():
+    '''
+    Queues a league import (or refresh) for a worker
+    to run, and returns the job so it can be polled
+    '''
     if 'user_id' not in session:
         return (jsonify({'message': 'ERROR: USER NOT LOGGED IN'}), 400)
-    user_id = session['user_id']
-
-    if 'year' not in session:
-        return (jsonify({'message': 'ERROR: USER HAS NO LEAGUE'}), 400)
-    year = session['year']
 
     data = request.json
-    if 'league_id' not in data:
+    if 'league_id' not in data or 'year' not in data:
         return (jsonify({'message': 'ERROR: MISSING DATA'}), 400)
-    league_id = data['league_id']
+    kind = data.get('kind', 'import')
+    if kind not in JOB_KINDS:
+        return (jsonify({'message': 'ERROR: INVALID JOB KIND'}), 400)
 
-    league = League(league_id=league_id, year=year, user_id=user_id)
-    league_model_id = session.get('league_model_id')
-    league.league_info['league_model_id'] = league_model_id
-    if league_id != league.id:
-        return (jsonify({'message': 'ERROR: INVALID LEAGUE ID'}), 400)
-    league.get_teams()
-    for team in league.teams:
-        team.get_roster()
-    league.start_grading()
-    league.get_grades()
-    return (jsonify({'message': 'Grades Created!'}))
+    job = job_queue.enqueue(session['user_id'], data['league_id'], data['year'], kind)
+    return (jsonify({'message': 'Job Queued!', 'job': job.to_dict()}), 202)
+
+
+@app.route('/jobs/<int:job_id>')
+def get_job(job_id):
+    '''Returns the status and progress of the job'''
+    if 'user_id' not in session:
+        return (jsonify({'message': 'ERROR: USER NOT LOGGED IN'}), 400)
+    job = JobModel.query.get_or_404(job_id)
+    if job.user_id != session['user_id']:
+        return (jsonify({'message': 'ERROR: JOB NOT FOUND'}), 404)
+    return (jsonify(job=job.to_dict()), 200)
 
 
 @app.route('/add-league', methods=['GET', 'POST'])
@@ -151,8 +166,9 @@ def add_league():
         league = league_handler.add_league(form)
         if league:
             user_id = session.get('user_id')
-            league_model = LeagueModel.query.filter_by(
-                league_id=form.league_id.data, user_id=user_id).first()
+            league_model = LeagueModel.query.join(UserLeagueModel).filter(
+                LeagueModel.league_id == form.league_id.data, LeagueModel.year == form.year.data,
+                UserLeagueModel.user_id == user_id).first()
             return redirect(f'/leagues/{league_model.id}/select-team')
         else:
             return render_template('add_league.html', form=form)
@@ -180,8 +196,9 @@ def league_page(league_id):
     league = LeagueModel.query.get_or_404(league_id)
     if not league:
         return redirect('/leagues')
-    if league.user_id == session.get('user_id'):
-        user_team = TeamModel.query.get_or_404(league.user_team)
+    membership = league_handler.get_membership(league.id, session.get('user_id'))
+    if membership:
+        user_team = TeamModel.query.get_or_404(membership.user_team)
         return render_template('league.html', league=league, user_team=user_team)
 
     return redirect('/leagues')
@@ -191,25 +208,63 @@ def league_page(league_id):
 def refresh_league(league_id):
     '''
     Displays the form, and handles the form, for when
-    a player needs to refresh a league
+    a player needs to refresh a league. The league is
+    updated in place, so it stays readable while it refreshes
     '''
+    if 'user_id' not in session:
+        return redirect('/login')
     # e_league stands for existing league
-    e_league = LeagueModel.query.get(league_id)
+    e_league = LeagueModel.query.get_or_404(league_id)
+    if not league_handler.get_membership(e_league.id, session.get('user_id')):
+        return redirect('/leagues')
     form = AddLeagueForm(obj=e_league)
-    db.session.delete(e_league)
-    db.session.commit()
 
     if form.validate_on_submit():
-        league = league_handler.add_league(form)
-        if league:
-            user_id = session.get('user_id')
-            league_model = LeagueModel.query.filter_by(
-                league_id=form.league_id.data, user_id=user_id).first()
-            return redirect(f'/leagues/{league_model.id}/select-team')
+        league_model_id = league_handler.refresh_league(form)
+        if league_model_id:
+            flash('League Refreshed!', 'success')
+            return redirect(f'/leagues/{league_model_id}')
         else:
-            return render_template('add_league.html', form=form)
+            return render_template('add_league.html', form=form, refresh=True)
     else:
-        return render_template('add_league.html', form=form)
+        return render_template('add_league.html', form=form, refresh=True)
+
+
+@app.route('/leagues/<int:league_id>/refresh-standings')
+def refresh_standings(league_id):
+    '''
+    Refreshes the week and team standings for
+    the league, without reimporting players
+    '''
+    if 'user_id' not in session:
+        return redirect('/login')
+    league = LeagueModel.query.get_or_404(league_id)
+    if not league_handler.get_membership(league.id, session.get('user_id')):
+        return redirect('/leagues')
+    try:
+        league_handler.refresh_standings(league)
+        flash('Standings Refreshed!', 'success')
+    except ESPNRequestError:
+        flash('ESPN could not be reached, please try again!', 'danger')
+    return redirect(f'/leagues/{league_id}')
+
+
+@app.route('/leagues/refresh-all', methods=['POST'])
+def refresh_all_leagues():
+    '''
+    Refreshes every league the user has,
+    then returns to their leagues
+    '''
+    if 'user_id' not in session:
+        return redirect('/login')
+    [num_refreshed, num_leagues] = league_handler.refresh_all(
+        session['user_id'])
+    if num_refreshed == num_leagues:
+        flash('All Leagues Refreshed!', 'success')
+    else:
+        flash(
+            f'Refreshed {num_refreshed} of {num_leagues} leagues, please try again later!', 'danger')
+    return redirect('/leagues')
 
 
 @app.route('/leagues/<int:league_id>/delete')
@@ -222,8 +277,8 @@ def delete_league(league_id):
     league = LeagueModel.query.get_or_404(league_id)
     if 'user_id' not in session:
         flash('You need to be logged in to do that!', 'danger')
-    elif league.user_id == session.get('user_id'):
-        league_handler.delete(league_id)
+    elif league_handler.get_membership(league.id, session.get('user_id')):
+        league_handler.delete(league_id, session['user_id'])
     else:
         flash('You cannot delete an account that isn\'t yours!', 'danger')
     return redirect('/')
@@ -235,13 +290,14 @@ def select_team(league_id):
     if 'user_id' not in session:
         return redirect('/login')
     league = LeagueModel.query.get_or_404(league_id)
-    if league.user_id == session.get('user_id'):
+    membership = league_handler.get_membership(league.id, session.get('user_id'))
+    if membership:
         form = SelectTeamForm()
         choices = [(t.id, t.team_name) for t in league.teams]
         form.team.choices = choices
         if form.validate_on_submit():
             user_team_id = form.team.data
-            league.user_team = user_team_id
+            membership.user_team = user_team_id
             db.session.commit()
             return redirect('/leagues')
 
@@ -251,6 +307,34 @@ def select_team(league_id):
     return redirect('/')
 
 
+@app.route('/leagues/<int:league_id>/what-if', methods=['POST'])
+def what_if_grades(league_id):
+    '''
+    Regrades the league under another scoring format, either
+    the name of a scoring profile ('ppr', 'half', or 'standard')
+    or a dict of stat values, and returns every player's points
+    and grade and every team's grade. Stored grades don't change
+    '''
+    if 'user_id' not in session:
+        return (jsonify({'message': 'ERROR: USER NOT LOGGED IN'}), 400)
+    league = LeagueModel.query.get_or_404(league_id)
+    if not league_handler.get_membership(league.id, session['user_id']):
+        return (jsonify({'message': 'ERROR: LEAGUE NOT FOUND'}), 404)
+    data = request.json or {}
+    profile = data.get('stat_values', data.get('profile'))
+    if profile is None:
+        return (jsonify({'message': 'ERROR: MISSING DATA'}), 400)
+
+    grader = WhatIfGrader(league)
+    if not grader.has_raw_stats():
+        return (jsonify({'message': 'ERROR: LEAGUE NEEDS A REFRESH'}), 409)
+    try:
+        results = grader.grade(profile)
+    except ValueError:
+        return (jsonify({'message': 'ERROR: INVALID SCORING PROFILE'}), 400)
+    return (jsonify(results), 200)
+
+
 @app.route('/leagues/<int:league_id>/trade-sim', methods=['POST'])
 def show_trade_sim(league_id):
     form = SimulateTradeForm()
@@ -270,7 +354,7 @@ def team_page(team_id):
         return redirect('/login')
     team = TeamModel.query.get_or_404(team_id)
     league = team.league
-    if league.user_id == session.get('user_id'):
+    if league_handler.get_membership(league.id, session.get('user_id')):
         return render_template('team.html', team=team)
 
     return redirect('/leagues')
@@ -283,15 +367,17 @@ def player_page(player_id):
         return redirect('/login')
     player = PlayerModel.query.get_or_404(player_id)
     league = player.league
-    if league.user_id == session.get('user_id'):
+    if league_handler.get_membership(league.id, session.get('user_id')):
         form = SimulateTradeForm()
         league_handler.set_trade_sim_choices(player, form)
+        percentile = league_handler.get_percentile(player)
         if request.form.get('player_grade'):
             trade_suggestions = league_handler.get_trade_suggestions(
-                league.user_id, player)
-            return render_template('player.html', player=player, trade_suggestions=trade_suggestions, form=form)
+                session['user_id'], player)
+            return render_template('player.html', player=player, trade_suggestions=trade_suggestions, form=form,
+                                   percentile=percentile)
         else:
-            return render_template('player.html', player=player, form=form)
+            return render_template('player.html', player=player, form=form, percentile=percentile)
     return redirect(f'/teams/{player.team.id}')
 
 
@@ -299,10 +385,10 @@ def player_page(player_id):
 def get_player_stats(player_id):
     player = PlayerModel.query.get_or_404(player_id)
     stats = []
-    for stat in player.stats:
+    for stat_name, stat_value in player.get_stats_dict().items():
         stat_dict = {}
-        stat_dict['name'] = stat.stat_name
-        stat_dict['value'] = stat.stat_value
+        stat_dict['name'] = stat_name
+        stat_dict['value'] = stat_value
         stats.append(stat_dict)
     return (jsonify(stats=stats), 200)
 
@@ -2,6 +2,7 @@ from flask import render_template, flash, redirect
 from app.app import app
 import user.views
 import espn.views
+from app import commands
 import os
 
 
@@ -1,8 +1,9 @@
 from flask import flash, session
 from flask_bcrypt import Bcrypt
-from app.database import add_to_db, delete_from_db
+from app.database import db, add_to_db, delete_from_db
 from espn.classes.base_classes import ESPNRequest
 from espn.classes.espn_classes import League
+from espn.classes.model_handler_classes import UserLeagueModelHandler
 from user.models import UserModel
 
 
@@ -64,7 +65,7 @@ class UserAuthentication:
         if not email or not isinstance(email, str):
             return False
 
-        if not UserModel.query.filter(UserModel.email.ilike(email)).first():
+        if not UserModel.query.filter(db.func.lower(UserModel.email) == email.lower()).first():
             return True
         else:
             session['email_taken'] = True
@@ -79,7 +80,7 @@ class UserAuthentication:
         if not username or not isinstance(username, str):
             return False
 
-        if not UserModel.query.filter(UserModel.username.ilike(username)).first():
+        if not UserModel.query.filter(db.func.lower(UserModel.username) == username.lower()).first():
             return True
         else:
             session['username_taken'] = True
@@ -165,6 +166,11 @@ class UserAuthentication:
             flash('Account could not be deleted!', 'danger')
             return
         else:
+            # Leagues are shared, so the user leaves each one
+            # and only leagues nobody else has are deleted
+            for membership in list(user.user_leagues):
+                UserLeagueModelHandler(
+                    user.id, membership.league_id).remove_record()
             delete_from_db(user)
             flash('Account Deleted Successfuly', 'success')
 
@@ -210,8 +216,9 @@ class UserAuthentication:
         if not isinstance(username, str) or not isinstance(password, str):
             return False
 
+        # lower() equality (instead of ilike) can use the lower(username) index
         user = UserModel.query.filter(
-            UserModel.username.ilike(username)).first()
+            db.func.lower(UserModel.username) == username.lower()).first()
 
         if user:
             if self.compare_passwords(user.password, password):
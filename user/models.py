@@ -15,14 +15,21 @@ class UserModel(db.Model):
     email = db.Column(db.Text, nullable=False, unique=True)
     password = db.Column(db.Text, nullable=False)
 
+    # Leagues are shared, the user's own state for each is in user_leagues
+    user_leagues = db.relationship(
+        'UserLeagueModel', cascade='all, delete', backref='user')
     leagues = db.relationship(
-        'LeagueModel', cascade='all, delete', backref='user')
-    teams = db.relationship('TeamModel', cascade='all, delete', backref='user')
+        'LeagueModel', secondary='user_leagues', viewonly=True)
 
     def __repr__(self):
         return f'<UserModel id={self.id} username={self.username} email={self.email}>'
 
 
+# Usernames and emails are looked up case-insensitively with lower()
+db.Index('ix_users_lower_username', db.func.lower(UserModel.username))
+db.Index('ix_users_lower_email', db.func.lower(UserModel.email))
+
+
 class TradeModel(db.Model):
     '''
     id: int primary key serial
@@ -32,6 +39,9 @@ class TradeModel(db.Model):
     '''
 
     __tablename__ = 'trades'
+    __table_args__ = (
+        db.Index('ix_trades_user_id', 'user_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey(